@@ -5,12 +5,33 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 
 from app.core.auth import get_current_user
 from app.models.user import User
-from app.models.activity import Activity
-from app.schemas.activity import ActivitySummary, ActivityDetail, DuplicateCandidate, CombineRequest
-from app.services.fit_parser import parse_fit_file
+from app.models.activity import Activity, ActivitySummaryView
+from app.schemas.activity import (
+    ActivitySummary,
+    ActivityDetail,
+    AlignRequest,
+    CombineRequest,
+    DuplicateCandidate,
+    TimeOffsetEstimate,
+)
+from app.core.compute import compute
+from app.services.fit_parser import build_activity, decode_fit_path, decode_fit_upload
 from app.services.metrics import compute_activity_metrics
 from app.services.duplicate_detector import find_duplicates
-from app.services.fit_combiner import combine_activities
+from app.services.fingerprint import compute_fingerprint, find_near_duplicates
+from app.services.fit_combiner import combine_activities, estimate_time_offset
+from app.models.pending_upload import PendingUpload
+from app.services.pending_uploads import (
+    discard_pending_upload,
+    get_pending_upload,
+    list_pending_uploads,
+    pending_activity,
+    pending_summary,
+    promote_pending_upload,
+    stash_pending_upload,
+)
+from app.services.activity_events import on_activities_changed
+from app.services.upload_spool import spool_upload
 
 router = APIRouter()
 
@@ -24,44 +45,111 @@ async def upload_fit_file(
     if not file.filename.lower().endswith(".fit"):
         raise HTTPException(status_code=400, detail="Only .FIT files are supported")
 
-    contents = await file.read()
-    activity = await parse_fit_file(contents, str(user.id), file.filename)
+    with await spool_upload(file) as upload:
+        # Exact re-upload: return the stored activity without decoding the file
+        existing = await Activity.find_one(
+            Activity.user_id == str(user.id),
+            Activity.file_hash == upload.file_hash,
+        )
+        if existing:
+            return _to_detail(existing)
+        pending = await PendingUpload.find_one(
+            PendingUpload.user_id == str(user.id),
+            PendingUpload.file_hash == upload.file_hash,
+        )
+        if pending:
+            return await _pending_response(pending)
 
-    # Check for duplicates before saving
-    duplicates = await find_duplicates(activity, str(user.id))
-    if duplicates:
-        # Save as pending, return duplicate info
-        await activity.insert()
-        return {
-            "activity": _to_detail(activity),
-            "duplicates": duplicates,
-            "message": "Potential duplicate activities found. Would you like to combine?",
-        }
+        # Duplicate check only needs the session summary; records are decoded later
+        summary = await compute.run_light(decode_fit_path, upload.path, upload.file_hash, "summary")
+        activity = build_activity(summary, str(user.id), file.filename)
+
+        duplicates = await find_duplicates(activity, str(user.id))
+        if not duplicates:
+            # Recordings of the same session from another device or source
+            decoded = await decode_fit_upload(upload.path, upload.file_hash)
+            fingerprint = await compute.run_light(
+                compute_fingerprint,
+                decoded.channels.get("time"),
+                decoded.channels,
+                activity.total_timer_time,
+                activity.total_distance,
+            )
+            activity.fingerprint = fingerprint
+            duplicates = await find_near_duplicates(activity, str(user.id))
+        if duplicates:
+            # Hold back as a pending upload, return duplicate info
+            await stash_pending_upload(upload, activity)
+            return _duplicate_response(activity, duplicates)
+
+        if decoded.channels:
+            activity.set_channels(decoded.channels)
+            activity.data_quality = decoded.quality
 
     # Compute metrics and save
     await compute_activity_metrics(activity, user)
     await activity.insert()
+    await on_activities_changed(str(user.id), [activity.start_time.date()])
     return _to_detail(activity)
 
 
+@router.post("/{activity_id}/confirm", response_model=ActivityDetail)
+async def confirm_pending_activity(activity_id: str, user: User = Depends(get_current_user)):
+    """Keep a pending duplicate upload as a regular activity."""
+    pending = await get_pending_upload(activity_id, user)
+    if not pending:
+        raise HTTPException(status_code=404, detail="Pending upload not found")
+    return _to_detail(await promote_pending_upload(pending, user))
+
+
 @router.post("/combine", response_model=ActivityDetail)
 async def combine_fit_files(
     req: CombineRequest,
     user: User = Depends(get_current_user),
 ):
     """Combine two overlapping activities into one."""
+    # A pending upload needs its records decoded before it can be merged
+    for activity_id in (req.activity_id_1, req.activity_id_2):
+        pending = await get_pending_upload(activity_id, user)
+        if pending:
+            await promote_pending_upload(pending, user)
+
     combined = await combine_activities(
         req.activity_id_1,
         req.activity_id_2,
         str(user.id),
         req.time_offset_ms,
         req.prefer_data_from,
+        req.max_gap_s,
     )
     await compute_activity_metrics(combined, user)
     await combined.insert()
+    await on_activities_changed(str(user.id), [combined.start_time.date()])
     return _to_detail(combined)
 
 
+@router.post("/align", response_model=TimeOffsetEstimate)
+async def estimate_alignment(
+    req: AlignRequest,
+    user: User = Depends(get_current_user),
+):
+    """Estimate the time_offset_ms that aligns activity 2 with activity 1 for /combine."""
+    act1 = await _alignment_activity(req.activity_id_1, user)
+    act2 = await _alignment_activity(req.activity_id_2, user)
+    return await estimate_time_offset(act1, act2, req.max_offset_s)
+
+
+async def _alignment_activity(activity_id: str, user: User) -> Activity:
+    # Pending uploads are decoded in memory, without promoting them
+    pending = await get_pending_upload(activity_id, user)
+    if pending:
+        return await pending_activity(pending)
+    activity = await Activity.get(activity_id)
+    if not activity or activity.user_id != str(user.id):
+        raise HTTPException(status_code=404, detail=f"Activity {activity_id} not found")
+    return activity
+
+
 @router.get("/", response_model=list[ActivitySummary])
 async def list_activities(
     start: Optional[datetime] = Query(None),
@@ -81,12 +169,23 @@ async def list_activities(
     if sport:
         query = query.find(Activity.sport == sport)
 
-    activities = await query.sort(-Activity.start_time).skip(offset).limit(limit).to_list()
+    activities = await (
+        query.sort(-Activity.start_time).skip(offset).limit(limit).project(ActivitySummaryView).to_list()
+    )
     return [_to_summary(a) for a in activities]
 
 
+@router.get("/pending", response_model=list[ActivityDetail])
+async def list_pending_activities(user: User = Depends(get_current_user)):
+    """Uploads held back as possible duplicates, awaiting confirm, combine or delete."""
+    return [_to_detail(pending_summary(p)) for p in await list_pending_uploads(user)]
+
+
 @router.get("/{activity_id}", response_model=ActivityDetail)
 async def get_activity(activity_id: str, user: User = Depends(get_current_user)):
+    pending = await get_pending_upload(activity_id, user)
+    if pending:
+        return _to_detail(pending_summary(pending))
     activity = await Activity.get(activity_id)
     if not activity or activity.user_id != str(user.id):
         raise HTTPException(status_code=404, detail="Activity not found")
@@ -96,21 +195,47 @@ async def get_activity(activity_id: str, user: User = Depends(get_current_user))
 @router.get("/{activity_id}/records")
 async def get_activity_records(activity_id: str, user: User = Depends(get_current_user)):
     """Get the time-series record data for graphing."""
+    pending = await get_pending_upload(activity_id, user)
+    if pending:
+        activity = await pending_activity(pending)
+        return {"records": [r.model_dump() for r in activity.record_points()]}
     activity = await Activity.get(activity_id)
     if not activity or activity.user_id != str(user.id):
         raise HTTPException(status_code=404, detail="Activity not found")
-    return {"records": [r.model_dump() for r in activity.records]}
+    return {"records": [r.model_dump() for r in activity.record_points()]}
 
 
 @router.delete("/{activity_id}", status_code=204)
 async def delete_activity(activity_id: str, user: User = Depends(get_current_user)):
+    pending = await get_pending_upload(activity_id, user)
+    if pending:
+        await discard_pending_upload(pending)
+        return
     activity = await Activity.get(activity_id)
     if not activity or activity.user_id != str(user.id):
         raise HTTPException(status_code=404, detail="Activity not found")
     await activity.delete()
+    await on_activities_changed(str(user.id), [activity.start_time.date()])
+
+
+def _duplicate_response(activity: Activity, duplicates: list[DuplicateCandidate]) -> dict:
+    return {
+        "activity": _to_detail(activity),
+        "duplicates": duplicates,
+        "message": "Potential duplicate activities found. Would you like to combine?",
+    }
+
+
+async def _pending_response(pending: PendingUpload) -> dict:
+    """Duplicate info of an upload that is already pending, for a repeated upload."""
+    activity = pending_summary(pending)
+    duplicates = await find_duplicates(activity, pending.user_id)
+    if not duplicates:
+        duplicates = await find_near_duplicates(activity, pending.user_id)
+    return _duplicate_response(activity, duplicates)
 
 
-def _to_summary(a: Activity) -> ActivitySummary:
+def _to_summary(a: Activity | ActivitySummaryView) -> ActivitySummary:
     return ActivitySummary(
         id=str(a.id),
         sport=a.sport,
@@ -157,5 +282,6 @@ def _to_detail(a: Activity) -> ActivityDetail:
         intensity_factor=a.intensity_factor,
         description=a.description,
         is_combined=a.is_combined,
-        has_records=len(a.records) > 0,
+        has_records=a.sample_count > 0,
+        data_quality={name: q.model_dump() for name, q in a.data_quality.items()},
     )
@@ -17,6 +17,7 @@ from fastapi.responses import Response, StreamingResponse
 import httpx
 
 from app.core.auth import get_current_user
+from app.core.compute import compute
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.ai_coach import (
@@ -45,7 +46,7 @@ from app.services.workout_modifier import (
     apply_modifications,
     generate_modification_preview,
 )
-from app.services.fit_generator import generate_workout_file, generate_fit_from_ai_workout
+from app.services.fit_generator import generate_workout_file, build_workout_zip
 
 router = APIRouter()
 
@@ -549,9 +550,6 @@ async def generate_weekly_plan_fits(
     The AI uses the fitness-coach-lora model to generate complete workout
     specifications with all steps needed for structured workouts.
     """
-    import io
-    import zipfile
-
     # Build context
     context = await build_coaching_context(
         user,
@@ -594,27 +592,11 @@ async def generate_weekly_plan_fits(
             detail="AI generated no workouts. Try rephrasing your goals.",
         )
 
-    # Generate FIT files for each workout
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for workout in workouts:
-            try:
-                fit_data = generate_fit_from_ai_workout(workout)
-                # Create safe filename
-                date = workout.get("date", "unknown")
-                name = workout.get("name", "workout")
-                safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in name)[:30]
-                filename = f"{date}_{safe_name}.fit"
-                zip_file.writestr(filename, fit_data)
-            except Exception as e:
-                # Log error but continue with other workouts
-                print(f"Error generating FIT for {workout.get('name')}: {e}")
-                continue
-
-    zip_buffer.seek(0)
+    # Generate FIT files for each workout off the event loop
+    zip_data = await compute.run_light(build_workout_zip, workouts)
 
     return Response(
-        content=zip_buffer.getvalue(),
+        content=zip_data,
         media_type="application/zip",
         headers={
             "Content-Disposition": "attachment; filename=weekly_plan.zip",
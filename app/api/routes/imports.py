@@ -0,0 +1,84 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.models.import_job import ImportJob
+from app.models.user import User
+from app.schemas.import_job import ImportFileErrorResponse, ImportJobResponse
+from app.services.bulk_import import ACTIVE_STATUSES, create_import_job
+from app.services.upload_spool import spool_upload
+
+router = APIRouter()
+
+
+@router.post("/", response_model=ImportJobResponse, status_code=202)
+async def start_import(
+    file: UploadFile = File(...),
+    user: User = Depends(get_current_user),
+):
+    """Upload a ZIP of .FIT / .FIT.gz files and import them in the background."""
+    if not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Only .zip archives are supported")
+
+    with await spool_upload(file, settings.import_max_bytes) as upload:
+        job = await create_import_job(upload, user, file.filename)
+    return _to_response(job)
+
+
+@router.get("/", response_model=list[ImportJobResponse])
+async def list_imports(user: User = Depends(get_current_user)):
+    jobs = await ImportJob.find(ImportJob.user_id == str(user.id)).sort(-ImportJob.created_at).to_list()
+    return [_to_response(j) for j in jobs]
+
+
+@router.get("/{job_id}", response_model=ImportJobResponse)
+async def get_import(job_id: str, user: User = Depends(get_current_user)):
+    return _to_response(await _get_job(job_id, user))
+
+
+@router.get("/{job_id}/events")
+async def stream_import(job_id: str, user: User = Depends(get_current_user)):
+    """Stream job progress as server-sent events until the job finishes."""
+    job = await _get_job(job_id, user)
+
+    async def events():
+        current = job
+        while True:
+            yield f"data: {_to_response(current).model_dump_json()}\n\n"
+            if current.status not in ACTIVE_STATUSES:
+                return
+            await asyncio.sleep(settings.import_poll_interval_s)
+            current = await ImportJob.get(job_id)
+            if current is None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def _get_job(job_id: str, user: User) -> ImportJob:
+    job = await ImportJob.get(job_id)
+    if not job or job.user_id != str(user.id):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+def _to_response(j: ImportJob) -> ImportJobResponse:
+    return ImportJobResponse(
+        id=str(j.id),
+        status=j.status,
+        original_filename=j.original_filename,
+        total=j.total,
+        processed=j.processed,
+        imported=j.imported,
+        duplicates=j.duplicates,
+        overlapping=j.overlapping,
+        failed=j.failed,
+        errors=[ImportFileErrorResponse(**e.model_dump()) for e in j.errors],
+        detail=j.detail,
+        created_at=j.created_at,
+        updated_at=j.updated_at,
+        finished_at=j.finished_at,
+    )
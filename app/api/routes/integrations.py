@@ -96,6 +96,8 @@ async def concept2_sync(user: User = Depends(get_current_user)):
     import httpx
     from datetime import datetime, timezone
     from app.models.activity import Activity
+    from app.services.activity_events import on_activities_changed
+    from app.services.fingerprint import compute_fingerprint, find_near_duplicates_batch
 
     async with httpx.AsyncClient() as client:
         # Fetch all results (paginate if needed)
@@ -110,17 +112,18 @@ async def concept2_sync(user: User = Depends(get_current_user)):
         results_data = resp.json()
 
     results = results_data.get("data", [])
-    imported_count = 0
     skipped_count = 0
 
+    # Results imported by an earlier sync, found with one query
+    already_imported = set(await Activity.get_motor_collection().distinct("source_id", {
+        "user_id": str(user.id),
+        "source": "concept2",
+        "source_id": {"$in": [result.get("id") for result in results]},
+    }))
+
+    activities = []
     for result in results:
-        # Check if already imported by source_id
-        existing = await Activity.find_one(
-            Activity.source == "concept2",
-            Activity.source_id == result.get("id"),
-            Activity.user_id == str(user.id),
-        )
-        if existing:
+        if result.get("id") in already_imported:
             skipped_count += 1
             continue
 
@@ -135,7 +138,7 @@ async def concept2_sync(user: User = Depends(get_current_user)):
             avg_heart_rate = result.get("heart_rate")
             calories = result.get("calories")
             
-            activity = Activity(
+            activities.append(Activity(
                 user_id=str(user.id),
                 source="concept2",
                 source_id=result.get("id"),
@@ -151,19 +154,45 @@ async def concept2_sync(user: User = Depends(get_current_user)):
                 avg_heart_rate=avg_heart_rate,
                 records=[],  # Concept2 API doesn't provide time-series data
                 laps=[],
-            )
-            await activity.insert()
-            imported_count += 1
+            ))
         except Exception as e:
             # Log error but continue with next result
             print(f"Failed to import Concept2 result {result.get('id')}: {str(e)}")
             skipped_count += 1
             continue
 
+    # Summary-only fingerprints, so FIT recordings of the same rows are recognised
+    for activity in activities:
+        activity.fingerprint = compute_fingerprint(None, {}, activity.total_timer_time, activity.total_distance)
+
+    # Rows already recorded by a device (e.g. a FIT upload of the same piece)
+    # are not imported a second time
+    duplicates = []
+    if activities:
+        candidates = await find_near_duplicates_batch(activities, str(user.id))
+        duplicates = [
+            {"source_id": a.source_id, "start_time": a.start_time, "duplicates": found}
+            for a, found in zip(activities, candidates)
+            if found
+        ]
+        activities = [a for a, found in zip(activities, candidates) if not found]
+
+    if activities:
+        await Activity.insert_many(activities)
+    imported_count = len(activities)
+    imported_days = {a.start_time.date() for a in activities}
+
+    await on_activities_changed(str(user.id), imported_days)
+
     return {
         "imported_count": imported_count,
         "skipped_count": skipped_count,
-        "message": f"Imported {imported_count} workouts from Concept2. {skipped_count} were already imported or skipped."
+        "duplicate_count": len(duplicates),
+        "duplicates": duplicates,
+        "message": (
+            f"Imported {imported_count} workouts from Concept2. {skipped_count} were already imported or skipped"
+            f" and {len(duplicates)} match activities already recorded."
+        ),
     }
 
 
@@ -1,15 +1,27 @@
 from datetime import date, timedelta
+from typing import Literal
 
 from fastapi import APIRouter, Depends, Query
 
 from app.core.auth import get_current_user
 from app.models.user import User
-from app.schemas.metrics import MetricsRange, PerformanceSnapshot, WeeklySummary
+from app.schemas.metrics import (
+    ForecastRequest,
+    LoadForecast,
+    MetricsRange,
+    PerformanceSnapshot,
+    PowerCurve,
+    WeeklySummary,
+    ZoneDistributionReport,
+)
 from app.services.metrics import (
     compute_metrics_range,
     get_performance_snapshot,
     get_weekly_summaries,
+    get_zone_distribution,
 )
+from app.services.forecast import forecast_load
+from app.services.power_curve import get_power_curve
 
 router = APIRouter()
 
@@ -37,3 +49,34 @@ async def get_weekly(
 ):
     """Get weekly training summaries."""
     return await get_weekly_summaries(str(user.id), weeks)
+
+
+@router.get("/zones", response_model=ZoneDistributionReport)
+async def get_zone_distribution_report(
+    start: date = Query(...),
+    end: date = Query(...),
+    user: User = Depends(get_current_user),
+):
+    """Get time in HR and power zones per week, folded into an 80/20 intensity split."""
+    return await get_zone_distribution(str(user.id), start, end, user)
+
+
+@router.get("/power-curve", response_model=PowerCurve)
+async def get_power_duration_curve(
+    window: Literal["42d", "90d", "season", "all"] = Query("90d"),
+    user: User = Depends(get_current_user),
+):
+    """Get the best average power for every duration over the last 42/90 days, season or all time."""
+    return await get_power_curve(str(user.id), window)
+
+
+@router.post("/forecast", response_model=LoadForecast)
+async def forecast_training_load(
+    data: ForecastRequest,
+    user: User = Depends(get_current_user),
+):
+    """
+    Project CTL/ATL/TSB over the next weeks for one or more candidate plans,
+    e.g. the scheduled workouts against an AI proposal from /ai/plan/analyze.
+    """
+    return await forecast_load(user, data.weeks, data.plans, data.race_date)
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.core.auth import get_current_user
+from app.models.reprocess_job import ReprocessJob
+from app.models.user import User
+from app.schemas.reprocess_job import ReprocessJobResponse
+from app.services.reprocessing import create_reprocess_job
+
+router = APIRouter()
+
+
+@router.post("/", response_model=ReprocessJobResponse, status_code=202)
+async def start_reprocess(user: User = Depends(get_current_user)):
+    """Rescore all of the user's activities with their current settings in the background."""
+    job = await create_reprocess_job(str(user.id), "manual")
+    return _to_response(job)
+
+
+@router.get("/", response_model=list[ReprocessJobResponse])
+async def list_reprocess_jobs(user: User = Depends(get_current_user)):
+    jobs = await ReprocessJob.find(ReprocessJob.user_id == str(user.id)).sort(-ReprocessJob.created_at).to_list()
+    return [_to_response(j) for j in jobs]
+
+
+@router.get("/{job_id}", response_model=ReprocessJobResponse)
+async def get_reprocess_job(job_id: str, user: User = Depends(get_current_user)):
+    job = await ReprocessJob.get(job_id)
+    if not job or job.user_id != str(user.id):
+        raise HTTPException(status_code=404, detail="Reprocess job not found")
+    return _to_response(job)
+
+
+def _to_response(j: ReprocessJob) -> ReprocessJobResponse:
+    return ReprocessJobResponse(
+        id=str(j.id),
+        reason=j.reason,
+        status=j.status,
+        total=j.total,
+        processed=j.processed,
+        updated=j.updated,
+        failed=j.failed,
+        detail=j.detail,
+        created_at=j.created_at,
+        updated_at=j.updated_at,
+        finished_at=j.finished_at,
+    )
@@ -1,8 +1,16 @@
 from fastapi import APIRouter, Depends
 
 from app.core.auth import get_current_user
-from app.models.user import User
-from app.schemas.zones import ZoneResult, ZoneMethodInfo, UpdateThresholds, UpdateZoneConfig
+from app.models.user import SportScaling, User
+from app.schemas.zones import (
+    ZoneResult,
+    ZoneMethodInfo,
+    UpdateSportScaling,
+    UpdateThresholds,
+    UpdateZoneConfig,
+)
+from app.services.reprocessing import create_reprocess_job
+from app.services.snapshot_cache import invalidate_snapshot
 from app.services.zone_calculator import (
     calculate_hr_zones,
     calculate_power_zones,
@@ -54,12 +62,13 @@ async def update_thresholds(
     data: UpdateThresholds,
     user: User = Depends(get_current_user),
 ):
-    """Update the user's threshold values (LTHR, FTP, CP, etc.)."""
+    """Update the user's threshold values (LTHR, FTP, CP, etc.) and rescore their activities."""
+    before = user.thresholds.model_dump()
     update_data = data.model_dump(exclude_none=True)
     for key, value in update_data.items():
         setattr(user.thresholds, key, value)
     await user.save()
-    return {"status": "updated"}
+    return await _rescore_if_changed(user, before != user.thresholds.model_dump(), "thresholds")
 
 
 @router.put("/config")
@@ -67,9 +76,32 @@ async def update_zone_config(
     data: UpdateZoneConfig,
     user: User = Depends(get_current_user),
 ):
-    """Update the user's zone calculation method preferences."""
+    """Update the user's zone calculation method preferences and rescore their activities."""
+    before = user.zone_config.model_dump()
     update_data = data.model_dump(exclude_none=True)
     for key, value in update_data.items():
         setattr(user.zone_config, key, value)
     await user.save()
-    return {"status": "updated"}
+    return await _rescore_if_changed(user, before != user.zone_config.model_dump(), "zone_config")
+
+
+@router.put("/scaling")
+async def update_sport_scaling(
+    data: UpdateSportScaling,
+    user: User = Depends(get_current_user),
+):
+    """Replace the user's per-sport TSS scaling factors and rescore their activities."""
+    scaling = [SportScaling(**entry.model_dump()) for entry in data.sport_scaling]
+    changed = scaling != user.sport_scaling
+    user.sport_scaling = scaling
+    await user.save()
+    return await _rescore_if_changed(user, changed, "sport_scaling")
+
+
+async def _rescore_if_changed(user: User, changed: bool, reason: str) -> dict:
+    """Queue a background rescoring of the user's activities when scoring inputs changed."""
+    if not changed:
+        return {"status": "updated", "reprocess_job_id": None}
+    await invalidate_snapshot(str(user.id))
+    job = await create_reprocess_job(str(user.id), reason)
+    return {"status": "updated", "reprocess_job_id": str(job.id)}
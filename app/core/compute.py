@@ -0,0 +1,191 @@
+"""
+Shared executor for CPU-bound work.
+
+Heavy jobs (FIT decoding, archive imports) run in a process pool and light
+jobs (scoring, FIT encoding, record merging) in a thread pool, so a large
+upload does not stall the event loop for every other request in the worker.
+
+Each pool admits at most ``workers + max_queue`` jobs at once. Beyond that,
+callers get a 503 with a Retry-After header instead of queueing unboundedly.
+Jobs that exceed their timeout fail with a 504. A timed-out job keeps its
+admission slot until it actually finishes.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+# Number of recent jobs kept for latency percentiles
+LATENCY_WINDOW = 500
+
+
+def _run_timed(fn: Callable, args: tuple, kwargs: dict) -> tuple[float, float, Any]:
+    """Run ``fn`` in the worker and report when it started and how long it took."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time() - started, result
+
+
+class _Pool:
+    """One bounded pool plus its counters."""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._factory = factory
+        self._executor: Executor | None = None
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._queue_wait_s: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._run_s: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def submit(self, fn: Callable, args: tuple, kwargs: dict) -> Future:
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise self.retry_later()
+        if self._executor is None:
+            self._executor = self._factory()
+
+        submitted_at = time.time()
+        future = self._executor.submit(_run_timed, fn, args, kwargs)
+        self.in_flight += 1
+        self.submitted += 1
+
+        # Done callbacks fire on pool threads; update counters on the event loop
+        loop = asyncio.get_running_loop()
+
+        def _on_done(f: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finish, f, submitted_at)
+            except RuntimeError:
+                pass  # event loop already closed during shutdown
+
+        future.add_done_callback(_on_done)
+        return future
+
+    def _finish(self, future: Future, submitted_at: float) -> None:
+        self.in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            return
+        started, duration, _ = future.result()
+        self.completed += 1
+        self._queue_wait_s.append(max(0.0, started - submitted_at))
+        self._run_s.append(duration)
+
+    def retry_later(self) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="Server is busy processing other files. Please retry shortly.",
+            headers={"Retry-After": str(settings.compute_retry_after_s)},
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        def percentiles(samples: deque[float]) -> dict:
+            if not samples:
+                return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+            arr = np.fromiter(samples, dtype=np.float64) * 1000.0
+            return {
+                "p50_ms": round(float(np.percentile(arr, 50)), 1),
+                "p95_ms": round(float(np.percentile(arr, 95)), 1),
+                "max_ms": round(float(arr.max()), 1),
+            }
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_wait": percentiles(self._queue_wait_s),
+            "run_time": percentiles(self._run_s),
+        }
+
+
+class ComputeExecutor:
+    """Process pool for heavy jobs, thread pool for light ones."""
+
+    def __init__(self):
+        self.heavy = _Pool(
+            "process",
+            lambda: ProcessPoolExecutor(
+                max_workers=settings.compute_process_workers,
+                # spawn: never fork a process holding the event loop and DB client
+                mp_context=multiprocessing.get_context("spawn"),
+            ),
+            settings.compute_process_workers,
+            settings.compute_max_queue,
+        )
+        self.light = _Pool(
+            "thread",
+            lambda: ThreadPoolExecutor(
+                max_workers=settings.compute_thread_workers,
+                thread_name_prefix="compute",
+            ),
+            settings.compute_thread_workers,
+            settings.compute_max_queue,
+        )
+
+    async def _run(self, pool: _Pool, fn: Callable, args: tuple, kwargs: dict, timeout: float | None):
+        future = pool.submit(fn, args, kwargs)
+        try:
+            _, _, result = await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout=timeout or settings.compute_job_timeout_s,
+            )
+        except asyncio.TimeoutError:
+            pool.timed_out += 1
+            raise HTTPException(
+                status_code=504,
+                detail="Processing took too long. Please try again later.",
+            )
+        except BrokenExecutor:
+            # A worker died (e.g. OOM); start a fresh pool for the next job
+            pool.shutdown()
+            raise pool.retry_later()
+        return result
+
+    async def run_heavy(self, fn: Callable, *args, timeout: float | None = None, **kwargs):
+        """Run a picklable top-level function in the process pool."""
+        return await self._run(self.heavy, fn, args, kwargs, timeout)
+
+    async def run_light(self, fn: Callable, *args, timeout: float | None = None, **kwargs):
+        """Run a function in the thread pool."""
+        return await self._run(self.light, fn, args, kwargs, timeout)
+
+    def stats(self) -> dict:
+        return {"process_pool": self.heavy.stats(), "thread_pool": self.light.stats()}
+
+    def shutdown(self) -> None:
+        self.heavy.shutdown()
+        self.light.shutdown()
+
+
+compute = ComputeExecutor()
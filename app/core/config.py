@@ -25,6 +25,60 @@ class Settings(BaseSettings):
     ollama_base_url: str = "http://localhost:11434"
     ollama_model_name: str = "fitness-coach-lora"
 
+    # Compute executor (CPU-bound work off the event loop)
+    compute_process_workers: int = 2
+    compute_thread_workers: int = 4
+    compute_max_queue: int = 16  # jobs waiting per pool before returning 503
+    compute_job_timeout_s: float = 120.0
+    compute_retry_after_s: int = 5
+
+    # Uploads
+    upload_max_bytes: int = 100 * 1024 * 1024
+    upload_chunk_bytes: int = 1024 * 1024
+    upload_spool_dir: Optional[str] = None  # defaults to the system temp dir
+    parse_cache_entries: int = 32  # decoded FIT files kept in memory, by file hash
+    pending_upload_dir: Optional[str] = None  # duplicate uploads awaiting confirmation
+    pending_upload_ttl_s: int = 7 * 24 * 3600  # unconfirmed duplicate uploads are dropped after this
+    pending_upload_purge_interval_s: float = 3600.0  # how often stashed files of expired uploads are deleted
+
+    # Signal cleaning of decoded channels (see app.services.signal_cleaning)
+    cleaning_power_spike_w: float = 1000.0  # deviation from the local median
+    cleaning_power_max_w: float = 4000.0  # above any human sprint or rowing start
+    cleaning_speed_spike_mps: float = 6.0
+    cleaning_speed_max_mps: float = 40.0
+    cleaning_hr_min_bpm: float = 25.0
+    cleaning_hr_max_bpm: float = 240.0
+    cleaning_hr_max_gap_s: float = 20.0  # longer dropouts are left missing
+    cleaning_gps_max_speed_mps: float = 60.0
+    cleaning_gps_max_jump_samples: int = 30  # longest run of positions treated as a jump
+    cleaning_hr_flatline_s: float = 180.0  # a repeated value this long is a frozen sensor
+    cleaning_power_flatline_s: float = 60.0  # counted only where there is no cadence
+    cleaning_power_flatline_no_cadence_s: float = 1800.0
+
+    # Metrics
+    power_curve_cache_entries: int = 256  # (user, window) power-duration envelopes kept in memory
+    power_curve_cache_ttl_s: float = 300.0  # bounds staleness when another worker invalidated a user
+    weekly_summary_cache_entries: int = 16384  # completed (user, week) summaries kept in memory
+    weekly_summary_cache_ttl_s: float = 86400.0
+    snapshot_cache_entries: int = 1024  # per-user performance snapshots kept in memory
+    snapshot_cache_ttl_s: float = 60.0  # bounds staleness when another worker invalidated a user
+    snapshot_cache_shared: bool = False  # also share snapshots between workers through MongoDB
+    snapshot_cache_shared_ttl_s: int = 3600
+    load_lock_lease_s: int = 60  # per-user lease held while daily load is rewritten
+    load_lock_poll_s: float = 0.1  # wait between attempts to take a held lease
+    user_state_flush_interval_s: float = 5.0  # write-behind interval for User.current_ctl / current_atl
+
+    # Bulk archive imports
+    import_max_bytes: int = 2 * 1024 * 1024 * 1024
+    import_dir: Optional[str] = None  # archives awaiting import; defaults to the system temp dir
+    import_batch_size: int = 50  # files per decode / insert_many / checkpoint
+    import_lease_s: int = 300
+    import_poll_interval_s: float = 1.0
+
+    # Background rescoring after threshold / scaling / formula changes
+    reprocess_batch_size: int = 200  # activities per query / bulk_write / checkpoint
+    reprocess_lease_s: int = 300
+
     # App
     app_host: str = "0.0.0.0"
     app_port: int = 8000
@@ -15,11 +15,17 @@ async def init_db():
     # Import all document models here
     from app.models.user import User
     from app.models.activity import Activity
+    from app.models.daily_load import DailyLoad, LoadCheckpoint, LoadLock
+    from app.models.import_job import ImportJob
+    from app.models.pending_upload import PendingUpload
+    from app.models.reprocess_job import ReprocessJob
+    from app.models.snapshot_cache import CachedSnapshot
     from app.models.workout import PlannedWorkout
 
     await init_beanie(
         database=db,
-        document_models=[User, Activity, PlannedWorkout],
+        document_models=[User, Activity, PlannedWorkout, ImportJob, ReprocessJob, PendingUpload,
+                         DailyLoad, LoadCheckpoint, LoadLock, CachedSnapshot],
     )
 
 
@@ -3,15 +3,31 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.compute import compute
 from app.core.config import settings
 from app.core.database import init_db, close_db
-from app.api.routes import auth, activities, metrics, zones, workouts, integrations, ai_coach
+from app.api.routes import auth, activities, imports, metrics, reprocess, zones, workouts, integrations, ai_coach
+from app.services.bulk_import import cancel_import_tasks, resume_import_jobs
+from app.services.pending_uploads import start_pending_upload_purger, stop_pending_upload_purger
+from app.services.reprocessing import cancel_reprocess_tasks, resume_reprocess_jobs, schedule_metrics_upgrade
+from app.services.snapshot_cache import snapshot_cache_stats
+from app.services.user_state import start_user_state_flusher, stop_user_state_flusher
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    start_user_state_flusher()
+    await resume_import_jobs()
+    await resume_reprocess_jobs()
+    await schedule_metrics_upgrade()
+    start_pending_upload_purger()
     yield
+    await cancel_import_tasks()
+    await cancel_reprocess_tasks()
+    await stop_user_state_flusher()
+    await stop_pending_upload_purger()
+    compute.shutdown()
     await close_db()
 
 
@@ -38,6 +54,8 @@ app.add_middleware(
 # Register routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(activities.router, prefix="/api/v1/activities", tags=["activities"])
+app.include_router(imports.router, prefix="/api/v1/imports", tags=["imports"])
+app.include_router(reprocess.router, prefix="/api/v1/reprocess", tags=["reprocess"])
 app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["metrics"])
 app.include_router(zones.router, prefix="/api/v1/zones", tags=["zones"])
 app.include_router(workouts.router, prefix="/api/v1/workouts", tags=["workouts"])
@@ -48,3 +66,15 @@ app.include_router(ai_coach.router, prefix="/api/v1/ai", tags=["ai-coach"])
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "version": "0.1.0"}
+
+
+@app.get("/health/compute")
+async def compute_stats():
+    """Queue depth and job latency of the CPU executor pools."""
+    return compute.stats()
+
+
+@app.get("/health/caches")
+async def cache_stats():
+    """Size and hit/miss counts of the per-user response caches."""
+    return {"performance_snapshot": snapshot_cache_stats()}
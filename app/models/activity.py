@@ -1,8 +1,17 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from beanie import Document
-from pydantic import BaseModel, Field
+import numpy as np
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.utils.stream_codec import (
+    INT_CHANNELS,
+    TIME_CHANNEL,
+    VALUE_CHANNELS,
+    decode_channel,
+    encode_channel,
+)
 
 
 class RecordPoint(BaseModel):
@@ -32,6 +41,81 @@ class LapSummary(BaseModel):
     avg_speed: Optional[float] = None
 
 
+class ChannelQuality(BaseModel):
+    """Data-quality stats of one channel from the ingest cleaning stage."""
+    samples: int  # samples with a value as recorded
+    missing: int = 0  # samples without a value after cleaning
+    spikes: int = 0  # spikes clamped to the local median
+    interpolated: int = 0  # dropout samples filled in
+    rejected: int = 0  # readings dropped (frozen sensor, dropout, GPS jump)
+
+
+class ZoneTime(BaseModel):
+    """Seconds spent in each zone of one zone method (see app.services.zone_time)."""
+    method: str  # zone method id, e.g. "joe_friel_run" or "andy_coggan"
+    threshold: float  # threshold the bounds were derived from (bpm or watts)
+    bounds: list[float]  # lower bound of each zone, absolute units
+    seconds: list[float]
+
+
+class ActivityFingerprint(BaseModel):
+    """Signal shapes and lookup keys for near-duplicate detection (see app.services.fingerprint)."""
+    version: int
+    shapes: dict[str, list[float]] = Field(default_factory=dict)  # channel -> z-normalized bins
+    keys: list[str] = Field(default_factory=list)  # SimHash bands and size buckets
+
+
+class StreamChannel(BaseModel):
+    """One packed time-series channel (see app.utils.stream_codec)."""
+    encoding: str  # delta, float32
+    dtype: str  # NumPy dtype string of the packed payload
+    data: bytes
+    mask: Optional[bytes] = None  # packed validity bits if samples are missing
+
+
+class ActivityStreams(BaseModel):
+    """Columnar time-series storage: one binary field per channel."""
+    sample_count: int = 0
+    channels: dict[str, StreamChannel] = Field(default_factory=dict)
+
+
+def channels_from_records(records: list[RecordPoint], start_time: datetime) -> dict[str, np.ndarray]:
+    """Convert a list of RecordPoints into channel arrays keyed by channel name."""
+    channels = {
+        TIME_CHANNEL: np.array(
+            [round((r.timestamp - start_time).total_seconds()) for r in records],
+            dtype=np.int64,
+        )
+    }
+    for name in VALUE_CHANNELS:
+        channels[name] = np.array([getattr(r, name) for r in records], dtype=np.float64)
+    return channels
+
+
+def records_from_channels(channels: dict[str, np.ndarray], start_time: datetime) -> list[RecordPoint]:
+    """Inverse of `channels_from_records`."""
+    offsets = channels.get(TIME_CHANNEL)
+    if offsets is None:
+        return []
+
+    columns = {}
+    for name in VALUE_CHANNELS:
+        values = channels.get(name)
+        if values is not None:
+            columns[name] = [None if np.isnan(v) else v for v in values.tolist()]
+
+    points = []
+    for i, offset in enumerate(offsets.tolist()):
+        point = {"timestamp": start_time + timedelta(seconds=offset)}
+        for name, values in columns.items():
+            value = values[i]
+            if value is not None and name in INT_CHANNELS:
+                value = int(value)
+            point[name] = value
+        points.append(RecordPoint.model_construct(**point))
+    return points
+
+
 class Activity(Document):
     user_id: str
     source: str = "upload"  # upload, garmin, concept2
@@ -74,18 +158,132 @@ class Activity(Document):
     scaled_tss: Optional[float] = None  # TSS after sport scaling
 
     # Time-series data (stored for graphing, combining)
-    records: list[RecordPoint] = Field(default_factory=list)
+    streams: Optional[ActivityStreams] = None
+    records: list[RecordPoint] = Field(default_factory=list)  # legacy row format
     laps: list[LapSummary] = Field(default_factory=list)
+    data_quality: dict[str, ChannelQuality] = Field(default_factory=dict)
+
+    # Time in the user's configured zones, computed at ingest
+    hr_zone_time: Optional[ZoneTime] = None
+    power_zone_time: Optional[ZoneTime] = None
+    # Best average watts for each of app.services.power_curve.POWER_CURVE_DURATIONS
+    power_curve: Optional[list[float]] = None
+    fingerprint: Optional[ActivityFingerprint] = None
+    # app.services.metrics.METRICS_VERSION the metrics above were computed with
+    metrics_version: int = 0
 
     # Metadata
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_combined: bool = False  # True if this activity was created by combining files
     combined_from: list[str] = Field(default_factory=list)  # Activity IDs combined
 
+    _channel_cache: dict = PrivateAttr(default_factory=dict)
+
     class Settings:
         name = "activities"
         indexes = [
             "user_id",
             "start_time",
             [("user_id", 1), ("start_time", -1)],
+            [("user_id", 1), ("file_hash", 1)],
+            [("user_id", 1), ("start_time", 1), ("end_time", 1)],  # duplicate overlap queries
+            [("user_id", 1), ("fingerprint.keys", 1)],  # near-duplicate lookups
         ]
+
+    @property
+    def sample_count(self) -> int:
+        if self.streams is not None:
+            return self.streams.sample_count
+        return len(self.records)
+
+    def channel(self, name: str) -> np.ndarray | None:
+        """
+        Return one time-series channel as a NumPy array, decoding it lazily.
+
+        ``time`` holds integer seconds offsets from ``start_time``; every other
+        channel is float64 with NaN for missing samples. Returns None if the
+        activity has no data for the channel.
+        """
+        if name in self._channel_cache:
+            return self._channel_cache[name]
+
+        if self.streams is None:
+            if not self.records:
+                return None
+            for key, values in channels_from_records(self.records, self.start_time).items():
+                if key != TIME_CHANNEL and np.isnan(values).all():
+                    values = None
+                self._channel_cache[key] = values
+            return self._channel_cache.get(name)
+
+        encoded = self.streams.channels.get(name)
+        if encoded is None:
+            self._channel_cache[name] = None
+            return None
+        values = decode_channel(
+            name,
+            encoded.encoding,
+            encoded.dtype,
+            encoded.data,
+            encoded.mask,
+            self.streams.sample_count,
+        )
+        self._channel_cache[name] = values
+        return values
+
+    def set_channels(self, channels: dict[str, np.ndarray]) -> None:
+        """Encode channel arrays (as returned by `channel`) into ``streams``."""
+        offsets = channels[TIME_CHANNEL]
+        encoded = {TIME_CHANNEL: StreamChannel(**encode_channel(TIME_CHANNEL, offsets))}
+        for name in VALUE_CHANNELS:
+            values = channels.get(name)
+            if values is None:
+                continue
+            packed = encode_channel(name, values)
+            if packed is not None:
+                encoded[name] = StreamChannel(**packed)
+
+        self.streams = ActivityStreams(sample_count=len(offsets), channels=encoded)
+        self.records = []
+        self._channel_cache = {}
+
+    def channels(self) -> dict[str, np.ndarray]:
+        """Return every available channel, decoded, keyed by channel name."""
+        channels = {}
+        for name in (TIME_CHANNEL,) + VALUE_CHANNELS:
+            values = self.channel(name)
+            if values is not None:
+                channels[name] = values
+        return channels
+
+    def record_points(self) -> list[RecordPoint]:
+        """Materialize the time-series as RecordPoints (for row-oriented API output)."""
+        return records_from_channels(self.channels(), self.start_time)
+
+
+class ActivityLoadView(BaseModel):
+    """Projection of an Activity for training-load aggregates; never loads time-series."""
+    start_time: datetime
+    sport: str = "other"
+    total_timer_time: float = 0.0
+    total_distance: Optional[float] = None
+    tss: Optional[float] = None
+    scaled_tss: Optional[float] = None
+
+
+class ActivitySummaryView(BaseModel):
+    """Projection of an Activity's summary fields for listings; never loads time-series."""
+    id: PydanticObjectId = Field(alias="_id")
+    source: str = "upload"
+    sport: str = "other"
+    sub_sport: Optional[str] = None
+    name: Optional[str] = None
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    total_timer_time: float = 0.0
+    total_distance: Optional[float] = None
+    avg_heart_rate: Optional[int] = None
+    avg_power: Optional[int] = None
+    normalized_power: Optional[float] = None
+    tss: Optional[float] = None
+    scaled_tss: Optional[float] = None
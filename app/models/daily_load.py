@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Optional
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+
+class DailyLoad(Document):
+    """One user's summed training load for one day with activities."""
+    user_id: str
+    day: datetime  # midnight UTC
+
+    tss: float = 0.0
+    scaled_tss: float = 0.0
+
+    class Settings:
+        name = "daily_load"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        ]
+
+
+class LoadCheckpoint(Document):
+    """
+    CTL/ATL state of one user at the start of a month (before that day's load).
+
+    Checkpoints run contiguously from the month of the user's first activity to
+    the month after the last one. A user without activities has a single zero
+    checkpoint, so they are not backfilled again on every read.
+    """
+    user_id: str
+    day: datetime  # first day of the month, midnight UTC
+
+    # Unrounded EWMA state at the end of the previous day
+    ctl: float = 0.0
+    atl: float = 0.0
+
+    class Settings:
+        name = "load_checkpoints"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        ]
+
+
+class LoadLock(Document):
+    """
+    Lease on one user's daily load, held while their rows and checkpoints are
+    rewritten, so updates from different worker processes never interleave.
+    """
+    user_id: str
+    owner: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+    class Settings:
+        name = "load_locks"
+        indexes = [
+            IndexModel([("user_id", ASCENDING)], unique=True),
+        ]
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from beanie import Document
+from pydantic import BaseModel, Field
+
+
+class ImportFileError(BaseModel):
+    """A file in the archive that could not be imported."""
+    filename: str
+    detail: str
+
+
+class ImportJob(Document):
+    """Bulk import of an archive of FIT files, processed in the background."""
+    user_id: str
+    status: str = "queued"  # queued, running, completed, failed
+
+    # Archive spooled to disk and the FIT entries found in it, in processing order
+    archive_path: str
+    original_filename: Optional[str] = None
+    entries: list[str] = Field(default_factory=list)
+
+    # Checkpoint: entries[:processed] are done; a restarted job resumes from here
+    processed: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    overlapping: int = 0  # imported, but overlapping a stored activity (candidates for combining)
+    failed: int = 0
+    errors: list[ImportFileError] = Field(default_factory=list)
+    detail: Optional[str] = None  # reason the whole job failed
+
+    # Worker processes only run a job while holding its lease; every write of
+    # a running job is conditional on lease_owner, so a worker that lost the
+    # lease stops instead of processing the same batch twice
+    lease_expires_at: Optional[datetime] = None
+    lease_owner: Optional[str] = None
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "import_jobs"
+        indexes = [
+            "user_id",
+            "status",
+        ]
+
+    @property
+    def total(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from app.core.config import settings
+
+
+class PendingUpload(Document):
+    """
+    An upload held back as a possible duplicate until the user decides.
+
+    Holds the session summary (an Activity without records) and the stashed
+    FIT file; confirming or combining promotes it to an Activity with the same
+    id. Abandoned uploads expire through the TTL index.
+    """
+    user_id: str
+    file_hash: str
+    activity: dict  # Activity fields of the summary, without id and streams
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "pending_uploads"
+        indexes = [
+            "user_id",
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.pending_upload_ttl_s),
+        ]
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+
+
+class ReprocessJob(Document):
+    """Rescoring of stored activities after thresholds or metric formulas changed."""
+    user_id: Optional[str] = None  # None: every user's stale activities
+    reason: str  # thresholds, zone_config, sport_scaling, metrics_upgrade, manual
+    status: str = "queued"  # queued, running, completed, failed, superseded
+
+    # Checkpoint: activities are walked in _id order and everything up to
+    # last_id is done; a restarted job resumes after it
+    last_id: Optional[PydanticObjectId] = None
+    total: int = 0
+    processed: int = 0
+    updated: int = 0  # activities whose TSS changed
+    failed: int = 0
+    detail: Optional[str] = None  # reason the whole job failed
+
+    # Worker processes only run a job while holding its lease
+    lease_expires_at: Optional[datetime] = None
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "reprocess_jobs"
+        indexes = [
+            "user_id",
+            "status",
+        ]
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+from app.core.config import settings
+
+
+class CachedSnapshot(Document):
+    """A user's performance snapshot shared between worker processes."""
+    user_id: str
+    day: datetime  # midnight UTC of the day the snapshot is for
+    snapshot: dict  # PerformanceSnapshot fields
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "snapshot_cache"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.snapshot_cache_shared_ttl_s),
+        ]
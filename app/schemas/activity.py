@@ -36,6 +36,7 @@ class ActivityDetail(ActivitySummary):
     description: Optional[str] = None
     is_combined: bool = False
     has_records: bool = False
+    data_quality: dict[str, dict] = {}  # channel -> cleaning stats
 
 
 class DuplicateCandidate(BaseModel):
@@ -46,6 +47,8 @@ class DuplicateCandidate(BaseModel):
     new_start: datetime
     new_end: Optional[datetime] = None
     overlap_seconds: float
+    exact_match: bool = False  # same file hash as the existing activity
+    similarity: Optional[float] = None  # signal-shape correlation of a near-duplicate
 
 
 class CombineRequest(BaseModel):
@@ -53,3 +56,18 @@ class CombineRequest(BaseModel):
     activity_id_2: str
     time_offset_ms: int = 0  # manual alignment offset
     prefer_data_from: int = 1  # 1 or 2: which file's HR/power data to prefer on conflict
+    max_gap_s: float = 0  # seconds; interpolate missing samples across shorter gaps (0: off)
+
+
+class AlignRequest(BaseModel):
+    activity_id_1: str
+    activity_id_2: str
+    max_offset_s: Optional[int] = 600  # search window around the recorded start times; None: any offset
+
+
+class TimeOffsetEstimate(BaseModel):
+    time_offset_ms: int  # pass as CombineRequest.time_offset_ms
+    confidence: float  # 0-1: peak height and how clearly it beats the next-best offset
+    peak_correlation: float  # availability-weighted correlation at the offset
+    overlap_seconds: float  # seconds both activities have data at the offset
+    channels: dict[str, float] = {}  # channel -> correlation at the offset
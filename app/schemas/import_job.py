@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ImportFileErrorResponse(BaseModel):
+    filename: str
+    detail: str
+
+
+class ImportJobResponse(BaseModel):
+    id: str
+    status: str  # queued, running, completed, failed
+    original_filename: Optional[str] = None
+    total: int
+    processed: int
+    imported: int
+    duplicates: int
+    overlapping: int
+    failed: int
+    errors: list[ImportFileErrorResponse]
+    detail: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -1,7 +1,7 @@
 from datetime import date, datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class DailyMetrics(BaseModel):
@@ -44,3 +44,85 @@ class PerformanceSnapshot(BaseModel):
     ramp_rate_7d: float  # CTL change per week
     ramp_rate_28d: float
     ramp_rate_90d: float
+
+
+class IntensityDistribution(BaseModel):
+    """Time in zones of one zone method, folded into low / moderate / high intensity."""
+    method: str
+    zone_seconds: list[float]  # per zone of the method
+    low_seconds: float
+    moderate_seconds: float
+    high_seconds: float
+    low_fraction: float  # 0.8 for a textbook 80/20 week
+    moderate_fraction: float
+    high_fraction: float
+
+
+class WeeklyZoneDistribution(BaseModel):
+    week_start: date
+    hr: Optional[IntensityDistribution] = None
+    power: Optional[IntensityDistribution] = None
+
+
+class ZoneDistributionReport(BaseModel):
+    start_date: date
+    end_date: date
+    hr: Optional[IntensityDistribution] = None  # whole range
+    power: Optional[IntensityDistribution] = None
+    weekly: list[WeeklyZoneDistribution]
+
+
+class PowerCurve(BaseModel):
+    """Best average power for each duration, over a window of activities."""
+    window: str  # 42d, 90d, season, all
+    start_date: Optional[date] = None  # None for all time
+    end_date: date
+    durations: list[int]  # seconds
+    watts: list[float]
+
+
+class ForecastWorkout(BaseModel):
+    """A hypothetical workout to add to a candidate plan."""
+    date: date
+    sport: str = "other"
+    estimated_tss: float = Field(ge=0)
+
+
+class ForecastPlan(BaseModel):
+    """
+    A candidate plan: the scheduled workouts (optionally), changed by an AI
+    coach response and extra workouts.
+    """
+    name: str
+    include_scheduled: bool = True
+    ai_response: Optional[dict] = None  # raw_response of /ai/plan/analyze or /ai/plan/generate
+    workouts: list[ForecastWorkout] = Field(default_factory=list)
+
+
+class ForecastRequest(BaseModel):
+    weeks: int = Field(4, ge=1, le=26)
+    race_date: Optional[date] = None
+    plans: list[ForecastPlan] = Field(
+        default_factory=lambda: [ForecastPlan(name="current")],
+        min_length=1,
+        max_length=10,
+    )
+
+
+class PlanForecast(BaseModel):
+    name: str
+    daily: list[DailyMetrics]
+    total_tss: float
+    unestimated_workouts: int  # workouts without estimated TSS, counted by duration
+    race_day: Optional[DailyMetrics] = None  # None without a race date inside the horizon
+    peak_ctl: float
+    min_tsb: float
+
+
+class LoadForecast(BaseModel):
+    """Projected CTL/ATL/TSB of candidate plans, seeded from today's load."""
+    start_date: date
+    end_date: date
+    seed_ctl: float
+    seed_atl: float
+    plans: list[PlanForecast]
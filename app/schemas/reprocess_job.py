@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ReprocessJobResponse(BaseModel):
+    id: str
+    reason: str
+    status: str  # queued, running, completed, failed, superseded
+    total: int
+    processed: int
+    updated: int
+    failed: int
+    detail: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Zone(BaseModel):
@@ -38,3 +38,12 @@ class UpdateZoneConfig(BaseModel):
     hr_activity: str | None = None
     power_method: str | None = None
     power_activity: str | None = None
+
+
+class SportScalingEntry(BaseModel):
+    sport: str
+    scaling_factor: float = Field(gt=0)
+
+
+class UpdateSportScaling(BaseModel):
+    sport_scaling: list[SportScalingEntry]
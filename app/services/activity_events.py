@@ -0,0 +1,29 @@
+"""
+Bookkeeping after a user's activities change.
+
+Every path that inserts, confirms, combines, rescores or deletes activities
+calls `on_activities_changed` with the days those activities start on, so
+derived data (daily load, cached curves and snapshots, the user's current
+CTL/ATL) is brought up to date in one place.
+"""
+
+from datetime import date
+from typing import Iterable
+
+from app.services.metrics import invalidate_weekly_summaries
+from app.services.power_curve import invalidate_power_curves
+from app.services.snapshot_cache import invalidate_snapshot
+from app.services.training_load import update_daily_load
+from app.services.user_state import refresh_current_load
+
+
+async def on_activities_changed(user_id: str, days: Iterable[date]) -> None:
+    """Update the daily load and current CTL/ATL and drop cached aggregates covering ``days``."""
+    days = set(days)
+    if not days:
+        return
+    invalidate_power_curves(user_id, days)
+    invalidate_weekly_summaries(user_id, days)
+    await update_daily_load(user_id, days)
+    await invalidate_snapshot(user_id)
+    await refresh_current_load(user_id)
@@ -0,0 +1,354 @@
+"""
+Background import of ZIP archives of .FIT / .FIT.gz files.
+
+A job walks the archive in batches of ``import_batch_size`` entries:
+
+1. the batch is split across the process pool and decoded in parallel,
+   decompressing gzip members on the fly;
+2. already-imported files and overlaps with stored activities are found with
+   one `find_duplicates_batch` query;
+3. new activities are scored and written with a single ``insert_many``, and
+   the daily training load is replayed once from the batch's earliest day;
+4. the job document is checkpointed.
+
+A job interrupted by a restart resumes from its last checkpoint. A job whose
+process died without shutting down keeps its lease until it expires; a
+background sweep restarts such jobs every half lease. The lease is renewed at
+every checkpoint and while a batch waits for the process pool, and all job
+writes are conditional on holding it, so a worker that lost its lease stops.
+Files from a batch that was written but not checkpointed are caught by the
+hash check and counted as duplicates.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import posixpath
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+from fastapi import HTTPException
+
+from app.core.compute import compute
+from app.core.config import settings
+from app.models.activity import Activity
+from app.models.import_job import ImportFileError, ImportJob
+from app.models.user import User
+from app.services.activity_events import on_activities_changed
+from app.services.duplicate_detector import find_duplicates_batch
+from app.services.fit_parser import build_activity, decode_fit_file
+from app.services.metrics import compute_activity_metrics
+from app.services.upload_spool import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+FIT_SUFFIXES = (".fit", ".fit.gz")
+ACTIVE_STATUSES = ("queued", "running")
+
+# Tasks of jobs running in this process, by job id
+_tasks: dict[str, asyncio.Task] = {}
+_sweeper: asyncio.Task | None = None
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job after its lease expired."""
+
+
+def _import_dir() -> str:
+    return settings.import_dir or os.path.join(tempfile.gettempdir(), "polarize-imports")
+
+
+def _list_fit_entries(archive_path: str) -> list[str]:
+    """Names of the FIT members of a ZIP archive, in a stable order."""
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            names = [
+                info.filename
+                for info in zf.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith("__MACOSX/")
+                and info.filename.lower().endswith(FIT_SUFFIXES)
+            ]
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Archive is not a valid ZIP file")
+    return sorted(names)
+
+
+def _read_entry(zf: zipfile.ZipFile, name: str) -> bytes:
+    limit = settings.upload_max_bytes
+    if zf.getinfo(name).file_size > limit:
+        raise ValueError("File exceeds the upload size limit")
+    with zf.open(name) as member:
+        if name.lower().endswith(".gz"):
+            with gzip.GzipFile(fileobj=member) as unzipped:
+                data = unzipped.read(limit + 1)
+        else:
+            data = member.read()
+    if len(data) > limit:
+        raise ValueError("File exceeds the upload size limit")
+    return data
+
+
+def decode_archive_entries(archive_path: str, names: list[str]) -> list[tuple[str, object]]:
+    """
+    Decode FIT members of an archive (runs in a worker process).
+
+    Returns (name, FitDecodeResult) for each decoded member and (name, error
+    message) for members that could not be read or decoded.
+    """
+    results: list[tuple[str, object]] = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for name in names:
+            try:
+                results.append((name, decode_fit_file(_read_entry(zf, name))))
+            except Exception as e:
+                results.append((name, str(e) or e.__class__.__name__))
+    return results
+
+
+async def create_import_job(upload: SpooledUpload, user: User, filename: str | None) -> ImportJob:
+    """Move a spooled archive to the import directory and queue a job for it."""
+    entries = await compute.run_light(_list_fit_entries, upload.path)
+    if not entries:
+        raise HTTPException(status_code=400, detail="Archive contains no .FIT or .FIT.gz files")
+
+    os.makedirs(_import_dir(), exist_ok=True)
+    archive_path = os.path.join(_import_dir(), os.path.basename(upload.path))
+    await compute.run_light(shutil.move, upload.path, archive_path)
+
+    job = ImportJob(
+        user_id=str(user.id),
+        archive_path=archive_path,
+        original_filename=filename,
+        entries=entries,
+    )
+    await job.insert()
+    start_import_job(job)
+    return job
+
+
+def start_import_job(job: ImportJob) -> None:
+    """Run a job in the background of this process unless it is already running."""
+    job_id = str(job.id)
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(_run_import_job(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+
+
+async def _resume_unleased_jobs() -> None:
+    """Start unfinished jobs that no live process holds the lease of."""
+    jobs = await ImportJob.find(
+        In(ImportJob.status, ACTIVE_STATUSES),
+        {"$or": [
+            {"lease_expires_at": None},
+            {"lease_expires_at": {"$lt": datetime.now(timezone.utc)}},
+        ]},
+    ).to_list()
+    for job in jobs:
+        start_import_job(job)
+
+
+async def _sweep_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.import_lease_s / 2)
+        try:
+            await _resume_unleased_jobs()
+        except Exception:
+            logger.exception("Resuming stale import jobs failed")
+
+
+async def resume_import_jobs() -> None:
+    """
+    Restart jobs left unfinished by a previous process and keep sweeping for
+    jobs whose lease expired (called at startup).
+    """
+    global _sweeper
+    await _resume_unleased_jobs()
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_loop())
+
+
+async def cancel_import_tasks() -> None:
+    """Stop the sweep and running jobs on shutdown; they resume from their checkpoint."""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _claim(job_id: str) -> str | None:
+    """
+    Take the job's lease so only one worker process runs it.
+
+    Returns the lease owner token, or None if another worker holds the lease.
+    The lease is renewed at every checkpoint, so a job whose process died is
+    picked up again by the sweep once the lease expires.
+    """
+    now = datetime.now(timezone.utc)
+    owner = uuid.uuid4().hex
+    result = await ImportJob.get_motor_collection().update_one(
+        {
+            "_id": PydanticObjectId(job_id),
+            "status": {"$in": list(ACTIVE_STATUSES)},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+        },
+        {"$set": {
+            "status": "running",
+            "lease_expires_at": now + timedelta(seconds=settings.import_lease_s),
+            "lease_owner": owner,
+        }},
+    )
+    return owner if result.modified_count == 1 else None
+
+
+async def _checkpoint(job: ImportJob, **fields) -> None:
+    """
+    Save the job's progress, and ``fields``, while it holds its lease.
+
+    Raises `LeaseLost` if another worker took the job over meanwhile.
+    """
+    job.updated_at = datetime.now(timezone.utc)
+    result = await ImportJob.get_motor_collection().update_one(
+        {"_id": job.id, "lease_owner": job.lease_owner},
+        {"$set": {
+            "processed": job.processed,
+            "imported": job.imported,
+            "duplicates": job.duplicates,
+            "overlapping": job.overlapping,
+            "failed": job.failed,
+            "errors": [e.model_dump() for e in job.errors],
+            "updated_at": job.updated_at,
+            **fields,
+        }},
+    )
+    if result.matched_count != 1:
+        raise LeaseLost(str(job.id))
+
+
+async def _renew_lease(job: ImportJob) -> None:
+    await _checkpoint(
+        job, lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.import_lease_s)
+    )
+
+
+async def _decode_batch(job: ImportJob, names: list[str]) -> list[tuple[str, object]]:
+    """Split a batch across the process pool, waiting (with the lease renewed) while the pool is full."""
+    workers = max(1, settings.compute_process_workers)
+    size = -(-len(names) // workers)
+    chunks = [names[i:i + size] for i in range(0, len(names), size)]
+
+    async def decode(chunk: list[str]) -> list[tuple[str, object]]:
+        while True:
+            try:
+                return await compute.run_heavy(decode_archive_entries, job.archive_path, chunk)
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                # Interactive uploads have priority; back off and retry,
+                # keeping the lease however long the pool stays busy
+                await _renew_lease(job)
+                await asyncio.sleep(settings.compute_retry_after_s)
+
+    decoded = await asyncio.gather(*(decode(chunk) for chunk in chunks))
+    return [item for chunk in decoded for item in chunk]
+
+
+async def _import_batch(job: ImportJob, user: User, names: list[str]) -> None:
+    decoded = await _decode_batch(job, names)
+
+    candidates: list[tuple[str, Activity]] = []
+    for name, result in decoded:
+        if isinstance(result, str):
+            job.failed += 1
+            job.errors.append(ImportFileError(filename=name, detail=result))
+            continue
+        candidates.append((name, build_activity(result, job.user_id, posixpath.basename(name))))
+
+    # One query resolves stored duplicates and overlaps for the whole batch
+    matches = await find_duplicates_batch([activity for _, activity in candidates], job.user_id)
+
+    activities: list[Activity] = []
+    seen: set[str] = set()
+    for (name, activity), duplicates in zip(candidates, matches):
+        if activity.file_hash in seen or any(d.exact_match for d in duplicates):
+            job.duplicates += 1
+            continue
+        seen.add(activity.file_hash)
+        if duplicates:
+            job.overlapping += 1
+        await compute_activity_metrics(activity, user)
+        activities.append(activity)
+
+    if activities:
+        # Stop before writing if another worker took the job over meanwhile
+        await _renew_lease(job)
+        await Activity.insert_many(activities)
+        await on_activities_changed(job.user_id, {a.start_time.date() for a in activities})
+    job.imported += len(activities)
+
+
+async def _run_import_job(job_id: str) -> None:
+    owner = await _claim(job_id)
+    if owner is None:
+        return
+    job = await ImportJob.get(job_id)
+    job.lease_owner = owner
+    user = await User.get(job.user_id)
+
+    try:
+        if user is None:
+            raise RuntimeError("User no longer exists")
+        while job.processed < job.total:
+            names = job.entries[job.processed:job.processed + settings.import_batch_size]
+            await _import_batch(job, user, names)
+
+            # Checkpoint and renew the lease
+            job.processed += len(names)
+            await _renew_lease(job)
+
+        job.status = "completed"
+    except LeaseLost:
+        logger.warning("Import job %s was taken over by another worker", job_id)
+        return
+    except asyncio.CancelledError:
+        # Shutdown: release the lease so the next start resumes immediately
+        try:
+            await _checkpoint(job, lease_expires_at=None)
+        except LeaseLost:
+            pass
+        raise
+    except Exception as e:
+        logger.exception("Import job %s failed", job_id)
+        job.status = "failed"
+        job.detail = str(e)
+
+    job.finished_at = datetime.now(timezone.utc)
+    try:
+        await _checkpoint(
+            job,
+            status=job.status,
+            detail=job.detail,
+            finished_at=job.finished_at,
+            lease_expires_at=None,
+        )
+    except LeaseLost:
+        logger.warning("Import job %s was taken over by another worker", job_id)
+        return
+    try:
+        os.unlink(job.archive_path)
+    except FileNotFoundError:
+        pass
@@ -11,7 +11,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from app.models.user import User
-from app.models.activity import Activity
+from app.models.activity import Activity, ActivitySummaryView
 from app.models.workout import PlannedWorkout
 from app.services.coach_prompts import (
     CoachType,
@@ -147,7 +147,7 @@ async def _get_recent_activities(
         Activity.user_id == str(user_id),
         Activity.start_time >= start,
         Activity.start_time <= end,
-    ).sort(-Activity.start_time).to_list()
+    ).sort(-Activity.start_time).project(ActivitySummaryView).to_list()
 
     summaries = []
     for act in activities:
@@ -1,10 +1,126 @@
-"""Detect duplicate or overlapping activities based on time windows."""
+"""
+Detect duplicate or overlapping activities based on time windows.
 
-from datetime import timedelta
+Candidates are resolved in batches: one query fetches every stored activity
+that shares a file hash with a candidate or overlaps one of the candidates'
+time windows (served by the ``(user_id, file_hash)`` and
+``(user_id, start_time, end_time)`` indexes), and an interval sweep over
+start-sorted activities pairs them up in memory. Windows that overlap are
+merged into one range of the query, so a batch of files from far-apart dates
+(archives are not in date order) does not fetch the history in between.
+"""
 
-from app.models.activity import Activity
+import heapq
+from datetime import datetime, timedelta
+
+from app.models.activity import Activity, ActivitySummaryView
 from app.schemas.activity import DuplicateCandidate
 
+# Widen each candidate's window by this much on each side when querying
+OVERLAP_TOLERANCE = timedelta(minutes=5)
+# Shortest overlap reported as a duplicate
+MIN_OVERLAP_S = 60
+
+
+class _StoredView(ActivitySummaryView):
+    file_hash: str | None = None
+
+
+def _end(start: datetime, end: datetime | None) -> datetime:
+    return end or start
+
+
+def _window_clusters(activities: list[Activity]) -> list[tuple[datetime, datetime]]:
+    """The candidates' windows, widened by OVERLAP_TOLERANCE, with overlapping ones merged."""
+    windows = sorted(
+        (a.start_time - OVERLAP_TOLERANCE, _end(a.start_time, a.end_time) + OVERLAP_TOLERANCE)
+        for a in activities
+    )
+    clusters = [list(windows[0])]
+    for lo, hi in windows[1:]:
+        if lo <= clusters[-1][1]:
+            clusters[-1][1] = max(clusters[-1][1], hi)
+        else:
+            clusters.append([lo, hi])
+    return [(lo, hi) for lo, hi in clusters]
+
+
+def _candidate(new: Activity, existing: ActivitySummaryView, overlap_seconds: float, exact: bool) -> DuplicateCandidate:
+    return DuplicateCandidate(
+        existing_id=str(existing.id),
+        existing_name=existing.name,
+        existing_start=existing.start_time,
+        existing_end=existing.end_time,
+        new_start=new.start_time,
+        new_end=new.end_time,
+        overlap_seconds=overlap_seconds,
+        exact_match=exact,
+    )
+
+
+async def find_duplicates_batch(activities: list[Activity], user_id: str) -> list[list[DuplicateCandidate]]:
+    """
+    Duplicate candidates of each of ``activities`` among the user's stored ones.
+
+    An activity whose file hash is already stored gets just that exact match;
+    otherwise it gets every stored activity overlapping it by more than
+    ``MIN_OVERLAP_S``.
+    """
+    if not activities:
+        return []
+
+    hashes = [a.file_hash for a in activities if a.file_hash]
+    conditions: list[dict] = [
+        {"start_time": {"$lte": hi}, "end_time": {"$gte": lo}}
+        for lo, hi in _window_clusters(activities)
+    ]
+    if hashes:
+        conditions.append({"file_hash": {"$in": hashes}})
+    stored = await Activity.find(
+        {"user_id": user_id, "$or": conditions},
+    ).project(_StoredView).to_list()
+
+    by_hash = {s.file_hash: s for s in stored if s.file_hash}
+    results: list[list[DuplicateCandidate]] = [[] for _ in activities]
+    pending: list[int] = []
+    for i, activity in enumerate(activities):
+        exact = by_hash.get(activity.file_hash) if activity.file_hash else None
+        if exact is not None:
+            results[i].append(_candidate(activity, exact, activity.total_timer_time, exact=True))
+        else:
+            pending.append(i)
+
+    # Sweep candidates in start order; stored activities join the active heap
+    # once they start before the candidate's window ends and leave it once they
+    # end before a window starts (later windows start no earlier).
+    timed = sorted((s for s in stored if s.end_time is not None), key=lambda s: s.start_time)
+    pending.sort(key=lambda i: activities[i].start_time)
+    active: list[tuple[datetime, int]] = []  # (end_time, index into timed)
+    next_stored = 0
+    for i in pending:
+        new = activities[i]
+        new_end = _end(new.start_time, new.end_time)
+        window_start = new.start_time - OVERLAP_TOLERANCE
+        window_end = new_end + OVERLAP_TOLERANCE
+
+        while next_stored < len(timed) and timed[next_stored].start_time <= window_end:
+            heapq.heappush(active, (timed[next_stored].end_time, next_stored))
+            next_stored += 1
+        while active and active[0][0] < window_start:
+            heapq.heappop(active)
+
+        for _, j in sorted(active, key=lambda item: item[1]):
+            existing = timed[j]
+            if existing.start_time > window_end:
+                continue
+            overlap_start = max(new.start_time, existing.start_time)
+            overlap_end = min(new_end, existing.end_time)
+            overlap_seconds = max(0.0, (overlap_end - overlap_start).total_seconds())
+            if overlap_seconds > MIN_OVERLAP_S:
+                results[i].append(_candidate(new, existing, overlap_seconds, exact=False))
+
+    return results
+
 
 async def find_duplicates(new_activity: Activity, user_id: str) -> list[DuplicateCandidate]:
     """
@@ -12,60 +128,4 @@ async def find_duplicates(new_activity: Activity, user_id: str) -> list[Duplicat
     Overlap is detected by comparing start/end time windows.
     Also checks file hash for exact duplicates.
     """
-    duplicates: list[DuplicateCandidate] = []
-
-    # Check exact hash match first
-    if new_activity.file_hash:
-        exact_match = await Activity.find_one(
-            Activity.user_id == user_id,
-            Activity.file_hash == new_activity.file_hash,
-        )
-        if exact_match:
-            duplicates.append(
-                DuplicateCandidate(
-                    existing_id=str(exact_match.id),
-                    existing_name=exact_match.name,
-                    existing_start=exact_match.start_time,
-                    existing_end=exact_match.end_time,
-                    new_start=new_activity.start_time,
-                    new_end=new_activity.end_time,
-                    overlap_seconds=new_activity.total_timer_time,
-                )
-            )
-            return duplicates
-
-    # Check time-based overlap
-    # Use a tolerance of 5 minutes on each side
-    tolerance = timedelta(minutes=5)
-    new_start = new_activity.start_time - tolerance
-    new_end = (new_activity.end_time or new_activity.start_time) + tolerance
-
-    overlapping = await Activity.find(
-        Activity.user_id == user_id,
-        Activity.start_time <= new_end,
-        Activity.end_time >= new_start,
-    ).to_list()
-
-    for existing in overlapping:
-        # Calculate overlap duration
-        overlap_start = max(new_activity.start_time, existing.start_time)
-        overlap_end = min(
-            new_activity.end_time or new_activity.start_time,
-            existing.end_time or existing.start_time,
-        )
-        overlap_seconds = max(0, (overlap_end - overlap_start).total_seconds())
-
-        if overlap_seconds > 60:  # At least 1 minute of overlap
-            duplicates.append(
-                DuplicateCandidate(
-                    existing_id=str(existing.id),
-                    existing_name=existing.name,
-                    existing_start=existing.start_time,
-                    existing_end=existing.end_time,
-                    new_start=new_activity.start_time,
-                    new_end=new_activity.end_time,
-                    overlap_seconds=overlap_seconds,
-                )
-            )
-
-    return duplicates
+    return (await find_duplicates_batch([new_activity], user_id))[0]
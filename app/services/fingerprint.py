@@ -0,0 +1,303 @@
+"""
+Signal fingerprints for near-duplicate detection across devices and sources.
+
+The same session recorded by a watch, a bike computer and a logbook produces
+files with different hashes and, when a clock is off, different start times.
+What they share is the shape of the effort over the session and its size:
+
+- each of the HR, power and speed channels is averaged into
+  ``FINGERPRINT_BINS`` bins over the session's own timeline (so the absolute
+  start time does not matter) and z-normalized, so offsets between sensors
+  cancel out;
+- each shape is hashed with random-hyperplane SimHash and the signature split
+  into bands; two recordings of the same session share at least one band with
+  high probability, unrelated sessions rarely do;
+- duration and distance are bucketed on a log scale, so summary-only sources
+  (Concept2 logbook entries) still get keys.
+
+All keys go into one multikey-indexed array, so candidates are found with one
+``$in`` query, restricted to recordings whose time window overlaps (unless a
+device clock looks reset), and then ranked by shape correlation and size. An
+overlapping window is what separates a second recording of the session from a
+repeat of the same workout later that day.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.models.activity import Activity, ActivityFingerprint, ActivitySummaryView
+from app.schemas.activity import DuplicateCandidate
+from app.services.duplicate_detector import OVERLAP_TOLERANCE
+
+# Bump when the fingerprint definition changes; older fingerprints never match
+FINGERPRINT_VERSION = 1
+
+FINGERPRINT_CHANNELS = ("heart_rate", "power", "speed")
+FINGERPRINT_BINS = 32
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 6
+
+# Duration and distance buckets are this ratio wide, and neighbours are queried
+SIZE_BUCKET_RATIO = 1.05
+
+# A candidate matches when the shared channels correlate this well on average
+# and durations (and distances, when both have one) differ by at most these ratios
+MIN_SHAPE_CORRELATION = 0.9
+MAX_DURATION_RATIO = 1.15
+MAX_DISTANCE_RATIO = 1.1
+MIN_DURATION_S = 300.0
+
+# Recordings of one session overlap in time, give or take OVERLAP_TOLERANCE,
+# unless a clock was wrong. Devices that lost their clock report dates around
+# their epoch (1989/2000) or in the future.
+EARLIEST_PLAUSIBLE_START = datetime(2005, 1, 1, tzinfo=timezone.utc)
+FUTURE_CLOCK_MARGIN = timedelta(days=1)
+
+# Fixed hyperplanes so fingerprints are comparable across processes and restarts
+_HYPERPLANES = np.random.default_rng(20240611).standard_normal(
+    (SIMHASH_BANDS * SIMHASH_BAND_BITS, FINGERPRINT_BINS)
+)
+
+
+class _FingerprintView(ActivitySummaryView):
+    fingerprint: ActivityFingerprint | None = None
+
+
+def _shape(time: np.ndarray, values: np.ndarray | None) -> np.ndarray | None:
+    """Z-normalized per-bin means of a channel over the session, or None if flat or missing."""
+    if values is None:
+        return None
+    valid = ~np.isnan(values) & (values > 0)
+    if valid.sum() < FINGERPRINT_BINS:
+        return None
+    t = time[valid].astype(np.float64)
+    span = t.max() - t.min()
+    if span <= 0:
+        return None
+    bins = np.minimum(((t - t.min()) / span * FINGERPRINT_BINS).astype(np.int64), FINGERPRINT_BINS - 1)
+    counts = np.bincount(bins, minlength=FINGERPRINT_BINS)
+    sums = np.bincount(bins, weights=values[valid], minlength=FINGERPRINT_BINS)
+    means = np.divide(sums, counts, out=np.full(FINGERPRINT_BINS, np.nan), where=counts > 0)
+    # Bins without samples (pauses) take the overall mean
+    means[np.isnan(means)] = np.nanmean(means)
+    std = means.std()
+    if std < 1e-6:
+        return None
+    return (means - means.mean()) / std
+
+
+def _band_keys(channel: str, shape: np.ndarray) -> list[str]:
+    bits = (_HYPERPLANES @ shape) > 0
+    keys = []
+    for band in range(SIMHASH_BANDS):
+        chunk = bits[band * SIMHASH_BAND_BITS:(band + 1) * SIMHASH_BAND_BITS]
+        value = int(np.packbits(chunk, bitorder="little")[0])
+        keys.append(f"{channel}:{band}:{value}")
+    return keys
+
+
+def _bucket(value: float) -> int:
+    return int(math.floor(math.log(value) / math.log(SIZE_BUCKET_RATIO)))
+
+
+def _size_keys(duration: float, distance: float | None, neighbours: bool) -> list[str]:
+    """Duration (and distance) bucket keys; with ``neighbours`` also the adjacent buckets."""
+    if duration < MIN_DURATION_S:
+        return []
+    offsets = (-1, 0, 1) if neighbours else (0,)
+    duration_buckets = [_bucket(duration) + o for o in offsets]
+    if not distance or distance <= 0:
+        return [f"t:{d}" for d in duration_buckets]
+    distance_buckets = [_bucket(distance) + o for o in offsets]
+    return [f"td:{d}:{m}" for d in duration_buckets for m in distance_buckets]
+
+
+def compute_fingerprint(
+    time: np.ndarray | None,
+    channels: dict[str, np.ndarray],
+    duration: float,
+    distance: float | None,
+) -> ActivityFingerprint | None:
+    """Fingerprint of a session from its channels (as returned by `Activity.channel`)."""
+    shapes: dict[str, list[float]] = {}
+    keys: list[str] = []
+    if time is not None:
+        for name in FINGERPRINT_CHANNELS:
+            shape = _shape(time, channels.get(name))
+            if shape is not None:
+                shapes[name] = np.round(shape, 3).tolist()
+                keys.extend(_band_keys(name, shape))
+    keys.extend(_size_keys(duration, distance, neighbours=False))
+    if not keys:
+        return None
+    return ActivityFingerprint(version=FINGERPRINT_VERSION, shapes=shapes, keys=keys)
+
+
+def activity_fingerprint(activity: Activity) -> ActivityFingerprint | None:
+    """Fingerprint of a stored or freshly decoded activity."""
+    return compute_fingerprint(
+        activity.channel("time"),
+        {name: activity.channel(name) for name in FINGERPRINT_CHANNELS},
+        activity.total_timer_time,
+        activity.total_distance,
+    )
+
+
+def _query_keys(fingerprint: ActivityFingerprint, duration: float, distance: float | None) -> list[str]:
+    """Keys to look up: the signal bands as stored, and neighbouring size buckets."""
+    keys = [k for k in fingerprint.keys if not k.startswith(("t:", "td:"))]
+    return keys + _size_keys(duration, distance, neighbours=True)
+
+
+def _utc(dt: datetime) -> datetime:
+    # MongoDB returns naive UTC datetimes
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _clock_suspect(start: datetime) -> bool:
+    start = _utc(start)
+    return start < EARLIEST_PLAUSIBLE_START or start > datetime.now(timezone.utc) + FUTURE_CLOCK_MARGIN
+
+
+def _window(activity: Activity | ActivitySummaryView) -> tuple[datetime, datetime]:
+    """Start and end of a recording; summary-only sources store no real end time."""
+    start = _utc(activity.start_time)
+    end = _utc(activity.end_time) if activity.end_time else start
+    return start, max(end, start + timedelta(seconds=activity.total_timer_time))
+
+
+def _windows_overlap(a: Activity, b: ActivitySummaryView) -> bool:
+    if _clock_suspect(a.start_time) or _clock_suspect(b.start_time):
+        return True
+    a_start, a_end = _window(a)
+    b_start, b_end = _window(b)
+    return a_start <= b_end + OVERLAP_TOLERANCE and b_start <= a_end + OVERLAP_TOLERANCE
+
+
+def _time_condition(activity: Activity) -> dict | None:
+    """
+    Stored activities that may overlap ``activity``, as a start-time range
+    (stored durations are at most MAX_DURATION_RATIO longer), or whose clock
+    looks reset. None when the activity's own clock looks reset.
+    """
+    if _clock_suspect(activity.start_time):
+        return None
+    start, end = _window(activity)
+    longest = timedelta(seconds=activity.total_timer_time * MAX_DURATION_RATIO)
+    return {"$or": [
+        {"start_time": {"$gte": start - longest - OVERLAP_TOLERANCE, "$lte": end + OVERLAP_TOLERANCE}},
+        {"start_time": {"$lt": EARLIEST_PLAUSIBLE_START}},
+        {"start_time": {"$gt": datetime.now(timezone.utc) + FUTURE_CLOCK_MARGIN}},
+    ]}
+
+
+def _similarity(a: ActivityFingerprint, b: ActivityFingerprint) -> float | None:
+    """Mean shape correlation over the channels both fingerprints have, or None if none are shared."""
+    shared = a.shapes.keys() & b.shapes.keys()
+    if not shared:
+        return None
+    return float(np.mean([
+        np.dot(a.shapes[name], b.shapes[name]) / FINGERPRINT_BINS
+        for name in shared
+    ]))
+
+
+def _same_size(a: Activity, b: ActivitySummaryView) -> bool:
+    longer = max(a.total_timer_time, b.total_timer_time)
+    shorter = min(a.total_timer_time, b.total_timer_time)
+    if shorter <= 0 or longer / shorter > MAX_DURATION_RATIO:
+        return False
+    if a.total_distance and b.total_distance:
+        longer = max(a.total_distance, b.total_distance)
+        shorter = min(a.total_distance, b.total_distance)
+        return longer / shorter <= MAX_DISTANCE_RATIO
+    return True
+
+
+def _match(
+    activity: Activity,
+    fingerprint: ActivityFingerprint,
+    existing: _FingerprintView,
+) -> tuple[bool, float | None]:
+    """Whether ``existing`` looks like another recording of ``activity``, and the shape similarity."""
+    if activity.id is not None and existing.id == activity.id:
+        return False, None
+    if not _same_size(activity, existing) or not _windows_overlap(activity, existing):
+        return False, None
+    similarity = _similarity(fingerprint, existing.fingerprint)
+    if fingerprint.shapes and existing.fingerprint.shapes:
+        if similarity is None or similarity < MIN_SHAPE_CORRELATION:
+            return False, None
+    # Otherwise one side is summary-only (e.g. a logbook entry): overlapping
+    # time, duration and distance are all there is to compare
+    return True, similarity
+
+
+async def find_near_duplicates_batch(
+    activities: list[Activity],
+    user_id: str,
+) -> list[list[DuplicateCandidate]]:
+    """
+    Stored activities that look like another recording of each of
+    ``activities`` (by their ``fingerprint``), best match first. Windows must
+    overlap within ``OVERLAP_TOLERANCE`` unless either clock looks reset.
+    All activities are looked up with one query.
+    """
+    results: list[list[DuplicateCandidate]] = [[] for _ in activities]
+    lookups = [
+        (i, a, set(_query_keys(a.fingerprint, a.total_timer_time, a.total_distance)))
+        for i, a in enumerate(activities)
+        if a.fingerprint is not None and a.total_timer_time >= MIN_DURATION_S
+    ]
+    if not lookups:
+        return results
+
+    conditions = []
+    for _, activity, keys in lookups:
+        condition: dict = {
+            "fingerprint.keys": {"$in": sorted(keys)},
+            "total_timer_time": {
+                "$gte": activity.total_timer_time / MAX_DURATION_RATIO,
+                "$lte": activity.total_timer_time * MAX_DURATION_RATIO,
+            },
+        }
+        time_condition = _time_condition(activity)
+        if time_condition is not None:
+            condition = {"$and": [condition, time_condition]}
+        conditions.append(condition)
+    stored = await Activity.find({
+        "user_id": user_id,
+        "fingerprint.version": FINGERPRINT_VERSION,
+        "$or": conditions,
+    }).project(_FingerprintView).to_list()
+
+    for i, activity, keys in lookups:
+        matches: list[tuple[float | None, _FingerprintView]] = []
+        for existing in stored:
+            if keys.isdisjoint(existing.fingerprint.keys):
+                continue
+            matched, similarity = _match(activity, activity.fingerprint, existing)
+            if matched:
+                matches.append((similarity, existing))
+        matches.sort(key=lambda match: match[0] or 0.0, reverse=True)
+        results[i] = [
+            DuplicateCandidate(
+                existing_id=str(existing.id),
+                existing_name=existing.name,
+                existing_start=existing.start_time,
+                existing_end=existing.end_time,
+                new_start=activity.start_time,
+                new_end=activity.end_time,
+                overlap_seconds=min(activity.total_timer_time, existing.total_timer_time),
+                similarity=round(similarity, 3) if similarity is not None else None,
+            )
+            for similarity, existing in matches
+        ]
+    return results
+
+
+async def find_near_duplicates(activity: Activity, user_id: str) -> list[DuplicateCandidate]:
+    """Stored activities that look like another recording of ``activity``, best match first."""
+    return (await find_near_duplicates_batch([activity], user_id))[0]
@@ -1,10 +1,30 @@
-"""Combine two overlapping FIT file activities into one."""
+"""
+Combine two overlapping FIT file activities into one.
+
+`estimate_time_offset` finds the ``time_offset_ms`` that lines the second
+activity up with the first: both are resampled to a 1 s grid, and HR, power,
+speed and cadence are cross-correlated with FFTs over every lag at once.
+Correlations are computed over the samples both channels have at each lag
+(masked normalized cross-correlation) and the channels are averaged weighted by
+that overlap, so a channel recorded by only part of one file counts for less.
+"""
 
 from datetime import datetime, timedelta, timezone
 
+import numpy as np
 from fastapi import HTTPException
 
-from app.models.activity import Activity, RecordPoint
+from app.core.compute import compute
+from app.models.activity import Activity
+from app.schemas.activity import TimeOffsetEstimate
+from app.utils.stream_codec import INT_CHANNELS, TIME_CHANNEL, VALUE_CHANNELS
+
+# Offset estimation
+ALIGN_CHANNELS = ("heart_rate", "power", "speed", "cadence")
+ALIGN_MAX_GAP_S = 5.0  # gaps bridged when resampling to the 1 s grid
+ALIGN_MIN_OVERLAP_S = 120  # shortest overlap a channel is correlated over
+ALIGN_PEAK_EXCLUSION_S = 30  # the runner-up peak is looked for outside this window
+ALIGN_MAX_DURATION_S = 2 * 86400  # longer recordings are truncated
 
 
 async def combine_activities(
@@ -13,6 +33,7 @@ async def combine_activities(
     user_id: str,
     time_offset_ms: int = 0,
     prefer_data_from: int = 1,
+    max_gap_s: float = 0,
 ) -> Activity:
     """
     Combine two activities into a single merged activity.
@@ -24,6 +45,8 @@ async def combine_activities(
         time_offset_ms: Manual time alignment offset in milliseconds
                         (applied to activity_2 timestamps)
         prefer_data_from: Which activity's data to prefer for conflicts (1 or 2)
+        max_gap_s: Interpolate missing samples across gaps up to this long
+                   (seconds; 0 leaves gaps as they are)
     """
     act1 = await Activity.get(activity_id_1)
     act2 = await Activity.get(activity_id_2)
@@ -33,16 +56,7 @@ async def combine_activities(
     if not act2 or act2.user_id != user_id:
         raise HTTPException(status_code=404, detail=f"Activity {activity_id_2} not found")
 
-    # Apply time offset to activity 2's records
     offset = timedelta(milliseconds=time_offset_ms)
-    records_2 = []
-    for r in act2.records:
-        adjusted = r.model_copy()
-        adjusted.timestamp = r.timestamp + offset
-        records_2.append(adjusted)
-
-    # Merge records by timestamp
-    merged_records = _merge_records(act1.records, records_2, prefer_data_from)
 
     # Compute merged summary stats
     start_time = min(act1.start_time, act2.start_time + offset)
@@ -52,6 +66,18 @@ async def combine_activities(
     )
     total_timer_time = (end_time - start_time).total_seconds()
 
+    # Merge channels by timestamp (time offset applied to activity 2) off the event loop
+    merged_channels = await compute.run_light(
+        _merge_channels,
+        act1.channels(),
+        act1.start_time,
+        act2.channels(),
+        act2.start_time + offset,
+        prefer_data_from,
+        start_time,
+        max_gap_s,
+    )
+
     # Build combined activity
     combined = Activity(
         user_id=user_id,
@@ -63,98 +89,293 @@ async def combine_activities(
         end_time=end_time,
         total_timer_time=total_timer_time,
         total_elapsed_time=total_timer_time,
-        records=merged_records,
         laps=act1.laps + act2.laps,  # concatenate laps
         is_combined=True,
         combined_from=[str(act1.id), str(act2.id)],
     )
 
+    if merged_channels:
+        combined.set_channels(merged_channels)
+
     # Recompute summary stats from merged records
     _compute_summary_from_records(combined)
 
     return combined
 
 
-def _merge_records(
-    records_1: list[RecordPoint],
-    records_2: list[RecordPoint],
-    prefer: int = 1,
-) -> list[RecordPoint]:
+def _grid_offsets(channels: dict, start: datetime, start_time: datetime) -> np.ndarray | None:
+    """Sample times of one activity in whole seconds from ``start_time``."""
+    offsets = channels.get(TIME_CHANNEL)
+    if offsets is None:
+        return None
+    shift = (start - start_time).total_seconds()
+    return np.rint(offsets + shift).astype(np.int64)
+
+
+def _fill_gaps(time: np.ndarray, values: np.ndarray, max_gap_s: float) -> np.ndarray:
+    """Interpolate missing samples between readings at most ``max_gap_s`` apart."""
+    valid = ~np.isnan(values)
+    present = np.flatnonzero(valid)
+    if len(present) < 2 or valid.all():
+        return values
+    missing = np.flatnonzero(~valid)
+    after = np.searchsorted(present, missing)
+    inner = (after > 0) & (after < len(present))
+    missing, after = missing[inner], after[inner]
+    span = time[present[after]] - time[present[after - 1]]
+    fill = missing[span <= max_gap_s]
+    out = values.copy()
+    out[fill] = np.interp(time[fill], time[present], values[present])
+    return out
+
+
+def _merge_channels(
+    channels_1: dict,
+    start_1: datetime,
+    channels_2: dict,
+    start_2: datetime,
+    prefer: int,
+    start_time: datetime,
+    max_gap_s: float = 0,
+) -> dict:
     """
-    Merge two lists of record points by timestamp.
-    When timestamps overlap (within 1 second), merge fields preferring
-    data from the specified source.
+    Merge two activities' channel arrays on a common one-second grid.
+
+    Samples are placed on the union of both activities' timestamps (rounded to
+    the second). For each channel the non-preferred activity's values are laid
+    down first and the preferred activity's values replace them wherever it has
+    a reading, so a second covered by both keeps e.g. HR from one device and
+    power from the other. With ``max_gap_s`` missing samples between readings at
+    most that far apart are interpolated.
     """
-    # Index records by rounded timestamp (to nearest second)
-    by_time: dict[int, RecordPoint] = {}
-
-    # Add records from the non-preferred source first
-    secondary = records_2 if prefer == 1 else records_1
-    primary = records_1 if prefer == 1 else records_2
-
-    for r in secondary:
-        ts_key = int(r.timestamp.timestamp())
-        by_time[ts_key] = r.model_copy()
-
-    # Overlay with preferred source (overwrites conflicting fields)
-    for r in primary:
-        ts_key = int(r.timestamp.timestamp())
-        if ts_key in by_time:
-            existing = by_time[ts_key]
-            # Merge: prefer primary for non-None fields
-            merged = existing.model_copy()
-            for field_name in RecordPoint.model_fields:
-                primary_val = getattr(r, field_name)
-                if primary_val is not None:
-                    setattr(merged, field_name, primary_val)
-            by_time[ts_key] = merged
-        else:
-            by_time[ts_key] = r.model_copy()
-
-    # Sort by timestamp
-    return sorted(by_time.values(), key=lambda r: r.timestamp)
+    time_1 = _grid_offsets(channels_1, start_1, start_time)
+    time_2 = _grid_offsets(channels_2, start_2, start_time)
+    sources = [(t, c) for t, c in ((time_1, channels_1), (time_2, channels_2)) if t is not None and len(t)]
+    if not sources:
+        return {}
+    if prefer != 1:
+        sources.reverse()  # preferred source first
+
+    grid = np.unique(np.concatenate([t for t, _ in sources]))
+    positions = [np.searchsorted(grid, t) for t, _ in sources]
+
+    merged = {TIME_CHANNEL: grid}
+    for name in VALUE_CHANNELS:
+        values = np.full(len(grid), np.nan)
+        found = False
+        # Preferred source last, so its readings win
+        for (_, channels), index in zip(reversed(sources), reversed(positions)):
+            column = channels.get(name)
+            if column is None:
+                continue
+            found = True
+            present = ~np.isnan(column)
+            values[index[present]] = column[present]
+        if not found:
+            continue
+        if max_gap_s > 0:
+            values = _fill_gaps(grid, values, max_gap_s)
+            if name in INT_CHANNELS:
+                values = np.rint(values)
+        merged[name] = values
+    return merged
 
 
 def _compute_summary_from_records(activity: Activity) -> None:
     """Recompute summary statistics from merged record data."""
-    if not activity.records:
+    if not activity.sample_count:
         return
 
-    hrs = [r.heart_rate for r in activity.records if r.heart_rate is not None]
-    powers = [r.power for r in activity.records if r.power is not None]
-    cadences = [r.cadence for r in activity.records if r.cadence is not None]
-    speeds = [r.speed for r in activity.records if r.speed is not None]
-    altitudes = [r.altitude for r in activity.records if r.altitude is not None]
-
-    if hrs:
-        activity.avg_heart_rate = round(sum(hrs) / len(hrs))
-        activity.max_heart_rate = max(hrs)
-    if powers:
-        activity.avg_power = round(sum(powers) / len(powers))
-        activity.max_power = max(powers)
-    if cadences:
-        activity.avg_cadence = round(sum(cadences) / len(cadences))
-    if speeds:
-        activity.avg_speed = sum(speeds) / len(speeds)
-        activity.max_speed = max(speeds)
+    def present(name: str) -> np.ndarray:
+        values = activity.channel(name)
+        if values is None:
+            return np.empty(0)
+        return values[~np.isnan(values)]
+
+    hrs = present("heart_rate")
+    powers = present("power")
+    cadences = present("cadence")
+    speeds = present("speed")
+    altitudes = present("altitude")
+
+    if hrs.size:
+        activity.avg_heart_rate = round(float(hrs.mean()))
+        activity.max_heart_rate = int(hrs.max())
+    if powers.size:
+        activity.avg_power = round(float(powers.mean()))
+        activity.max_power = int(powers.max())
+    if cadences.size:
+        activity.avg_cadence = round(float(cadences.mean()))
+    if speeds.size:
+        activity.avg_speed = float(speeds.mean())
+        activity.max_speed = float(speeds.max())
 
     # Distance from last record
-    distances = [r.distance for r in activity.records if r.distance is not None]
-    if distances:
-        activity.total_distance = max(distances)
+    distances = present("distance")
+    if distances.size:
+        activity.total_distance = float(distances.max())
 
     # Elevation
-    if altitudes and len(altitudes) > 1:
-        ascent = 0.0
-        descent = 0.0
-        for i in range(1, len(altitudes)):
-            diff = altitudes[i] - altitudes[i - 1]
-            if diff > 0:
-                ascent += diff
-            else:
-                descent += abs(diff)
-        activity.total_ascent = round(ascent, 1)
-        activity.total_descent = round(descent, 1)
+    if altitudes.size > 1:
+        diffs = np.diff(altitudes)
+        activity.total_ascent = round(float(diffs[diffs > 0].sum()), 1)
+        activity.total_descent = round(float(-diffs[diffs < 0].sum()), 1)
+
+
+def _utc(dt: datetime) -> datetime:
+    # MongoDB returns naive UTC datetimes
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _resample(channels: dict) -> dict[str, np.ndarray]:
+    """Alignment channels on a 1 s grid from the activity start, NaN where missing."""
+    offsets = channels.get(TIME_CHANNEL)
+    if offsets is None:
+        return {}
+    seconds = np.rint(offsets).astype(np.int64)
+    keep = (seconds >= 0) & (seconds < ALIGN_MAX_DURATION_S)
+    if not keep.any():
+        return {}
+    length = int(seconds[keep].max()) + 1
+    grid = np.arange(length)
+
+    resampled = {}
+    for name in ALIGN_CHANNELS:
+        values = channels.get(name)
+        if values is None:
+            continue
+        present = keep & ~np.isnan(values)
+        on_grid = np.full(length, np.nan)
+        on_grid[seconds[present]] = values[present]
+        on_grid = _fill_gaps(grid, on_grid, ALIGN_MAX_GAP_S)
+        if np.count_nonzero(~np.isnan(on_grid)) >= ALIGN_MIN_OVERLAP_S:
+            resampled[name] = on_grid
+    return resampled
+
+
+def _xcorr(a: np.ndarray, b: np.ndarray, size: int, lags: np.ndarray) -> np.ndarray:
+    """``sum_t a[t] * b[t - k]`` for each lag k, given the real FFTs of a and b."""
+    return np.fft.irfft(a * np.conj(b), size)[lags % size]
+
+
+def _masked_correlation(
+    x: np.ndarray,
+    y: np.ndarray,
+    size: int,
+    lags: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pearson correlation of ``x[t]`` and ``y[t - k]`` over the samples both
+    have, for each lag k, and the number of those samples (0 where too few).
+    """
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    # Centred so the sums of squares stay small relative to FFT rounding
+    x0 = np.where(mx, x - np.nanmean(x), 0.0)
+    y0 = np.where(my, y - np.nanmean(y), 0.0)
+    fmx, fmy = np.fft.rfft(mx.astype(np.float64), size), np.fft.rfft(my.astype(np.float64), size)
+    fx, fy = np.fft.rfft(x0, size), np.fft.rfft(y0, size)
+
+    n = np.rint(_xcorr(fmx, fmy, size, lags))
+    sx = _xcorr(fx, fmy, size, lags)
+    sy = _xcorr(fmx, fy, size, lags)
+    sxx = _xcorr(np.fft.rfft(x0 * x0, size), fmy, size, lags)
+    syy = _xcorr(fmx, np.fft.rfft(y0 * y0, size), size, lags)
+    sxy = _xcorr(fx, fy, size, lags)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = (sxy - sx * sy / n) / np.sqrt(var_x * var_y)
+        valid = (n >= ALIGN_MIN_OVERLAP_S) & (var_x > 1e-6 * n) & (var_y > 1e-6 * n)
+    return np.where(valid, np.clip(r, -1.0, 1.0), 0.0), np.where(valid, n, 0.0)
+
+
+def _estimate_offset(
+    channels_1: dict,
+    start_1: datetime,
+    channels_2: dict,
+    start_2: datetime,
+    max_offset_s: int | None,
+) -> dict | None:
+    """Best offset to add to activity 2's timestamps (runs in the compute thread pool)."""
+    series_1, series_2 = _resample(channels_1), _resample(channels_2)
+    shared = [name for name in ALIGN_CHANNELS if name in series_1 and name in series_2]
+    if not shared:
+        return None
+    len_1, len_2 = len(series_1[shared[0]]), len(series_2[shared[0]])
+
+    # Lag k pairs second t of activity 1 with second t - k of activity 2, i.e.
+    # an offset of (start_1 - start_2) + k on activity 2's timestamps
+    base = (_utc(start_1) - _utc(start_2)).total_seconds()
+    lags = np.arange(-(len_2 - 1), len_1)
+    if max_offset_s is not None:
+        lags = lags[np.abs(base + lags) <= max_offset_s]
+    if not len(lags):
+        return None
+    size = 1 << (len_1 + len_2 - 1).bit_length()
+
+    weighted = np.zeros(len(lags))
+    weights = np.zeros(len(lags))
+    per_channel = {}
+    for name in shared:
+        r, n = _masked_correlation(series_1[name], series_2[name], size, lags)
+        weighted += r * n
+        weights += n
+        per_channel[name] = (r, n)
+    if not weights.any():
+        return None
+    score = np.where(weights > 0, weighted / np.maximum(weights, 1.0), -np.inf)
+
+    best = int(np.argmax(score))
+    peak = float(score[best])
+    # Sub-second refinement: vertex of the parabola through the peak and its neighbours
+    shift = 0.0
+    if 0 < best < len(lags) - 1 and np.isfinite(score[best - 1]) and np.isfinite(score[best + 1]):
+        curvature = score[best - 1] - 2 * peak + score[best + 1]
+        if curvature < 0:
+            shift = float(np.clip(0.5 * (score[best - 1] - score[best + 1]) / curvature, -0.5, 0.5))
+
+    far = np.abs(lags - lags[best]) > ALIGN_PEAK_EXCLUSION_S
+    runner_up = float(score[far].max()) if far.any() else 0.0
+    confidence = 0.0
+    if peak > 0:
+        confidence = peak * min(1.0, max(0.0, 1.0 - max(runner_up, 0.0) / peak))
+
+    return {
+        "time_offset_ms": int(round((base + lags[best] + shift) * 1000)),
+        "confidence": round(confidence, 3),
+        "peak_correlation": round(peak, 3),
+        "overlap_seconds": float(max(n[best] for _, n in per_channel.values())),
+        "channels": {
+            name: round(float(r[best]), 3) for name, (r, n) in per_channel.items() if n[best] > 0
+        },
+    }
+
+
+async def estimate_time_offset(
+    act1: Activity,
+    act2: Activity,
+    max_offset_s: int | None = 600,
+) -> TimeOffsetEstimate:
+    """
+    Estimate the ``time_offset_ms`` for `combine_activities` that aligns ``act2``
+    with ``act1``, searching offsets up to ``max_offset_s`` from the recorded
+    start times (any offset if None, e.g. when a device clock was reset).
+    """
+    estimate = await compute.run_light(
+        _estimate_offset,
+        act1.channels(),
+        act1.start_time,
+        act2.channels(),
+        act2.start_time,
+        max_offset_s,
+    )
+    if estimate is None:
+        raise HTTPException(
+            status_code=422,
+            detail="Not enough overlapping heart rate, power, speed or cadence data to estimate an offset",
+        )
+    return TimeOffsetEstimate(**estimate)
 
 
 def get_overlay_data(act1: Activity, act2: Activity, time_offset_ms: int = 0) -> dict:
@@ -162,19 +383,23 @@ def get_overlay_data(act1: Activity, act2: Activity, time_offset_ms: int = 0) ->
     Get overlay data for the visual alignment UI.
     Returns time-series data from both activities for HR, power, and speed.
     """
-    offset = timedelta(milliseconds=time_offset_ms)
+    offset_s = time_offset_ms / 1000.0
 
-    def extract_series(records: list[RecordPoint], base_time: datetime, apply_offset=False):
-        series = {"time_s": [], "heart_rate": [], "power": [], "speed": []}
-        for r in records:
-            ts = r.timestamp
-            if apply_offset:
-                ts = ts + offset
-            elapsed = (ts - base_time).total_seconds()
-            series["time_s"].append(elapsed)
-            series["heart_rate"].append(r.heart_rate)
-            series["power"].append(r.power)
-            series["speed"].append(r.speed)
+    def extract_series(act: Activity, base_time: datetime, apply_offset=False):
+        offsets = act.channel("time")
+        if offsets is None:
+            return {"time_s": [], "heart_rate": [], "power": [], "speed": []}
+
+        shift = (act.start_time - base_time).total_seconds()
+        if apply_offset:
+            shift += offset_s
+        series = {"time_s": (offsets + shift).tolist()}
+        for name in ("heart_rate", "power", "speed"):
+            values = act.channel(name)
+            if values is None:
+                series[name] = [None] * len(offsets)
+            else:
+                series[name] = [None if np.isnan(v) else v for v in values.tolist()]
         return series
 
     base_time = min(act1.start_time, act2.start_time)
@@ -182,10 +407,10 @@ def get_overlay_data(act1: Activity, act2: Activity, time_offset_ms: int = 0) ->
     return {
         "file_1": {
             "name": act1.name or act1.original_filename,
-            "data": extract_series(act1.records, base_time),
+            "data": extract_series(act1, base_time),
         },
         "file_2": {
             "name": act2.name or act2.original_filename,
-            "data": extract_series(act2.records, base_time, apply_offset=True),
+            "data": extract_series(act2, base_time, apply_offset=True),
         },
     }
@@ -2,18 +2,24 @@
 FIT File Generator Service
 
 Generates FIT workout files from planned workouts that can be synced
-to Garmin devices or other fitness platforms.
+to Garmin devices or other fitness platforms. The encoder can also write
+activity files (record, lap and session messages), which the parser
+benchmarks use to build synthetic input.
 
 Uses the FIT SDK to create properly formatted binary FIT files.
 """
 
 import io
+import logging
 import struct
+import zipfile
 from datetime import datetime, timezone
 from typing import Optional
 
+from app.core.compute import compute
 from app.models.workout import PlannedWorkout, WorkoutStep
 
+logger = logging.getLogger(__name__)
 
 # FIT Protocol Constants
 FIT_PROTOCOL_VERSION = 0x20  # 2.0
@@ -22,19 +28,36 @@ FIT_PROFILE_VERSION = 0x0814  # 20.84
 # Message types
 MESG_FILE_ID = 0
 MESG_FILE_CREATOR = 1
+MESG_SESSION = 18
+MESG_LAP = 19
+MESG_RECORD = 20
 MESG_WORKOUT = 26
 MESG_WORKOUT_STEP = 27
 
 # Field definitions
+FILE_TYPE_ACTIVITY = 4
 FILE_TYPE_WORKOUT = 5
 
 # Base types
 BASE_TYPE_ENUM = 0x00
-BASE_TYPE_UINT8 = 0x00
+BASE_TYPE_SINT8 = 0x01
+BASE_TYPE_UINT8 = 0x02
 BASE_TYPE_UINT16 = 0x84
+BASE_TYPE_SINT32 = 0x85
 BASE_TYPE_UINT32 = 0x86
 BASE_TYPE_STRING = 0x07
 
+# Invalid (missing) values per base type
+INVALID_SINT8 = 0x7F
+INVALID_UINT8 = 0xFF
+INVALID_UINT16 = 0xFFFF
+INVALID_SINT32 = 0x7FFFFFFF
+INVALID_UINT32 = 0xFFFFFFFF
+
+# FIT timestamps are seconds since 1989-12-31 00:00:00 UTC
+FIT_EPOCH = datetime(1989, 12, 31, 0, 0, 0, tzinfo=timezone.utc)
+SEMICIRCLES_PER_DEGREE = 2**31 / 180.0
+
 # Workout step intensity
 INTENSITY_ACTIVE = 0
 INTENSITY_REST = 1
@@ -110,11 +133,43 @@ def _sport_to_fit_sport(sport: str) -> int:
     return mapping.get(sport.lower(), 0)
 
 
+def _fit_timestamp(timestamp: datetime) -> int:
+    """Seconds since the FIT epoch."""
+    return int((timestamp - FIT_EPOCH).total_seconds())
+
+
+def _scaled(value: Optional[float], scale: float, offset: float, invalid: int) -> int:
+    """Encode a physical value as a scaled FIT integer, or the invalid marker if missing."""
+    if value is None:
+        return invalid
+    return int(round((value + offset) * scale))
+
+
+# Record fields: timestamp, altitude, heart_rate, cadence, distance, speed, power, temperature
+RECORD_FIELDS = [
+    (253, 4, BASE_TYPE_UINT32),  # timestamp
+    (2, 2, BASE_TYPE_UINT16),    # altitude (scale 5, offset 500)
+    (3, 1, BASE_TYPE_UINT8),     # heart_rate
+    (4, 1, BASE_TYPE_UINT8),     # cadence
+    (5, 4, BASE_TYPE_UINT32),    # distance (scale 100)
+    (6, 2, BASE_TYPE_UINT16),    # speed (scale 1000)
+    (7, 2, BASE_TYPE_UINT16),    # power
+    (13, 1, BASE_TYPE_SINT8),    # temperature
+]
+RECORD_POSITION_FIELDS = [
+    (0, 4, BASE_TYPE_SINT32),    # position_lat
+    (1, 4, BASE_TYPE_SINT32),    # position_long
+]
+_RECORD_STRUCT = struct.Struct("<IHBBIHHb")
+_RECORD_POSITION_STRUCT = struct.Struct("<ii")
+
+
 class FITEncoder:
     """
-    Simple FIT file encoder for workout files.
+    Simple FIT file encoder for workout and activity files.
 
-    This is a minimal implementation focused on workout files.
+    This is a minimal implementation focused on workout files, plus the
+    record/lap/session messages needed for synthetic activity files.
     For production use, consider using the official Garmin FIT SDK.
     """
 
@@ -163,7 +218,13 @@ class FITEncoder:
         for field_num, size, base_type in fields:
             self.buffer.write(struct.pack("<BBB", field_num, size, base_type))
 
-        self.data_size += 5 + (num_fields * 3)
+        self.data_size += 6 + (num_fields * 3)  # record header + 5 fixed bytes + fields
+        self.local_mesg_defs[local_mesg] = (global_mesg, list(fields))
+
+    def _define(self, local_mesg: int, global_mesg: int, fields: list):
+        """Write a definition message unless ``local_mesg`` already has this one."""
+        if self.local_mesg_defs.get(local_mesg) != (global_mesg, fields):
+            self._write_definition(local_mesg, global_mesg, fields)
 
     def _write_data(self, local_mesg: int, data: bytes):
         """Write a data message."""
@@ -172,7 +233,7 @@ class FITEncoder:
         self.buffer.write(data)
         self.data_size += 1 + len(data)
 
-    def _write_file_id(self, sport: int, timestamp: datetime):
+    def _write_file_id(self, sport: int, timestamp: datetime, file_type: int = FILE_TYPE_WORKOUT):
         """Write file_id message."""
         local_mesg = 0
 
@@ -186,11 +247,7 @@ class FITEncoder:
         ]
         self._write_definition(local_mesg, MESG_FILE_ID, fields)
 
-        # FIT timestamp is seconds since 1989-12-31 00:00:00 UTC
-        fit_epoch = datetime(1989, 12, 31, 0, 0, 0, tzinfo=timezone.utc)
-        fit_timestamp = int((timestamp - fit_epoch).total_seconds())
-
-        data = struct.pack("<BHHII", FILE_TYPE_WORKOUT, 1, 1, 12345, fit_timestamp)
+        data = struct.pack("<BHHII", file_type, 1, 1, 12345, _fit_timestamp(timestamp))
         self._write_data(local_mesg, data)
 
     def _write_workout(self, name: str, sport: int, num_steps: int):
@@ -264,6 +321,160 @@ class FITEncoder:
         )
         self._write_data(local_mesg, data)
 
+    def _write_record(
+        self,
+        timestamp: datetime,
+        heart_rate: Optional[float] = None,
+        power: Optional[float] = None,
+        cadence: Optional[float] = None,
+        speed: Optional[float] = None,
+        distance: Optional[float] = None,
+        altitude: Optional[float] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        temperature: Optional[float] = None,
+    ):
+        """
+        Write record message (one time-series sample).
+
+        Position fields are only defined for samples that have a position, so
+        indoor files carry no GPS bytes. Missing values are written as invalid.
+        """
+        local_mesg = 3
+
+        has_position = latitude is not None or longitude is not None
+        fields = RECORD_FIELDS + RECORD_POSITION_FIELDS if has_position else RECORD_FIELDS
+        self._define(local_mesg, MESG_RECORD, fields)
+
+        data = _RECORD_STRUCT.pack(
+            _fit_timestamp(timestamp),
+            _scaled(altitude, 5, 500, INVALID_UINT16),
+            _scaled(heart_rate, 1, 0, INVALID_UINT8),
+            _scaled(cadence, 1, 0, INVALID_UINT8),
+            _scaled(distance, 100, 0, INVALID_UINT32),
+            _scaled(speed, 1000, 0, INVALID_UINT16),
+            _scaled(power, 1, 0, INVALID_UINT16),
+            _scaled(temperature, 1, 0, INVALID_SINT8),
+        )
+        if has_position:
+            data += _RECORD_POSITION_STRUCT.pack(
+                _scaled(latitude, SEMICIRCLES_PER_DEGREE, 0, INVALID_SINT32),
+                _scaled(longitude, SEMICIRCLES_PER_DEGREE, 0, INVALID_SINT32),
+            )
+        self._write_data(local_mesg, data)
+
+    def _write_lap(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        sport: int,
+        total_timer_time: float,
+        total_distance: Optional[float] = None,
+        avg_heart_rate: Optional[float] = None,
+        max_heart_rate: Optional[float] = None,
+        avg_power: Optional[float] = None,
+        max_power: Optional[float] = None,
+        avg_cadence: Optional[float] = None,
+        avg_speed: Optional[float] = None,
+    ):
+        """Write lap message."""
+        local_mesg = 4
+
+        fields = [
+            (253, 4, BASE_TYPE_UINT32),  # timestamp
+            (2, 4, BASE_TYPE_UINT32),    # start_time
+            (7, 4, BASE_TYPE_UINT32),    # total_elapsed_time (ms)
+            (8, 4, BASE_TYPE_UINT32),    # total_timer_time (ms)
+            (9, 4, BASE_TYPE_UINT32),    # total_distance (cm)
+            (13, 2, BASE_TYPE_UINT16),   # avg_speed (mm/s)
+            (15, 1, BASE_TYPE_UINT8),    # avg_heart_rate
+            (16, 1, BASE_TYPE_UINT8),    # max_heart_rate
+            (17, 1, BASE_TYPE_UINT8),    # avg_cadence
+            (19, 2, BASE_TYPE_UINT16),   # avg_power
+            (20, 2, BASE_TYPE_UINT16),   # max_power
+            (25, 1, BASE_TYPE_ENUM),     # sport
+        ]
+        self._define(local_mesg, MESG_LAP, fields)
+
+        data = struct.pack(
+            "<IIIIIHBBBHHB",
+            _fit_timestamp(end_time),
+            _fit_timestamp(start_time),
+            int((end_time - start_time).total_seconds() * 1000),
+            _scaled(total_timer_time, 1000, 0, INVALID_UINT32),
+            _scaled(total_distance, 100, 0, INVALID_UINT32),
+            _scaled(avg_speed, 1000, 0, INVALID_UINT16),
+            _scaled(avg_heart_rate, 1, 0, INVALID_UINT8),
+            _scaled(max_heart_rate, 1, 0, INVALID_UINT8),
+            _scaled(avg_cadence, 1, 0, INVALID_UINT8),
+            _scaled(avg_power, 1, 0, INVALID_UINT16),
+            _scaled(max_power, 1, 0, INVALID_UINT16),
+            sport,
+        )
+        self._write_data(local_mesg, data)
+
+    def _write_session(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        sport: int,
+        sub_sport: int,
+        total_timer_time: float,
+        total_distance: Optional[float] = None,
+        avg_heart_rate: Optional[float] = None,
+        max_heart_rate: Optional[float] = None,
+        avg_power: Optional[float] = None,
+        max_power: Optional[float] = None,
+        avg_cadence: Optional[float] = None,
+        avg_speed: Optional[float] = None,
+        max_speed: Optional[float] = None,
+        total_ascent: Optional[float] = None,
+        total_descent: Optional[float] = None,
+    ):
+        """Write session message. Multi-sport files have one session per leg."""
+        local_mesg = 5
+
+        fields = [
+            (253, 4, BASE_TYPE_UINT32),  # timestamp
+            (2, 4, BASE_TYPE_UINT32),    # start_time
+            (5, 1, BASE_TYPE_ENUM),      # sport
+            (6, 1, BASE_TYPE_ENUM),      # sub_sport
+            (7, 4, BASE_TYPE_UINT32),    # total_elapsed_time (ms)
+            (8, 4, BASE_TYPE_UINT32),    # total_timer_time (ms)
+            (9, 4, BASE_TYPE_UINT32),    # total_distance (cm)
+            (14, 2, BASE_TYPE_UINT16),   # avg_speed (mm/s)
+            (15, 2, BASE_TYPE_UINT16),   # max_speed (mm/s)
+            (16, 1, BASE_TYPE_UINT8),    # avg_heart_rate
+            (17, 1, BASE_TYPE_UINT8),    # max_heart_rate
+            (18, 1, BASE_TYPE_UINT8),    # avg_cadence
+            (20, 2, BASE_TYPE_UINT16),   # avg_power
+            (21, 2, BASE_TYPE_UINT16),   # max_power
+            (22, 2, BASE_TYPE_UINT16),   # total_ascent
+            (23, 2, BASE_TYPE_UINT16),   # total_descent
+        ]
+        self._define(local_mesg, MESG_SESSION, fields)
+
+        data = struct.pack(
+            "<IIBBIIIHHBBBHHHH",
+            _fit_timestamp(end_time),
+            _fit_timestamp(start_time),
+            sport,
+            sub_sport,
+            int((end_time - start_time).total_seconds() * 1000),
+            _scaled(total_timer_time, 1000, 0, INVALID_UINT32),
+            _scaled(total_distance, 100, 0, INVALID_UINT32),
+            _scaled(avg_speed, 1000, 0, INVALID_UINT16),
+            _scaled(max_speed, 1000, 0, INVALID_UINT16),
+            _scaled(avg_heart_rate, 1, 0, INVALID_UINT8),
+            _scaled(max_heart_rate, 1, 0, INVALID_UINT8),
+            _scaled(avg_cadence, 1, 0, INVALID_UINT8),
+            _scaled(avg_power, 1, 0, INVALID_UINT16),
+            _scaled(max_power, 1, 0, INVALID_UINT16),
+            _scaled(total_ascent, 1, 0, INVALID_UINT16),
+            _scaled(total_descent, 1, 0, INVALID_UINT16),
+        )
+        self._write_data(local_mesg, data)
+
     def finalize(self) -> bytes:
         """Finalize the FIT file and return bytes."""
         # Get data
@@ -355,7 +566,7 @@ async def generate_workout_file(workout_id: str, user_id: str) -> Optional[bytes
     if workout.user_id != user_id:
         return None
 
-    return generate_fit_workout(workout)
+    return await compute.run_light(generate_fit_workout, workout)
 
 
 def generate_fit_from_plan(
@@ -474,3 +685,28 @@ def generate_fit_from_ai_workout(workout_data: dict) -> bytes:
         )
 
     return encoder.finalize()
+
+
+def build_workout_zip(workouts: list[dict]) -> bytes:
+    """
+    Build a ZIP archive with one FIT file per AI coach workout dict.
+
+    Workouts that fail to encode are skipped.
+    """
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for workout in workouts:
+            try:
+                fit_data = generate_fit_from_ai_workout(workout)
+                # Create safe filename
+                date = workout.get("date", "unknown")
+                name = workout.get("name", "workout")
+                safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in name)[:30]
+                filename = f"{date}_{safe_name}.fit"
+                zip_file.writestr(filename, fit_data)
+            except Exception:
+                # Log error but continue with other workouts
+                logger.exception("Error generating FIT for %s", workout.get("name"))
+                continue
+
+    return zip_buffer.getvalue()
@@ -1,45 +1,43 @@
 """Parse .FIT files into Activity documents."""
 
 import hashlib
-import io
+import mmap
 from datetime import datetime, timezone
 
-import fitdecode
+import numpy as np
+from pydantic import BaseModel, Field
 
-from app.models.activity import Activity, RecordPoint, LapSummary
+from app.core.cache import LRUCache
+from app.core.compute import compute
+from app.core.config import settings
+from app.models.activity import Activity, ChannelQuality, LapSummary
+from app.services.signal_cleaning import clean_channels
+from app.utils.fit_scanner import MESG_LAP, MESG_RECORD, MESG_SESSION, scan_fit
+from app.utils.stream_codec import SEMICIRCLES_PER_DEGREE, TIME_CHANNEL
+
+# Seconds between the Unix epoch and the FIT epoch (1989-12-31 00:00:00 UTC)
+FIT_EPOCH_OFFSET = 631065600
+
+# Record channels with candidate FIT field names in order of preference
+# (the first non-zero value wins).
+RECORD_CHANNELS: list[tuple[str, tuple[str, ...]]] = [
+    ("heart_rate", ("heart_rate",)),
+    ("power", ("power",)),
+    ("cadence", ("cadence",)),
+    ("speed", ("enhanced_speed", "speed")),
+    ("distance", ("distance",)),
+    ("altitude", ("enhanced_altitude", "altitude")),
+    ("latitude", ("position_lat",)),
+    ("longitude", ("position_long",)),
+    ("temperature", ("temperature",)),
+]
+RECORD_FIELD_NAMES = {name for _, candidates in RECORD_CHANNELS for name in candidates}
+POSITION_CHANNELS = ("latitude", "longitude")
+
+# Decoded files keyed by SHA-256, so the same file is never decoded twice
+_decode_cache = LRUCache(settings.parse_cache_entries)
 
 
-def _normalize_power_outliers(records: list[RecordPoint], threshold: int = 1000) -> list[RecordPoint]:
-    """
-    Detect and smooth power data outliers.
-    
-    If a power value differs by more than `threshold` watts from the previous value,
-    replace it with the previous value (or scale it down if previous is None).
-    """
-    if not records or len(records) < 2:
-        return records
-    
-    normalized = []
-    for i, record in enumerate(records):
-        if i == 0:
-            # First record, keep as-is
-            normalized.append(record)
-        else:
-            prev_power = normalized[i - 1].power
-            curr_power = record.power
-            
-            # If either is None, skip the check
-            if prev_power is None or curr_power is None:
-                normalized.append(record)
-            elif abs(curr_power - prev_power) > threshold:
-                # Outlier detected: replace with previous power value
-                record.power = prev_power
-                normalized.append(record)
-            else:
-                # Normal value
-                normalized.append(record)
-    
-    return normalized
 # Map FIT sport enum values to our sport names
 SPORT_MAP = {
     "running": "running",
@@ -70,47 +68,152 @@ SUB_SPORT_MAP = {
 }
 
 
-async def parse_fit_file(
-    file_bytes: bytes,
-    user_id: str,
-    filename: str | None = None,
-) -> Activity:
-    """Parse a FIT file and return an Activity document (not yet saved)."""
-    file_hash = hashlib.sha256(file_bytes).hexdigest()
+class FitDecodeResult(BaseModel):
+    """Columnar result of decoding a FIT file."""
+    model_config = {"arbitrary_types_allowed": True}
+
+    file_hash: str
+    start_time: datetime
+    end_time: datetime | None = None
+    session: dict = Field(default_factory=dict)
+    laps: list[LapSummary] = Field(default_factory=list)
+    # Channel arrays as used by Activity.channel(); empty if there were no records
+    channels: dict[str, np.ndarray] = Field(default_factory=dict)
+    quality: dict[str, ChannelQuality] = Field(default_factory=dict)
+
+    @property
+    def sample_count(self) -> int:
+        time = self.channels.get(TIME_CHANNEL)
+        return 0 if time is None else len(time)
 
-    records: list[RecordPoint] = []
-    laps: list[LapSummary] = []
-    session_data: dict = {}
 
-    with fitdecode.FitReader(io.BytesIO(file_bytes)) as fit:
-        for frame in fit:
-            if not isinstance(frame, fitdecode.FitDataMessage):
+def _record_channels(columns: dict[str, np.ndarray], count: int) -> dict[str, np.ndarray]:
+    """Pick one column per channel from the decoded record fields."""
+    channels = {}
+    for channel_name, candidates in RECORD_CHANNELS:
+        values = None
+        for fit_name in candidates:
+            column = columns.get(fit_name)
+            if column is None:
                 continue
+            if values is None:
+                values = column
+            else:
+                use_fallback = np.isnan(values) | (values == 0)
+                values = np.where(use_fallback, column, values)
+        if values is None:
+            values = np.full(count, np.nan)
+        channels[channel_name] = values
+
+    for channel_name in POSITION_CHANNELS:
+        channels[channel_name] = channels[channel_name] / SEMICIRCLES_PER_DEGREE
+    return channels
 
-            if frame.name == "session":
-                session_data = _extract_session(frame)
-            elif frame.name == "record":
-                record = _extract_record(frame)
-                if record:
-                    records.append(record)
-            elif frame.name == "lap":
-                lap = _extract_lap(frame)
-                if lap:
-                    laps.append(lap)
 
-    # Normalize power outliers in records
-    records = _normalize_power_outliers(records)
+def decode_fit_file(file_bytes, file_hash: str | None = None, mode: str = "full") -> FitDecodeResult:
+    """
+    Decode a FIT file into session/lap summaries and columnar record channels.
+
+    ``file_bytes`` may be bytes or any buffer such as an mmap. ``file_hash`` is
+    the file's SHA-256 if the caller already computed it.
+
+    With ``mode="summary"`` only session and lap messages are decoded; record
+    messages are skipped by size and ``channels`` is left empty. Record
+    timestamps are only looked at if the session has no start time.
+    """
+    if mode not in ("full", "summary"):
+        raise ValueError(f"Unknown decode mode: {mode}")
+    if file_hash is None:
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
+
+    summary_only = mode == "summary"
+    scan = scan_fit(
+        file_bytes,
+        bulk=frozenset() if summary_only else frozenset({MESG_RECORD}),
+        decode=frozenset({MESG_SESSION, MESG_LAP}),
+    )
+
+    session_data: dict = {}
+    for session in scan.messages[MESG_SESSION]:
+        session_data = _extract_session(session)
+
+    laps: list[LapSummary] = []
+    for message in scan.messages[MESG_LAP]:
+        lap = _extract_lap(message)
+        if lap:
+            laps.append(lap)
+
+    if summary_only and not session_data.get("start_time"):
+        # No usable session: fall back to the record timestamps
+        scan = scan_fit(file_bytes, bulk=frozenset({MESG_RECORD}))
+
+    records = scan.bulk.get(MESG_RECORD)
+    if records is None:
+        fit_timestamps = np.empty(0, dtype=np.int64)
+    else:
+        fit_timestamps = np.frombuffer(records.timestamps, dtype=np.int64)
+    # Records without a timestamp are dropped
+    keep = fit_timestamps > 0
+    timestamps = fit_timestamps[keep] + FIT_EPOCH_OFFSET
 
     # Determine start/end times from records if session doesn't have them
     start_time = session_data.get("start_time")
-    if not start_time and records:
-        start_time = records[0].timestamp
+    if not start_time and len(timestamps):
+        start_time = datetime.fromtimestamp(int(timestamps[0]), tz=timezone.utc)
     if not start_time:
         start_time = datetime.now(timezone.utc)
 
     end_time = session_data.get("end_time")
-    if not end_time and records:
-        end_time = records[-1].timestamp
+    if not end_time and len(timestamps):
+        end_time = datetime.fromtimestamp(int(timestamps[-1]), tz=timezone.utc)
+
+    channels: dict[str, np.ndarray] = {}
+    quality: dict[str, ChannelQuality] = {}
+    if len(timestamps) and not summary_only:
+        columns = records.decode(file_bytes, names=RECORD_FIELD_NAMES)
+        if not keep.all():
+            columns = {name: values[keep] for name, values in columns.items()}
+        channels[TIME_CHANNEL] = timestamps - int(start_time.timestamp())
+        channels.update(_record_channels(columns, len(timestamps)))
+        channels, quality = clean_channels(channels)
+
+    return FitDecodeResult(
+        file_hash=file_hash,
+        start_time=start_time,
+        end_time=end_time,
+        session=session_data,
+        laps=laps,
+        channels=channels,
+        quality=quality,
+    )
+
+
+def decode_fit_path(path: str, file_hash: str | None = None, mode: str = "full") -> FitDecodeResult:
+    """Decode a FIT file on disk through a read-only memory map."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return decode_fit_file(buf, file_hash, mode)
+
+
+async def decode_fit_upload(path: str, file_hash: str) -> FitDecodeResult:
+    """Decode a spooled FIT file in the process pool, reusing cached results."""
+    result = _decode_cache.get(file_hash)
+    if result is None:
+        result = await compute.run_heavy(decode_fit_path, path, file_hash)
+        # Cached arrays are shared between activities; make accidental edits fail loudly
+        for values in result.channels.values():
+            values.flags.writeable = False
+        _decode_cache.set(file_hash, result)
+    return result
+
+
+def build_activity(
+    result: FitDecodeResult,
+    user_id: str,
+    filename: str | None = None,
+) -> Activity:
+    """Build an Activity document (not yet saved) from a decoded FIT file."""
+    session_data = result.session
+    start_time = result.start_time
 
     # Map sport
     raw_sport = session_data.get("sport", "other")
@@ -122,16 +225,16 @@ async def parse_fit_file(
     if sub_sport == "indoor_rowing":
         sport = "rowing"
 
-    return Activity(
+    activity = Activity(
         user_id=user_id,
         source="upload",
         original_filename=filename,
-        file_hash=file_hash,
+        file_hash=result.file_hash,
         sport=sport,
         sub_sport=sub_sport,
         name=session_data.get("name") or f"{sport.title()} - {start_time.strftime('%b %d')}",
         start_time=start_time,
-        end_time=end_time,
+        end_time=result.end_time,
         total_timer_time=session_data.get("total_timer_time", 0),
         total_elapsed_time=session_data.get("total_elapsed_time"),
         total_distance=session_data.get("total_distance"),
@@ -145,12 +248,31 @@ async def parse_fit_file(
         max_speed=session_data.get("max_speed"),
         total_ascent=session_data.get("total_ascent"),
         total_descent=session_data.get("total_descent"),
-        records=records,
-        laps=laps,
+        laps=result.laps,
     )
+    if result.channels:
+        activity.set_channels(result.channels)
+        activity.data_quality = result.quality
+    return activity
 
 
-def _extract_session(frame: fitdecode.FitDataMessage) -> dict:
+async def parse_fit_file(
+    file_bytes: bytes,
+    user_id: str,
+    filename: str | None = None,
+    mode: str = "full",
+) -> Activity:
+    """
+    Parse a FIT file and return an Activity document (not yet saved).
+
+    Decoding runs on the compute process pool. ``mode="summary"`` returns the
+    session summary without time-series data.
+    """
+    result = await compute.run_heavy(decode_fit_file, file_bytes, mode=mode)
+    return build_activity(result, user_id, filename)
+
+
+def _extract_session(message: dict) -> dict:
     """Extract session-level summary data."""
     data = {}
     field_map = {
@@ -175,53 +297,15 @@ def _extract_session(frame: fitdecode.FitDataMessage) -> dict:
         "total_descent": "total_descent",
     }
     for fit_name, our_name in field_map.items():
-        try:
-            val = frame.get_value(fit_name)
-            if val is not None and our_name not in data:
-                data[our_name] = val
-        except KeyError:
-            # Field doesn't exist in this FIT file, skip it
-            pass
+        val = message.get(fit_name)
+        if val is not None and our_name not in data:
+            data[our_name] = val
     return data
 
 
-def _extract_record(frame: fitdecode.FitDataMessage) -> RecordPoint | None:
-    """Extract a single time-series record point."""
-    try:
-        timestamp = frame.get_value("timestamp")
-    except KeyError:
-        return None
-        
-    if not timestamp:
-        return None
-
-    def safe_get(field: str):
-        try:
-            return frame.get_value(field)
-        except KeyError:
-            return None
-
-    return RecordPoint(
-        timestamp=timestamp,
-        heart_rate=safe_get("heart_rate"),
-        power=safe_get("power"),
-        cadence=safe_get("cadence"),
-        speed=safe_get("enhanced_speed") or safe_get("speed"),
-        distance=safe_get("distance"),
-        altitude=safe_get("enhanced_altitude") or safe_get("altitude"),
-        latitude=_semicircles_to_degrees(safe_get("position_lat")),
-        longitude=_semicircles_to_degrees(safe_get("position_long")),
-        temperature=safe_get("temperature"),
-    )
-
-
-def _extract_lap(frame: fitdecode.FitDataMessage) -> LapSummary | None:
+def _extract_lap(message: dict) -> LapSummary | None:
     """Extract lap summary data."""
-    def safe_get(field: str):
-        try:
-            return frame.get_value(field)
-        except KeyError:
-            return None
+    safe_get = message.get
 
     start_time = safe_get("start_time")
     timer_time = safe_get("total_timer_time")
@@ -239,10 +323,3 @@ def _extract_lap(frame: fitdecode.FitDataMessage) -> LapSummary | None:
         avg_cadence=safe_get("avg_cadence"),
         avg_speed=safe_get("enhanced_avg_speed") or safe_get("avg_speed"),
     )
-
-
-def _semicircles_to_degrees(val) -> float | None:
-    """Convert Garmin semicircles to decimal degrees."""
-    if val is None:
-        return None
-    return val * (180.0 / 2**31)
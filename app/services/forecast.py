@@ -0,0 +1,149 @@
+"""
+CTL/ATL/TSB forecast over planned workouts.
+
+Each candidate plan is turned into one row of daily scaled TSS from today to
+the end of the horizon; all rows are run through the EWMA together, seeded
+from the load state at the end of yesterday. Today's row also holds the TSS of
+activities already done today.
+
+A plan starts from the user's scheduled, uncompleted workouts (unless told not
+to), then applies an AI coach response the same way `/ai/plan/apply` would
+(skips, TSS changes, new workouts) and adds any extra workouts, all in memory.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.models.user import User
+from app.models.workout import PlannedWorkout
+from app.schemas.metrics import DailyMetrics, ForecastPlan, LoadForecast, PlanForecast
+from app.services.training_load import ATL_TIME_CONSTANT, CTL_TIME_CONSTANT, ewma, load_range
+from app.services.workout_modifier import AICoachResponse, validate_date, validate_duration, validate_tss
+
+# Same rough estimate `metrics.score_activity` falls back to without sensor data
+DURATION_TSS_PER_HOUR = 50.0
+DEFAULT_WORKOUT_DURATION_S = 3600.0
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min).replace(tzinfo=timezone.utc)
+
+
+def _estimated_tss(tss: float | None, duration_s: float | None) -> tuple[float, bool]:
+    """Planned TSS, or a duration-based estimate; the flag is True for estimates."""
+    if tss is not None:
+        return tss, False
+    return (duration_s or DEFAULT_WORKOUT_DURATION_S) / 3600.0 * DURATION_TSS_PER_HOUR, True
+
+
+def _plan_workouts(
+    plan: ForecastPlan,
+    scheduled: list[PlannedWorkout],
+) -> list[tuple[date, str, float, bool]]:
+    """(day, sport, TSS, estimated) of every workout of a candidate plan."""
+    # workout id -> [day, sport, planned TSS, duration in seconds]
+    workouts: dict[str, list] = {}
+    if plan.include_scheduled:
+        for w in scheduled:
+            workouts[str(w.id)] = [w.scheduled_date.date(), w.sport, w.estimated_tss, w.estimated_duration]
+
+    extra: list[tuple[date, str, float, bool]] = []
+    if plan.ai_response is not None:
+        try:
+            response = AICoachResponse.model_validate(plan.ai_response)
+        except ValidationError:
+            raise HTTPException(status_code=400, detail=f"Plan '{plan.name}' has an invalid ai_response")
+        for mod in response.modifications:
+            if mod.workout_id not in workouts:
+                continue
+            if mod.action == "skip":
+                del workouts[mod.workout_id]
+            elif mod.action in {"modify", "replace"} and mod.changes:
+                # Same validation as `workout_modifier._apply_single_modification`
+                changes = mod.changes
+                if changes.duration_minutes and validate_duration(changes.duration_minutes.to_value)[0]:
+                    workouts[mod.workout_id][3] = changes.duration_minutes.to_value * 60
+                if changes.estimated_tss and validate_tss(changes.estimated_tss.to_value)[0]:
+                    workouts[mod.workout_id][2] = changes.estimated_tss.to_value
+        for new in response.new_workouts + response.workouts:
+            valid, _, scheduled_date = validate_date(new.date)
+            if valid:
+                tss, estimated = _estimated_tss(new.estimated_tss, new.get_duration_minutes() * 60)
+                extra.append((scheduled_date.date(), new.sport.lower(), tss, estimated))
+
+    # Workouts without planned TSS are estimated from their (possibly changed) duration
+    planned = [(day, sport, *_estimated_tss(tss, duration)) for day, sport, tss, duration in workouts.values()]
+    extra.extend((w.date, w.sport, w.estimated_tss, False) for w in plan.workouts)
+    return planned + extra
+
+
+async def forecast_load(user: User, weeks: int, plans: list[ForecastPlan], race_date: date | None) -> LoadForecast:
+    """Project CTL/ATL/TSB of each candidate plan ``weeks`` weeks ahead."""
+    user_id = str(user.id)
+    today = date.today()
+    end = today + timedelta(weeks=weeks) - timedelta(days=1)
+    days = (end - today).days + 1
+
+    # State at the end of yesterday, and what was already done today
+    seed, done_today = await load_range(user_id, today - timedelta(days=1), today)
+    scheduled = await PlannedWorkout.find(
+        PlannedWorkout.user_id == user_id,
+        PlannedWorkout.completed == False,
+        PlannedWorkout.scheduled_date >= _midnight(today),
+        PlannedWorkout.scheduled_date < _midnight(end + timedelta(days=1)),
+    ).to_list()
+    scaling = {s.sport: s.scaling_factor for s in user.sport_scaling}
+
+    raw = np.zeros((len(plans), days))
+    scaled = np.zeros((len(plans), days))
+    raw[:, 0] = done_today.tss
+    scaled[:, 0] = done_today.scaled_tss
+    unestimated = []
+    for row, plan in enumerate(plans):
+        workouts = [w for w in _plan_workouts(plan, scheduled) if today <= w[0] <= end]
+        if workouts:
+            index = np.array([(day - today).days for day, _, _, _ in workouts])
+            tss = np.array([tss for _, _, tss, _ in workouts])
+            factors = np.array([scaling.get(sport, 1.0) for _, sport, _, _ in workouts])
+            np.add.at(raw[row], index, tss)
+            np.add.at(scaled[row], index, tss * factors)
+        unestimated.append(sum(estimated for _, _, _, estimated in workouts))
+
+    ctl = ewma(scaled, seed.ctl, CTL_TIME_CONSTANT)
+    atl = ewma(scaled, seed.atl, ATL_TIME_CONSTANT)
+    tsb = ctl - atl
+
+    results = []
+    for row, plan in enumerate(plans):
+        daily = [
+            DailyMetrics(
+                date=today + timedelta(days=i),
+                tss=round(float(raw[row, i]), 1),
+                scaled_tss=round(float(scaled[row, i]), 1),
+                ctl=round(float(ctl[row, i]), 1),
+                atl=round(float(atl[row, i]), 1),
+                tsb=round(float(tsb[row, i]), 1),
+            )
+            for i in range(days)
+        ]
+        race_index = (race_date - today).days if race_date else None
+        results.append(PlanForecast(
+            name=plan.name,
+            daily=daily,
+            total_tss=round(float(raw[row].sum()), 1),
+            unestimated_workouts=unestimated[row],
+            race_day=daily[race_index] if race_index is not None and 0 <= race_index < days else None,
+            peak_ctl=round(float(ctl[row].max()), 1),
+            min_tsb=round(float(tsb[row].min()), 1),
+        ))
+
+    return LoadForecast(
+        start_date=today,
+        end_date=end,
+        seed_ctl=round(seed.ctl, 1),
+        seed_atl=round(seed.atl, 1),
+        plans=results,
+    )
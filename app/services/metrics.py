@@ -2,12 +2,31 @@
 
 from collections import defaultdict
 from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
 
 import numpy as np
 
-from app.models.activity import Activity
+from app.core.cache import LRUCache
+from app.core.compute import compute
+from app.core.config import settings
+from app.models.activity import Activity, ActivityLoadView
 from app.models.user import User
-from app.schemas.metrics import DailyMetrics, MetricsRange, PerformanceSnapshot, WeeklySummary
+from app.schemas.metrics import (
+    DailyMetrics,
+    IntensityDistribution,
+    MetricsRange,
+    PerformanceSnapshot,
+    WeeklySummary,
+    WeeklyZoneDistribution,
+    ZoneDistributionReport,
+)
+from app.services.fingerprint import activity_fingerprint
+from app.services.power_curve import compute_power_curve
+from app.services.snapshot_cache import cached_snapshot
+from app.services.training_load import load_range
+from app.services.user_state import record_current_load
+from app.services.zone_calculator import HR_METHODS, POWER_METHODS, resolve_hr_method
+from app.services.zone_time import hr_zone_time, power_zone_time, sample_durations, zone_seconds
 
 # TrainingPeaks hrTSS zone lookup: (lower % LTHR, upper % LTHR) -> TSS per hour
 HR_ZONE_TSS_PER_HOUR = [
@@ -19,23 +38,39 @@ HR_ZONE_TSS_PER_HOUR = [
     (1.02, 1.06, 110),   # Zone 5b - Aerobic capacity
     (1.06, 2.00, 130),   # Zone 5c - Anaerobic
 ]
+_HR_ZONE_TSS_RATES = np.array([tss for _, _, tss in HR_ZONE_TSS_PER_HOUR], dtype=np.float64)
 
-CTL_TIME_CONSTANT = 42  # days
-ATL_TIME_CONSTANT = 7   # days
+# Polarized (80/20) intensity classes, as fractions of the zone method's threshold:
+# zones ending at or below LOW_INTENSITY_MAX are low intensity, zones starting at
+# or above HIGH_INTENSITY_MIN are high intensity, everything between is moderate.
+LOW_INTENSITY_MAX = 0.90
+HIGH_INTENSITY_MIN = 1.00
 
+# (user_id, week_start) -> WeeklySummary of a completed week; such weeks only
+# change through backdated uploads, which `invalidate_weekly_summaries` handles.
+# The TTL bounds how long another worker's invalidation can go unnoticed.
+_past_week_cache = LRUCache(settings.weekly_summary_cache_entries, ttl=settings.weekly_summary_cache_ttl_s)
 
-def compute_normalized_power(power_data: list[int | None], sample_rate_s: int = 1) -> float | None:
+# Version of the scoring in `score_activity`. Bump it whenever a formula changes
+# so stored activities are rescored at the next startup (see app.services.reprocessing).
+METRICS_VERSION = 2
+
+# Sources whose activities are summaries without a recording (Concept2 logbook
+# entries). They are stored unscored and get no duration-based TSS.
+SUMMARY_ONLY_SOURCES = frozenset({"concept2"})
+
+
+def compute_normalized_power(power_data: list[int | None] | np.ndarray, sample_rate_s: int = 1) -> float | None:
     """
     Compute Normalized Power (NP) from power time-series.
     NP = (mean(rolling_30s_power^4))^0.25
     """
-    # Filter out None values
-    powers = [p for p in power_data if p is not None and p > 0]
-    if len(powers) < 30:
+    # Filter out missing values (None or NaN)
+    arr = np.asarray(power_data, dtype=np.float64)
+    arr = arr[arr > 0]
+    if len(arr) < 30:
         return None
 
-    arr = np.array(powers, dtype=np.float64)
-
     # 30-second rolling average
     window = max(1, 30 // sample_rate_s)
     if len(arr) < window:
@@ -64,53 +99,64 @@ def compute_tss_from_power(
     return (intensity_factor**2) * duration_hours * 100.0
 
 
+def compute_hr_load(
+    hr_data: list[int | None] | np.ndarray,
+    lthr: int,
+    time: np.ndarray | None = None,
+    sample_rate_s: int = 1,
+) -> tuple[float, np.ndarray]:
+    """
+    Compute hrTSS and the seconds spent in each `HR_ZONE_TSS_PER_HOUR` zone.
+
+    Samples are weighted by their timestamp gaps when ``time`` is given, so
+    smart-recording files are handled; otherwise every sample counts
+    ``sample_rate_s`` seconds.
+    """
+    hr = np.asarray(hr_data, dtype=np.float64)
+    if time is not None:
+        durations = sample_durations(time)
+    else:
+        durations = np.full(len(hr), float(sample_rate_s))
+
+    bounds = [lthr * lower for lower, _, _ in HR_ZONE_TSS_PER_HOUR]
+    seconds = zone_seconds(hr, durations, bounds)
+    tss = float(seconds @ _HR_ZONE_TSS_RATES) / 3600.0
+    return tss, seconds
+
+
 def compute_hr_tss(
-    hr_data: list[int | None],
+    hr_data: list[int | None] | np.ndarray,
     duration_seconds: float,
     lthr: int,
     sample_rate_s: int = 1,
+    time: np.ndarray | None = None,
 ) -> float:
     """
     Compute hrTSS using zone-based TSS/hour lookup.
-    For each sample, determine which HR zone it falls in,
-    accumulate TSS proportionally.
+    Each sample contributes its duration in hours times its zone's TSS/hour.
     """
     if not lthr or lthr <= 0:
         return 0.0
-
-    total_tss = 0.0
-    valid_samples = 0
-
-    for hr in hr_data:
-        if hr is None or hr <= 0:
-            continue
-        valid_samples += 1
-        hr_fraction = hr / lthr
-
-        # Find matching zone
-        tss_per_hour = 20  # default to Zone 1
-        for lower, upper, zone_tss in HR_ZONE_TSS_PER_HOUR:
-            if lower <= hr_fraction < upper:
-                tss_per_hour = zone_tss
-                break
-
-        # Accumulate: each sample contributes (sample_rate / 3600) hours * TSS/hour
-        total_tss += (sample_rate_s / 3600.0) * tss_per_hour
-
-    return total_tss
+    return compute_hr_load(hr_data, lthr, time, sample_rate_s)[0]
 
 
 async def compute_activity_metrics(activity: Activity, user: User) -> None:
     """Compute TSS, NP, IF, and scaled TSS for an activity. Modifies in place."""
+    await compute.run_light(score_activity, activity, user)
+
+
+def score_activity(activity: Activity, user: User) -> None:
+    """Score an activity in place from its streams (CPU-bound; see `compute_activity_metrics`)."""
     ftp = user.thresholds.threshold_power
     lthr = user.thresholds.threshold_hr
 
-    # Try power-based TSS first (most accurate)
-    if ftp and ftp > 0 and activity.records:
-        power_data = [r.power for r in activity.records]
-        has_power = any(p is not None and p > 0 for p in power_data)
+    # Start from scratch so rescoring with new thresholds replaces old results
+    activity.tss = activity.normalized_power = activity.intensity_factor = None
 
-        if has_power:
+    # Try power-based TSS first (most accurate)
+    power_data = activity.channel("power")
+    if ftp and ftp > 0 and power_data is not None:
+        if np.any(power_data > 0):
             np_value = compute_normalized_power(power_data)
             if np_value:
                 activity.normalized_power = round(np_value, 1)
@@ -120,27 +166,35 @@ async def compute_activity_metrics(activity: Activity, user: User) -> None:
                 )
 
     # Fall back to hrTSS if no power-based TSS
-    if activity.tss is None and lthr and lthr > 0 and activity.records:
-        hr_data = [r.heart_rate for r in activity.records]
-        has_hr = any(h is not None and h > 0 for h in hr_data)
-
-        if has_hr:
+    hr_data = activity.channel("heart_rate")
+    if activity.tss is None and lthr and lthr > 0 and hr_data is not None:
+        if np.any(hr_data > 0):
             activity.tss = round(
-                compute_hr_tss(hr_data, activity.total_timer_time, lthr), 1
+                compute_hr_tss(hr_data, activity.total_timer_time, lthr, time=activity.channel("time")), 1
             )
 
-    # Fall back to duration-based estimate if nothing else works
-    if activity.tss is None:
+    # Fall back to duration-based estimate if nothing else works. Summary-only
+    # imports were never scored, so rescoring must not give them a TSS.
+    if activity.tss is None and activity.source not in SUMMARY_ONLY_SOURCES:
         # Very rough estimate: ~50 TSS per hour for moderate effort
         activity.tss = round((activity.total_timer_time / 3600.0) * 50, 1)
 
+    # Time in the user's configured zones, for intensity-distribution reports
+    time = activity.channel("time")
+    activity.hr_zone_time = hr_zone_time(user, time, hr_data)
+    activity.power_zone_time = power_zone_time(user, time, power_data)
+    activity.power_curve = compute_power_curve(time, power_data)
+    activity.fingerprint = activity_fingerprint(activity)
+
     # Apply sport-specific scaling
     activity.scaled_tss = activity.tss  # default: no scaling
     for scaling in user.sport_scaling:
-        if scaling.sport == activity.sport:
+        if scaling.sport == activity.sport and activity.tss is not None:
             activity.scaled_tss = round(activity.tss * scaling.scaling_factor, 1)
             break
 
+    activity.metrics_version = METRICS_VERSION
+
 
 async def compute_metrics_range(
     user_id: str,
@@ -148,55 +202,31 @@ async def compute_metrics_range(
     end: date,
     user: User,
 ) -> MetricsRange:
-    """Compute daily CTL/ATL/TSB for a date range."""
-    # We need activities going back far enough to build CTL (42-day window)
-    lookback_start = start - timedelta(days=CTL_TIME_CONSTANT * 2)
-    start_dt = datetime.combine(lookback_start, datetime.min.time()).replace(tzinfo=timezone.utc)
-    end_dt = datetime.combine(end, datetime.max.time()).replace(tzinfo=timezone.utc)
-
-    activities = await Activity.find(
-        Activity.user_id == user_id,
-        Activity.start_time >= start_dt,
-        Activity.start_time <= end_dt,
-    ).to_list()
-
-    # Aggregate daily TSS
-    daily_tss: dict[date, float] = defaultdict(float)
-    for act in activities:
-        day = act.start_time.date()
-        daily_tss[day] += act.scaled_tss or act.tss or 0.0
-
-    # Compute rolling CTL/ATL/TSB
-    ctl = 0.0
-    atl = 0.0
-    daily_metrics: list[DailyMetrics] = []
-
-    current = lookback_start
-    while current <= end:
-        tss_today = daily_tss.get(current, 0.0)
-
-        ctl = ctl * (1 - 1 / CTL_TIME_CONSTANT) + tss_today * (1 / CTL_TIME_CONSTANT)
-        atl = atl * (1 - 1 / ATL_TIME_CONSTANT) + tss_today * (1 / ATL_TIME_CONSTANT)
-        tsb = ctl - atl
-
-        if current >= start:
-            daily_metrics.append(
-                DailyMetrics(
-                    date=current,
-                    tss=tss_today,
-                    scaled_tss=tss_today,
-                    ctl=round(ctl, 1),
-                    atl=round(atl, 1),
-                    tsb=round(tsb, 1),
-                )
-            )
+    """
+    Daily CTL/ATL/TSB for a date range, seeded from the nearest load checkpoint.
 
-        current += timedelta(days=1)
+    Read-only: when the range covers today and the user's stored CTL/ATL are out
+    of date, the new values are handed to the write-behind buffer.
+    """
+    loads = await load_range(user_id, start, end)
+    daily_metrics = [
+        DailyMetrics(
+            date=load.day,
+            tss=load.tss,
+            scaled_tss=load.scaled_tss,
+            ctl=round(load.ctl, 1),
+            atl=round(load.atl, 1),
+            tsb=round(load.tsb, 1),
+        )
+        for load in loads
+    ]
+    ctl = loads[-1].ctl if loads else 0.0
+    atl = loads[-1].atl if loads else 0.0
 
-    # Update user's current CTL/ATL
-    user.current_ctl = round(ctl, 1)
-    user.current_atl = round(atl, 1)
-    await user.save()
+    if loads and loads[-1].day == date.today() and (
+        (user.current_ctl, user.current_atl) != (round(ctl, 1), round(atl, 1))
+    ):
+        record_current_load(user_id, ctl, atl)
 
     return MetricsRange(
         start_date=start,
@@ -209,15 +239,19 @@ async def compute_metrics_range(
 
 
 async def get_performance_snapshot(user_id: str, user: User) -> PerformanceSnapshot:
-    """Get current performance metrics."""
+    """Get current performance metrics, cached per user until their activities change."""
+    return await cached_snapshot(user_id, lambda: _compute_performance_snapshot(user_id, user))
+
+
+async def _compute_performance_snapshot(user_id: str, user: User) -> PerformanceSnapshot:
     today = date.today()
 
     # Compute metrics up to today
     metrics = await compute_metrics_range(user_id, today - timedelta(days=90), today, user)
 
     # Aggregate recent periods
-    tss_7d = sum(d.tss for d in metrics.daily[-7:])
-    tss_28d = sum(d.tss for d in metrics.daily[-28:])
+    tss_7d = sum(d.scaled_tss for d in metrics.daily[-7:])
+    tss_28d = sum(d.scaled_tss for d in metrics.daily[-28:])
 
     duration_7d = 0.0
     distance_7d = 0.0
@@ -228,7 +262,7 @@ async def get_performance_snapshot(user_id: str, user: User) -> PerformanceSnaps
     recent_activities = await Activity.find(
         Activity.user_id == user_id,
         Activity.start_time >= recent_start,
-    ).to_list()
+    ).project(ActivityLoadView).to_list()
     for act in recent_activities:
         duration_7d += act.total_timer_time or 0
         distance_7d += act.total_distance or 0
@@ -253,55 +287,188 @@ async def get_performance_snapshot(user_id: str, user: User) -> PerformanceSnaps
     )
 
 
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _empty_week(week_start: date) -> WeeklySummary:
+    return WeeklySummary(
+        week_start=week_start,
+        total_tss=0.0,
+        total_scaled_tss=0.0,
+        total_duration=0.0,
+        total_distance=0.0,
+        activity_count=0,
+        by_sport={},
+    )
+
+
+async def _weekly_sport_totals(user_id: str, start: date, end: date) -> dict[date, WeeklySummary]:
+    """Sum activity load per Monday week and sport from ``start`` up to ``end`` (exclusive), in MongoDB."""
+    rows = await Activity.find(
+        Activity.user_id == user_id,
+        Activity.start_time >= datetime.combine(start, datetime.min.time()).replace(tzinfo=timezone.utc),
+        Activity.start_time < datetime.combine(end, datetime.min.time()).replace(tzinfo=timezone.utc),
+    ).aggregate([
+        {"$group": {
+            "_id": {
+                "week": {"$dateTrunc": {"date": "$start_time", "unit": "week", "startOfWeek": "monday"}},
+                "sport": "$sport",
+            },
+            "tss": {"$sum": {"$ifNull": ["$tss", 0]}},
+            "scaled_tss": {"$sum": {"$ifNull": ["$scaled_tss", {"$ifNull": ["$tss", 0]}]}},
+            "duration": {"$sum": {"$ifNull": ["$total_timer_time", 0]}},
+            "distance": {"$sum": {"$ifNull": ["$total_distance", 0]}},
+            "count": {"$sum": 1},
+        }},
+    ]).to_list()
+
+    weekly: dict[date, WeeklySummary] = {}
+    for row in rows:
+        ws = row["_id"]["week"].date()
+        if ws not in weekly:
+            weekly[ws] = _empty_week(ws)
+        w = weekly[ws]
+        w.total_tss += row["tss"]
+        w.total_scaled_tss += row["scaled_tss"]
+        w.total_duration += row["duration"]
+        w.total_distance += row["distance"]
+        w.activity_count += row["count"]
+        w.by_sport[row["_id"]["sport"]] = row["tss"]
+
+    for w in weekly.values():
+        w.total_tss = round(w.total_tss, 1)
+        w.total_scaled_tss = round(w.total_scaled_tss, 1)
+    return weekly
+
+
 async def get_weekly_summaries(user_id: str, weeks: int) -> list[WeeklySummary]:
-    """Get weekly training summaries."""
-    today = date.today()
-    # Monday of current week
-    week_start = today - timedelta(days=today.weekday())
-    start = week_start - timedelta(weeks=weeks - 1)
+    """
+    Get weekly training summaries.
 
-    start_dt = datetime.combine(start, datetime.min.time()).replace(tzinfo=timezone.utc)
-    activities = await Activity.find(
+    Completed weeks are served from a cache; only the current week and
+    uncached past weeks are aggregated.
+    """
+    current = _week_start(date.today())
+    week_starts = [current - timedelta(weeks=weeks - 1 - i) for i in range(weeks)]
+
+    summaries = {ws: _past_week_cache.get((user_id, ws)) for ws in week_starts[:-1]}
+    missing = [ws for ws, summary in summaries.items() if summary is None] + [current]
+    weekly = await _weekly_sport_totals(user_id, missing[0], current + timedelta(weeks=1))
+
+    for ws in missing:
+        summary = weekly.get(ws) or _empty_week(ws)
+        if ws != current:
+            _past_week_cache.set((user_id, ws), summary)
+        summaries[ws] = summary
+
+    return [summaries[ws].model_copy(deep=True) for ws in week_starts]
+
+
+def invalidate_weekly_summaries(user_id: str, days: Iterable[date]) -> None:
+    """Drop the cached summaries of the weeks containing ``days`` (e.g. a backdated upload)."""
+    for week_start in {_week_start(day) for day in days}:
+        _past_week_cache.pop((user_id, week_start))
+
+
+def _intensity_classes(zones: list[tuple]) -> list[str]:
+    """Low / moderate / high class of each zone of a zone method definition."""
+    lowers = [lower_pct for _, _, lower_pct, _ in zones]
+    classes = []
+    for i, lower in enumerate(lowers):
+        upper = lowers[i + 1] if i + 1 < len(lowers) else float("inf")
+        if upper <= LOW_INTENSITY_MAX:
+            classes.append("low")
+        elif lower >= HIGH_INTENSITY_MIN:
+            classes.append("high")
+        else:
+            classes.append("moderate")
+    return classes
+
+
+def _intensity_distribution(method: str, zones: list[tuple], seconds: list[float]) -> IntensityDistribution:
+    totals = {"low": 0.0, "moderate": 0.0, "high": 0.0}
+    for intensity, seconds_in_zone in zip(_intensity_classes(zones), seconds):
+        totals[intensity] += seconds_in_zone
+    total = sum(totals.values()) or 1.0
+    return IntensityDistribution(
+        method=method,
+        zone_seconds=[round(s, 1) for s in seconds],
+        low_seconds=round(totals["low"], 1),
+        moderate_seconds=round(totals["moderate"], 1),
+        high_seconds=round(totals["high"], 1),
+        low_fraction=round(totals["low"] / total, 3),
+        moderate_fraction=round(totals["moderate"] / total, 3),
+        high_fraction=round(totals["high"] / total, 3),
+    )
+
+
+async def _weekly_zone_seconds(
+    user_id: str,
+    field: str,
+    method: str,
+    zone_count: int,
+    start_dt: datetime,
+    end_dt: datetime,
+) -> dict[date, list[float]]:
+    """Sum the stored time-in-zone vectors of one method per week, in MongoDB."""
+    rows = await Activity.find(
         Activity.user_id == user_id,
         Activity.start_time >= start_dt,
-    ).to_list()
-
-    # Group by week
-    weekly: dict[date, dict] = {}
-    for i in range(weeks):
-        ws = start + timedelta(weeks=i)
-        weekly[ws] = {
-            "total_tss": 0.0,
-            "total_scaled_tss": 0.0,
-            "total_duration": 0.0,
-            "total_distance": 0.0,
-            "activity_count": 0,
-            "by_sport": defaultdict(float),
-        }
-
-    for act in activities:
-        act_date = act.start_time.date()
-        act_week_start = act_date - timedelta(days=act_date.weekday())
-        if act_week_start in weekly:
-            w = weekly[act_week_start]
-            tss = act.tss or 0.0
-            scaled = act.scaled_tss or tss
-            w["total_tss"] += tss
-            w["total_scaled_tss"] += scaled
-            w["total_duration"] += act.total_timer_time or 0
-            w["total_distance"] += act.total_distance or 0
-            w["activity_count"] += 1
-            w["by_sport"][act.sport] += tss
-
-    return [
-        WeeklySummary(
-            week_start=ws,
-            total_tss=round(w["total_tss"], 1),
-            total_scaled_tss=round(w["total_scaled_tss"], 1),
-            total_duration=w["total_duration"],
-            total_distance=w["total_distance"],
-            activity_count=w["activity_count"],
-            by_sport=dict(w["by_sport"]),
-        )
-        for ws, w in sorted(weekly.items())
-    ]
+        Activity.start_time <= end_dt,
+        {f"{field}.method": method},
+    ).aggregate([
+        {"$unwind": {"path": f"${field}.seconds", "includeArrayIndex": "zone"}},
+        {"$group": {
+            "_id": {
+                "week": {"$dateTrunc": {"date": "$start_time", "unit": "week", "startOfWeek": "monday"}},
+                "zone": "$zone",
+            },
+            "seconds": {"$sum": f"${field}.seconds"},
+        }},
+    ]).to_list()
+
+    weekly: dict[date, list[float]] = defaultdict(lambda: [0.0] * zone_count)
+    for row in rows:
+        zone = row["_id"]["zone"]
+        if zone < zone_count:
+            weekly[row["_id"]["week"].date()][zone] = row["seconds"]
+    return weekly
+
+
+async def get_zone_distribution(user_id: str, start: date, end: date, user: User) -> ZoneDistributionReport:
+    """Time in the user's configured HR and power zones per week, with 80/20 fractions."""
+    start_dt = datetime.combine(start, datetime.min.time()).replace(tzinfo=timezone.utc)
+    end_dt = datetime.combine(end, datetime.max.time()).replace(tzinfo=timezone.utc)
+
+    config = user.zone_config
+    hr_method = resolve_hr_method(config.hr_method, config.hr_activity)
+    methods = {
+        "hr": ("hr_zone_time", hr_method, HR_METHODS.get(hr_method)),
+        "power": ("power_zone_time", config.power_method, POWER_METHODS.get(config.power_method)),
+    }
+
+    totals: dict[str, IntensityDistribution] = {}
+    weeks: dict[date, dict[str, IntensityDistribution]] = defaultdict(dict)
+    for kind, (field, method, method_def) in methods.items():
+        if method_def is None:
+            continue
+        zones = method_def["zones"]
+        weekly = await _weekly_zone_seconds(user_id, field, method, len(zones), start_dt, end_dt)
+        if not weekly:
+            continue
+        for week_start, seconds in weekly.items():
+            weeks[week_start][kind] = _intensity_distribution(method, zones, seconds)
+        range_seconds = [sum(values) for values in zip(*weekly.values())]
+        totals[kind] = _intensity_distribution(method, zones, range_seconds)
+
+    return ZoneDistributionReport(
+        start_date=start,
+        end_date=end,
+        hr=totals.get("hr"),
+        power=totals.get("power"),
+        weekly=[
+            WeeklyZoneDistribution(week_start=week_start, **by_kind)
+            for week_start, by_kind in sorted(weeks.items())
+        ],
+    )
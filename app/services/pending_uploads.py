@@ -0,0 +1,183 @@
+"""
+Uploads held back while the user decides about a possible duplicate.
+
+A duplicate upload is saved as a `PendingUpload` in its own collection, with
+the session summary only, and the spooled FIT file is kept on disk. Nothing is
+written to ``activities`` until the user confirms the upload or combines it
+with another activity; it is then promoted to an Activity with the same id, so
+clients keep using the id they were given. Pending uploads that are never
+resolved expire through the collection's TTL index, and their files are
+removed by a background task every ``pending_upload_purge_interval_s``.
+
+Promoting or discarding first claims the pending upload by deleting it
+atomically, so a concurrent confirm and combine promote it only once.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from fastapi import HTTPException
+
+from app.core.compute import compute
+from app.core.config import settings
+from app.models.activity import Activity
+from app.models.pending_upload import PendingUpload
+from app.models.user import User
+from app.services.activity_events import on_activities_changed
+from app.services.fit_parser import decode_fit_upload
+from app.services.metrics import compute_activity_metrics
+from app.services.upload_spool import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+_purger: asyncio.Task | None = None
+
+
+def _pending_dir() -> str:
+    return settings.pending_upload_dir or os.path.join(tempfile.gettempdir(), "polarize-pending")
+
+
+def _pending_path(user_id: str, file_hash: str) -> str:
+    return os.path.join(_pending_dir(), f"{user_id}-{file_hash}.fit")
+
+
+async def stash_pending_upload(upload: SpooledUpload, activity: Activity) -> PendingUpload:
+    """
+    Keep a duplicate upload until the user decides about it.
+
+    ``activity`` is the summary built from the upload; it gets the pending
+    upload's id so it can be returned to the client.
+    """
+    path = _pending_path(activity.user_id, activity.file_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    await compute.run_light(shutil.move, upload.path, path)
+
+    pending = PendingUpload(
+        user_id=activity.user_id,
+        file_hash=activity.file_hash,
+        activity=activity.model_dump(exclude={"id", "revision_id", "streams", "records"}),
+    )
+    await pending.insert()
+    activity.id = pending.id
+    return pending
+
+
+async def get_pending_upload(pending_id: str, user: User) -> PendingUpload | None:
+    pending = await PendingUpload.get(pending_id)
+    if pending is None or pending.user_id != str(user.id):
+        return None
+    return pending
+
+
+async def list_pending_uploads(user: User) -> list[PendingUpload]:
+    return await PendingUpload.find(PendingUpload.user_id == str(user.id)).sort(-PendingUpload.created_at).to_list()
+
+
+def pending_summary(pending: PendingUpload) -> Activity:
+    """The pending upload as an unsaved, summary-only Activity."""
+    activity = Activity(**pending.activity)
+    activity.id = pending.id
+    return activity
+
+
+async def pending_activity(pending: PendingUpload) -> Activity:
+    """The pending upload as an unsaved Activity with its records decoded."""
+    activity = pending_summary(pending)
+    path = _pending_path(pending.user_id, pending.file_hash)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=410,
+            detail="The original upload is no longer available. Please upload the file again.",
+        )
+    decoded = await decode_fit_upload(path, activity.file_hash)
+    if decoded.channels:
+        activity.set_channels(decoded.channels)
+        activity.data_quality = decoded.quality
+    return activity
+
+
+async def _claim(pending: PendingUpload) -> bool:
+    """Atomically take the pending upload out of the store; False if another request did."""
+    claimed = await PendingUpload.get_motor_collection().find_one_and_delete({"_id": pending.id})
+    return claimed is not None
+
+
+async def promote_pending_upload(pending: PendingUpload, user: User) -> Activity:
+    """Decode, score and store a pending upload as an Activity with the same id."""
+    if not await _claim(pending):
+        # Promoted by a concurrent request; return its result once stored
+        activity = await Activity.get(pending.id)
+        if activity is None:
+            raise HTTPException(status_code=409, detail="This upload is already being confirmed")
+        return activity
+
+    try:
+        activity = await pending_activity(pending)
+        await compute_activity_metrics(activity, user)
+        await activity.insert()
+    except Exception:
+        # Hand the upload back so it can be confirmed again
+        await pending.insert()
+        raise
+    await on_activities_changed(activity.user_id, [activity.start_time.date()])
+    _unlink(_pending_path(pending.user_id, pending.file_hash))
+    return activity
+
+
+async def discard_pending_upload(pending: PendingUpload) -> None:
+    """Drop a pending upload the user does not want."""
+    if await _claim(pending):
+        _unlink(_pending_path(pending.user_id, pending.file_hash))
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _purge_files(directory: str, max_age_s: float) -> int:
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            _unlink(entry.path)
+            removed += 1
+    return removed
+
+
+async def purge_expired_pending_files() -> int:
+    """Delete stashed files older than the pending-upload TTL."""
+    return await compute.run_light(_purge_files, _pending_dir(), settings.pending_upload_ttl_s)
+
+
+async def _purge_loop() -> None:
+    while True:
+        try:
+            await purge_expired_pending_files()
+        except Exception:
+            logger.exception("Purging expired pending uploads failed")
+        await asyncio.sleep(settings.pending_upload_purge_interval_s)
+
+
+def start_pending_upload_purger() -> None:
+    """Start the background purge task (called at startup)."""
+    global _purger
+    if _purger is None or _purger.done():
+        _purger = asyncio.create_task(_purge_loop())
+
+
+async def stop_pending_upload_purger() -> None:
+    """Stop the purge task (called on shutdown)."""
+    global _purger
+    if _purger is not None:
+        _purger.cancel()
+        await asyncio.gather(_purger, return_exceptions=True)
+        _purger = None
@@ -0,0 +1,114 @@
+"""
+Power-duration (mean-maximal power) curves.
+
+Each activity stores its best average power for every duration of a fixed,
+log-spaced grid (every second up to ~15 s, then sparser up to 24 h), computed
+once at ingest from cumulative sums. A user's curve over a window is the
+element-wise maximum of the stored per-activity curves; those envelopes are
+cached per user and window until an activity inside the window changes, or
+for at most ``power_curve_cache_ttl_s``.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.activity import Activity
+from app.schemas.metrics import PowerCurve
+
+# Durations (seconds) the curve is sampled at; shared by every activity
+POWER_CURVE_DURATIONS = np.unique(np.round(np.geomspace(1, 24 * 3600, 200)).astype(np.int64))
+
+# Window name -> days back from today; None means all time, "season" the calendar year
+POWER_CURVE_WINDOWS: dict[str, int | None] = {"42d": 42, "90d": 90, "season": None, "all": None}
+
+# (user_id, window, today) -> PowerCurve. Invalidation only reaches this
+# process's cache; the TTL bounds how long another worker's change goes unnoticed.
+_envelope_cache = LRUCache(settings.power_curve_cache_entries, ttl=settings.power_curve_cache_ttl_s)
+
+
+class _PowerCurveView(BaseModel):
+    power_curve: list[float] | None = None
+
+
+def compute_power_curve(time: np.ndarray | None, power: np.ndarray | None) -> list[float] | None:
+    """
+    Best average power for each duration of `POWER_CURVE_DURATIONS` up to the
+    activity's length.
+
+    Samples are placed on a 1 s grid from the time channel; seconds without a
+    reading (pauses, smart-recording gaps) count as 0 W.
+    """
+    if time is None or power is None:
+        return None
+    valid = ~np.isnan(power)
+    if not valid.any():
+        return None
+
+    offsets = time[valid] - time.min()
+    series = np.zeros(int(offsets.max()) + 1)
+    series[offsets] = np.clip(power[valid], 0, None)
+    cumulative = np.concatenate(([0.0], np.cumsum(series)))
+
+    durations = POWER_CURVE_DURATIONS[POWER_CURVE_DURATIONS <= len(series)]
+    return [
+        round(float(np.max(cumulative[d:] - cumulative[:-d])) / d, 1)
+        for d in durations.tolist()
+    ]
+
+
+def _window_start(window: str, today: date) -> date | None:
+    if window == "season":
+        return today.replace(month=1, day=1)
+    days = POWER_CURVE_WINDOWS[window]
+    return None if days is None else today - timedelta(days=days - 1)
+
+
+async def get_power_curve(user_id: str, window: str) -> PowerCurve:
+    """The user's power-duration envelope over ``window`` (see `POWER_CURVE_WINDOWS`)."""
+    today = date.today()
+    key = (user_id, window, today)
+    cached = _envelope_cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = _window_start(window, today)
+    query = Activity.find(Activity.user_id == user_id, Activity.power_curve != None)
+    if start is not None:
+        query = query.find(
+            Activity.start_time >= datetime.combine(start, datetime.min.time()).replace(tzinfo=timezone.utc)
+        )
+
+    envelope = np.zeros(len(POWER_CURVE_DURATIONS))
+    longest = 0
+    for view in await query.project(_PowerCurveView).to_list():
+        curve = view.power_curve or []
+        np.maximum(envelope[:len(curve)], curve, out=envelope[:len(curve)])
+        longest = max(longest, len(curve))
+
+    result = PowerCurve(
+        window=window,
+        start_date=start,
+        end_date=today,
+        durations=POWER_CURVE_DURATIONS[:longest].tolist(),
+        watts=envelope[:longest].round(1).tolist(),
+    )
+    _envelope_cache.set(key, result)
+    return result
+
+
+def invalidate_power_curves(user_id: str, days: Iterable[date]) -> None:
+    """Drop the cached envelopes whose window contains any of ``days``."""
+    days = list(days)
+    if not days:
+        return
+    today = date.today()
+    latest = max(days)
+    for window in POWER_CURVE_WINDOWS:
+        start = _window_start(window, today)
+        if start is None or latest >= start:
+            _envelope_cache.pop((user_id, window, today))
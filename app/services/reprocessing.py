@@ -0,0 +1,328 @@
+"""
+Background rescoring of stored activities.
+
+Changing thresholds, zone methods or sport scaling changes how
+`metrics.score_activity` would score an activity, and a new
+``METRICS_VERSION`` changes it for everyone. A job walks the affected
+activities in ``_id`` order in batches of ``reprocess_batch_size``:
+
+1. the batch is read with one query resuming after the checkpointed ``_id``;
+2. it is rescored on the compute thread pool from the stored streams;
+3. results are written back with one unordered ``bulk_write`` of ``$set``
+   updates, so the streams are never rewritten;
+4. daily load and cached power curves of the batch's days are refreshed;
+5. progress is checkpointed, renewing the job's lease.
+
+Jobs survive restarts the same way bulk imports do: unfinished jobs are
+resumed at startup, and a background sweep takes over a job whose process died
+once its lease expires. A newer job for the same user supersedes an active one, which stops at
+its next checkpoint.
+
+Only metrics are recomputed; the original FIT files are not kept, so a parser
+upgrade reaches stored activities only through the formulas applied to their
+streams.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from app.core.compute import compute
+from app.core.config import settings
+from app.models.activity import Activity
+from app.models.reprocess_job import ReprocessJob
+from app.models.user import User
+from app.services.activity_events import on_activities_changed
+from app.services.metrics import METRICS_VERSION, score_activity
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Activity fields written by `score_activity`
+SCORED_FIELDS = (
+    "tss",
+    "scaled_tss",
+    "normalized_power",
+    "intensity_factor",
+    "hr_zone_time",
+    "power_zone_time",
+    "power_curve",
+    "fingerprint",
+    "metrics_version",
+)
+
+# Tasks of jobs running in this process, by job id
+_tasks: dict[str, asyncio.Task] = {}
+_sweeper: asyncio.Task | None = None
+
+
+def _activity_filter(job: ReprocessJob) -> dict:
+    """Raw query for the activities a job rescores (before its checkpoint)."""
+    query: dict = {}
+    if job.user_id is not None:
+        query["user_id"] = job.user_id
+    else:
+        query["metrics_version"] = {"$ne": METRICS_VERSION}
+    return query
+
+
+async def create_reprocess_job(user_id: str | None, reason: str) -> ReprocessJob:
+    """
+    Queue a rescoring of one user's activities, or with ``user_id=None`` of
+    every activity scored by an older ``METRICS_VERSION``.
+
+    Active jobs with the same scope are superseded: they would only write
+    results computed from outdated settings.
+    """
+    await ReprocessJob.get_motor_collection().update_many(
+        {"user_id": user_id, "status": {"$in": list(ACTIVE_STATUSES)}},
+        {"$set": {"status": "superseded", "finished_at": datetime.now(timezone.utc)}},
+    )
+    job = ReprocessJob(user_id=user_id, reason=reason)
+    job.total = await Activity.get_motor_collection().count_documents(_activity_filter(job))
+    await job.insert()
+    start_reprocess_job(job)
+    return job
+
+
+async def schedule_metrics_upgrade() -> ReprocessJob | None:
+    """
+    Queue an all-users job if any activity was scored by an older
+    ``METRICS_VERSION`` and none is already queued (called at startup).
+    """
+    active = await ReprocessJob.find(
+        ReprocessJob.user_id == None,
+        In(ReprocessJob.status, ACTIVE_STATUSES),
+    ).first_or_none()
+    if active is not None:
+        return None
+    stale = await Activity.get_motor_collection().find_one(
+        _activity_filter(ReprocessJob(reason="metrics_upgrade")), {"_id": 1}
+    )
+    if stale is None:
+        return None
+    return await create_reprocess_job(None, "metrics_upgrade")
+
+
+def start_reprocess_job(job: ReprocessJob) -> None:
+    """Run a job in the background of this process unless it is already running."""
+    job_id = str(job.id)
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(_run_reprocess_job(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+
+
+async def _resume_unleased_jobs() -> None:
+    """Start unfinished jobs that no live process holds the lease of."""
+    jobs = await ReprocessJob.find(
+        In(ReprocessJob.status, ACTIVE_STATUSES),
+        {"$or": [
+            {"lease_expires_at": None},
+            {"lease_expires_at": {"$lt": datetime.now(timezone.utc)}},
+        ]},
+    ).to_list()
+    for job in jobs:
+        start_reprocess_job(job)
+
+
+async def _sweep_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.reprocess_lease_s / 2)
+        try:
+            await _resume_unleased_jobs()
+        except Exception:
+            logger.exception("Resuming stale reprocess jobs failed")
+
+
+async def resume_reprocess_jobs() -> None:
+    """
+    Restart jobs left unfinished by a previous process and keep sweeping for
+    jobs whose lease expired (called at startup).
+    """
+    global _sweeper
+    await _resume_unleased_jobs()
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_loop())
+
+
+async def cancel_reprocess_tasks() -> None:
+    """Stop the sweep and running jobs on shutdown; they resume from their checkpoint."""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _claim(job_id: str) -> bool:
+    """Take the job's lease so only one worker process runs it."""
+    now = datetime.now(timezone.utc)
+    result = await ReprocessJob.get_motor_collection().update_one(
+        {
+            "_id": PydanticObjectId(job_id),
+            "status": {"$in": list(ACTIVE_STATUSES)},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+        },
+        {"$set": {
+            "status": "running",
+            "lease_expires_at": now + timedelta(seconds=settings.reprocess_lease_s),
+        }},
+    )
+    return result.modified_count == 1
+
+
+async def _checkpoint(job: ReprocessJob, **fields) -> bool:
+    """
+    Save progress and renew the lease while the job is still running.
+
+    Returns False if the job was superseded meanwhile.
+    """
+    job.updated_at = datetime.now(timezone.utc)
+    result = await ReprocessJob.get_motor_collection().update_one(
+        {"_id": job.id, "status": "running"},
+        {"$set": {
+            "last_id": job.last_id,
+            "processed": job.processed,
+            "updated": job.updated,
+            "failed": job.failed,
+            "updated_at": job.updated_at,
+            **fields,
+        }},
+    )
+    return result.modified_count == 1
+
+
+def _score_batch(activities: list[Activity], users: dict[str, User]) -> list[tuple[Activity, float | None, bool]]:
+    """
+    Rescore a batch in place (runs on the compute thread pool).
+
+    Returns (activity, previous TSS, scored) for each activity; activities
+    whose user no longer exists or whose scoring raised are not scored.
+    """
+    results = []
+    for activity in activities:
+        previous = activity.tss
+        user = users.get(activity.user_id)
+        if user is None:
+            results.append((activity, previous, False))
+            continue
+        try:
+            score_activity(activity, user)
+        except Exception:
+            logger.exception("Rescoring activity %s failed", activity.id)
+            results.append((activity, previous, False))
+            continue
+        results.append((activity, previous, True))
+    return results
+
+
+async def _score_chunks(activities: list[Activity], users: dict[str, User]) -> list[tuple[Activity, float | None, bool]]:
+    """Split a batch across the thread pool, waiting while the pool is full."""
+    workers = max(1, settings.compute_thread_workers)
+    size = -(-len(activities) // workers)
+    chunks = [activities[i:i + size] for i in range(0, len(activities), size)]
+
+    async def score(chunk: list[Activity]) -> list[tuple[Activity, float | None, bool]]:
+        while True:
+            try:
+                return await compute.run_light(_score_batch, chunk, users)
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                # Interactive requests have priority; back off and retry
+                await asyncio.sleep(settings.compute_retry_after_s)
+
+    scored = await asyncio.gather(*(score(chunk) for chunk in chunks))
+    return [item for chunk in scored for item in chunk]
+
+
+async def _reprocess_batch(job: ReprocessJob, activities: list[Activity], users: dict[str, User]) -> None:
+    scored = await _score_chunks(activities, users)
+
+    writes = []
+    days: dict[str, set[date]] = defaultdict(set)
+    for activity, previous, ok in scored:
+        if not ok:
+            job.failed += 1
+            continue
+        values = activity.model_dump(include=set(SCORED_FIELDS))
+        writes.append(UpdateOne({"_id": activity.id}, {"$set": values}))
+        if activity.tss != previous:
+            job.updated += 1
+        days[activity.user_id].add(activity.start_time.date())
+
+    if writes:
+        await Activity.get_motor_collection().bulk_write(writes, ordered=False)
+    for user_id, user_days in days.items():
+        await on_activities_changed(user_id, user_days)
+
+
+async def _load_users(user_ids: set[str], cache: dict[str, User]) -> dict[str, User]:
+    missing = [PydanticObjectId(uid) for uid in user_ids - cache.keys() if PydanticObjectId.is_valid(uid)]
+    if missing:
+        for user in await User.find(In(User.id, missing)).to_list():
+            cache[str(user.id)] = user
+    return cache
+
+
+async def _run_reprocess_job(job_id: str) -> None:
+    if not await _claim(job_id):
+        return
+    job = await ReprocessJob.get(job_id)
+    query = _activity_filter(job)
+    users: dict[str, User] = {}
+
+    try:
+        while True:
+            batch_query = dict(query)
+            if job.last_id is not None:
+                batch_query["_id"] = {"$gt": job.last_id}
+            activities = await Activity.find(batch_query).sort(+Activity.id).limit(
+                settings.reprocess_batch_size
+            ).to_list()
+            if not activities:
+                break
+
+            # Users are read once per job so every batch scores with the same settings
+            await _load_users({a.user_id for a in activities}, users)
+            await _reprocess_batch(job, activities, users)
+
+            job.last_id = activities[-1].id
+            job.processed += len(activities)
+            if not await _checkpoint(job, lease_expires_at=job.updated_at + timedelta(
+                seconds=settings.reprocess_lease_s
+            )):
+                return  # superseded by a newer job
+
+        job.status = "completed"
+    except asyncio.CancelledError:
+        # Shutdown: release the lease so the next start resumes immediately
+        await _checkpoint(job, lease_expires_at=None)
+        raise
+    except Exception as e:
+        logger.exception("Reprocess job %s failed", job_id)
+        job.status = "failed"
+        job.detail = str(e)
+
+    job.finished_at = datetime.now(timezone.utc)
+    await _checkpoint(
+        job,
+        status=job.status,
+        detail=job.detail,
+        finished_at=job.finished_at,
+        lease_expires_at=None,
+    )
@@ -0,0 +1,224 @@
+"""
+Clean decoded activity channels before they are stored and scored.
+
+Every pass works on whole NumPy arrays (``time`` as int64 second offsets, other
+channels float64 with NaN for missing samples):
+
+- flat-lines: a heart-rate or power sensor repeating the same non-zero value
+  for too long is treated as frozen and those samples are dropped. Constant
+  power while the rider is pedalling is ERG mode on a smart trainer, not a
+  frozen sensor, so power only counts as frozen where cadence is zero (or,
+  without a cadence channel, after a much longer run);
+- spikes: isolated power/speed samples far from their 3-sample median, or
+  above a hard ceiling, are clamped to that median;
+- heart-rate dropouts: zero or implausible readings are dropped and short gaps
+  interpolated over time; longer gaps stay missing;
+- GPS jumps: short runs of positions entered and left at an implausible
+  implied speed are dropped.
+
+Durations are measured with the time channel, so smart (variable-rate)
+recording is handled the same as 1 Hz data.
+"""
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.models.activity import ChannelQuality
+from app.utils.stream_codec import TIME_CHANNEL, VALUE_CHANNELS
+
+EARTH_RADIUS_M = 6371000.0
+
+
+class CleaningConfig(BaseModel):
+    """Thresholds for `clean_channels`; defaults come from the ``cleaning_*`` settings."""
+    power_spike_w: float = settings.cleaning_power_spike_w
+    power_max_w: float = settings.cleaning_power_max_w
+    speed_spike_mps: float = settings.cleaning_speed_spike_mps
+    speed_max_mps: float = settings.cleaning_speed_max_mps
+    hr_min_bpm: float = settings.cleaning_hr_min_bpm
+    hr_max_bpm: float = settings.cleaning_hr_max_bpm
+    hr_max_gap_s: float = settings.cleaning_hr_max_gap_s
+    gps_max_speed_mps: float = settings.cleaning_gps_max_speed_mps
+    gps_max_jump_samples: int = settings.cleaning_gps_max_jump_samples
+    # Seconds a non-zero value may repeat before the sensor is considered frozen;
+    # for power only samples without pedalling count (see `_frozen_power`).
+    # Cadence is not checked: stroke rate and cadence are whole numbers and
+    # legitimately hold steady through long pieces
+    flatline_s: dict[str, float] = Field(
+        default_factory=lambda: {
+            "heart_rate": settings.cleaning_hr_flatline_s,
+            "power": settings.cleaning_power_flatline_s,
+        }
+    )
+    # Power flat-line limit for files without a cadence channel, where ERG mode
+    # cannot be told apart from a frozen sensor
+    power_flatline_no_cadence_s: float = settings.cleaning_power_flatline_no_cadence_s
+
+
+DEFAULT_CLEANING = CleaningConfig()
+
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start and (exclusive) end indices of the runs of True in ``mask``."""
+    edges = np.diff(mask.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _runs_mask(starts: np.ndarray, ends: np.ndarray, length: int) -> np.ndarray:
+    """Inverse of `_runs`."""
+    marks = np.zeros(length + 1, dtype=np.int32)
+    marks[starts] += 1
+    marks[ends] -= 1
+    return np.cumsum(marks[:-1]) > 0
+
+
+def _flatlines(time: np.ndarray, values: np.ndarray, limit_s: float) -> np.ndarray:
+    """Mask of samples belonging to a frozen run of one repeated non-zero value."""
+    repeats = (values[1:] == values[:-1]) & (values[1:] > 0)
+    starts, ends = _runs(repeats)
+    # Run of repeated pairs [s, e) covers samples s..e
+    frozen = time[ends] - time[starts] >= limit_s
+    return _runs_mask(starts[frozen], ends[frozen] + 1, len(values))
+
+
+def _frozen_power(
+    time: np.ndarray,
+    power: np.ndarray,
+    cadence: np.ndarray | None,
+    config: CleaningConfig,
+) -> np.ndarray:
+    """Mask of frozen power samples; steady power with pedalling is ERG mode."""
+    if cadence is None or np.isnan(cadence).all():
+        return _flatlines(time, power, config.power_flatline_no_cadence_s)
+    # Samples with pedalling break the run, so only stretches without it can freeze
+    not_pedalling = ~(cadence > 0)
+    return _flatlines(time, np.where(not_pedalling, power, np.nan), config.flatline_s["power"])
+
+
+def _clamp_spikes(values: np.ndarray, threshold: float, ceiling: float) -> tuple[np.ndarray, int]:
+    """Clamp isolated spikes to the median of each sample and its neighbours."""
+    valid = ~np.isnan(values)
+    present = values[valid]
+    if len(present) < 3:
+        return values, 0
+
+    prev = np.concatenate((present[:1], present[:-1]))
+    nxt = np.concatenate((present[1:], present[-1:]))
+    median = np.maximum(np.minimum(prev, present), np.minimum(np.maximum(prev, present), nxt))
+    spikes = (np.abs(present - median) > threshold) | (present > ceiling)
+    count = int(spikes.sum())
+    if not count:
+        return values, 0
+
+    out = values.copy()
+    out[valid] = np.where(spikes, np.minimum(median, ceiling), present)
+    return out, count
+
+
+def _fill_hr_dropouts(time: np.ndarray, hr: np.ndarray, config: CleaningConfig) -> tuple[np.ndarray, int, int]:
+    """
+    Drop implausible heart-rate readings and interpolate short gaps.
+
+    Returns the cleaned array, the number of readings dropped and the number
+    of samples filled in.
+    """
+    good = (hr >= config.hr_min_bpm) & (hr <= config.hr_max_bpm)
+    if good.all() or not good.any():
+        return hr, 0, 0
+
+    dropped = int((~good & ~np.isnan(hr)).sum())
+    starts, ends = _runs(~good)
+    # Only gaps with readings on both sides that are short enough are filled
+    inner = (starts > 0) & (ends < len(hr))
+    gap_s = time[np.minimum(ends, len(hr) - 1)] - time[np.maximum(starts - 1, 0)]
+    short = inner & (gap_s <= config.hr_max_gap_s)
+    fill = _runs_mask(starts[short], ends[short], len(hr))
+
+    out = np.where(good, hr, np.nan)
+    out[fill] = np.rint(np.interp(time[fill], time[good], hr[good]))
+    return out, dropped, int(fill.sum())
+
+
+def _gps_jumps(time: np.ndarray, lat: np.ndarray, lon: np.ndarray, config: CleaningConfig) -> np.ndarray:
+    """Mask of position fixes that belong to a short excursion at implausible speed."""
+    rejected = np.zeros(len(lat), dtype=bool)
+    idx = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+    if len(idx) < 3:
+        return rejected
+
+    phi = np.radians(lat[idx])
+    lam = np.radians(lon[idx])
+    # Equirectangular distance is accurate enough between consecutive fixes
+    x = np.diff(lam) * np.cos((phi[1:] + phi[:-1]) / 2)
+    distance = EARTH_RADIUS_M * np.hypot(x, np.diff(phi))
+    dt = np.maximum(np.diff(time[idx]), 1)
+    jumps = np.flatnonzero(distance / dt > config.gps_max_speed_mps) + 1
+    if not len(jumps):
+        return rejected
+
+    # Split the fixes into segments at every jump; short segments are excursions,
+    # except the longest segment, which is taken as the real track
+    bounds = np.concatenate(([0], jumps, [len(idx)]))
+    lengths = np.diff(bounds)
+    bad = lengths <= config.gps_max_jump_samples
+    bad[np.argmax(lengths)] = False
+    starts = bounds[:-1][bad]
+    ends = bounds[1:][bad]
+    rejected[idx[_runs_mask(starts, ends, len(idx))]] = True
+    return rejected
+
+
+def clean_channels(
+    channels: dict[str, np.ndarray],
+    config: CleaningConfig = DEFAULT_CLEANING,
+) -> tuple[dict[str, np.ndarray], dict[str, ChannelQuality]]:
+    """
+    Clean decoded channels.
+
+    Returns new channel arrays (inputs are not modified) and data-quality
+    stats for every channel that has data.
+    """
+    time = channels[TIME_CHANNEL]
+    cleaned = dict(channels)
+    quality = {
+        name: ChannelQuality(samples=int(np.count_nonzero(~np.isnan(values))))
+        for name, values in channels.items()
+        if name in VALUE_CHANNELS
+    }
+
+    for name, limit_s in config.flatline_s.items():
+        values = cleaned.get(name)
+        if values is None or len(values) < 2:
+            continue
+        if name == "power":
+            frozen = _frozen_power(time, values, channels.get("cadence"), config)
+        else:
+            frozen = _flatlines(time, values, limit_s)
+        if frozen.any():
+            cleaned[name] = np.where(frozen, np.nan, values)
+            quality[name].rejected += int(frozen.sum())
+
+    for name, threshold, ceiling in (
+        ("power", config.power_spike_w, config.power_max_w),
+        ("speed", config.speed_spike_mps, config.speed_max_mps),
+    ):
+        if name in cleaned:
+            cleaned[name], quality[name].spikes = _clamp_spikes(cleaned[name], threshold, ceiling)
+
+    if "heart_rate" in cleaned:
+        cleaned["heart_rate"], dropped, filled = _fill_hr_dropouts(time, cleaned["heart_rate"], config)
+        quality["heart_rate"].rejected += dropped
+        quality["heart_rate"].interpolated = filled
+
+    if "latitude" in cleaned and "longitude" in cleaned:
+        rejected = _gps_jumps(time, cleaned["latitude"], cleaned["longitude"], config)
+        if rejected.any():
+            for name in ("latitude", "longitude"):
+                cleaned[name] = np.where(rejected, np.nan, cleaned[name])
+                quality[name].rejected += int(rejected.sum())
+
+    for name, stats in quality.items():
+        stats.missing = int(np.count_nonzero(np.isnan(cleaned[name])))
+
+    return cleaned, {name: stats for name, stats in quality.items() if stats.samples}
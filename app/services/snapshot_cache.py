@@ -0,0 +1,92 @@
+"""
+Per-user cache of the performance snapshot shown on the dashboard.
+
+Snapshots are kept in an in-process LRU keyed by (user, day) with a short TTL.
+With ``snapshot_cache_shared`` they are also stored in the ``snapshot_cache``
+collection, so a worker that misses locally can reuse one computed by another
+worker instead of rebuilding it from the load tables.
+
+Entries are dropped by `invalidate_snapshot` when the user's activities change
+(see `activity_events.on_activities_changed`) or their thresholds do.
+Invalidation clears the local LRU and the shared collection; other workers'
+LRUs catch up within ``snapshot_cache_ttl_s``.
+"""
+
+from datetime import date, datetime, time, timezone
+from typing import Awaitable, Callable
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.snapshot_cache import CachedSnapshot
+from app.schemas.metrics import PerformanceSnapshot
+
+# (user_id, day) -> PerformanceSnapshot
+_snapshot_cache = LRUCache(settings.snapshot_cache_entries, ttl=settings.snapshot_cache_ttl_s)
+
+# Bumped on invalidation so a snapshot computed before it is not stored after it
+_generations: dict[str, int] = {}
+
+_shared_stats = {"hits": 0, "misses": 0}
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min).replace(tzinfo=timezone.utc)
+
+
+async def cached_snapshot(
+    user_id: str,
+    compute_snapshot: Callable[[], Awaitable[PerformanceSnapshot]],
+) -> PerformanceSnapshot:
+    """Today's snapshot for ``user_id``, computed with ``compute_snapshot`` on a miss."""
+    today = date.today()
+    key = (user_id, today)
+    snapshot = _snapshot_cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    if settings.snapshot_cache_shared:
+        shared = await CachedSnapshot.find_one(
+            CachedSnapshot.user_id == user_id,
+            CachedSnapshot.day == _midnight(today),
+        )
+        if shared is not None:
+            _shared_stats["hits"] += 1
+            snapshot = PerformanceSnapshot(**shared.snapshot)
+            _snapshot_cache.set(key, snapshot)
+            return snapshot
+        _shared_stats["misses"] += 1
+
+    generation = _generations.get(user_id, 0)
+    snapshot = await compute_snapshot()
+    if _generations.get(user_id, 0) != generation:
+        return snapshot  # invalidated while computing
+
+    _snapshot_cache.set(key, snapshot)
+    if settings.snapshot_cache_shared:
+        await CachedSnapshot.get_motor_collection().replace_one(
+            {"user_id": user_id, "day": _midnight(today)},
+            {
+                "user_id": user_id,
+                "day": _midnight(today),
+                "snapshot": snapshot.model_dump(),
+                "created_at": datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+    return snapshot
+
+
+async def invalidate_snapshot(user_id: str) -> None:
+    """Drop the user's cached snapshots in this process and the shared collection."""
+    _generations[user_id] = _generations.get(user_id, 0) + 1
+    _snapshot_cache.pop((user_id, date.today()))
+    if settings.snapshot_cache_shared:
+        await CachedSnapshot.find(CachedSnapshot.user_id == user_id).delete()
+
+
+def snapshot_cache_stats() -> dict:
+    """Hit/miss counts of the local LRU and, when enabled, the shared layer."""
+    return {
+        "local": _snapshot_cache.stats(),
+        "shared": dict(_shared_stats) if settings.snapshot_cache_shared else None,
+    }
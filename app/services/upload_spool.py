@@ -0,0 +1,73 @@
+"""
+Spool uploaded files to disk.
+
+Uploads are copied to a temp file in fixed-size chunks while their SHA-256 is
+updated incrementally, so a file is never held in memory as one ``bytes``
+object. The parser then maps the spooled file with mmap in the worker process.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+class SpooledUpload:
+    """An upload copied to a temp file. Deletes the file when closed."""
+
+    def __init__(self, path: str, size: int, file_hash: str):
+        self.path = path
+        self.size = size
+        self.file_hash = file_hash
+
+    def close(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    limit_mb = max_bytes / (1024 * 1024)
+    return HTTPException(status_code=413, detail=f"File exceeds the {limit_mb:.0f} MB upload limit")
+
+
+async def spool_upload(file: UploadFile, max_bytes: int | None = None) -> SpooledUpload:
+    """
+    Copy an upload to a temp file, hashing it as it arrives.
+
+    Aborts with 413 as soon as the upload is known to exceed ``max_bytes``
+    (default ``settings.upload_max_bytes``), and with 400 if it is empty.
+    """
+    max_bytes = max_bytes or settings.upload_max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=settings.upload_spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(settings.upload_chunk_bytes):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest())
@@ -0,0 +1,90 @@
+"""
+Write-behind buffer for derived state on the User document.
+
+``current_ctl`` and ``current_atl`` change whenever activities are ingested and
+drift daily as the load decays. Instead of saving the whole User (integration
+tokens included) wherever they are computed, callers record the latest values
+here and a background task flushes them every ``user_state_flush_interval_s``
+with one unordered ``bulk_write`` of partial ``$set`` updates. Repeated updates
+for the same user within an interval coalesce into one write.
+
+The buffer is per process and is flushed on shutdown; losing it on a crash only
+delays the update until the next ingest or dashboard view covering today.
+"""
+
+import asyncio
+import logging
+from datetime import date
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.models.user import User
+from app.services.training_load import load_range
+
+logger = logging.getLogger(__name__)
+
+# user id -> latest (current_ctl, current_atl) awaiting a flush
+_pending: dict[str, tuple[float, float]] = {}
+_flusher: asyncio.Task | None = None
+
+
+def record_current_load(user_id: str, ctl: float, atl: float) -> None:
+    """Buffer a user's CTL/ATL as of today; the latest value per user wins."""
+    _pending[user_id] = (round(ctl, 1), round(atl, 1))
+
+
+async def refresh_current_load(user_id: str) -> None:
+    """Recompute today's CTL/ATL from the load tables and buffer them."""
+    today = date.today()
+    loads = await load_range(user_id, today, today)
+    if loads:
+        record_current_load(user_id, loads[-1].ctl, loads[-1].atl)
+
+
+async def flush_user_state() -> None:
+    """Write all buffered values, one partial update per user."""
+    if not _pending:
+        return
+    pending = dict(_pending)
+    _pending.clear()
+    try:
+        await User.get_motor_collection().bulk_write([
+            UpdateOne(
+                {"_id": PydanticObjectId(user_id)},
+                {"$set": {"current_ctl": ctl, "current_atl": atl}},
+            )
+            for user_id, (ctl, atl) in pending.items()
+        ], ordered=False)
+    except Exception:
+        # Keep the values for the next flush unless newer ones arrived meanwhile
+        for user_id, values in pending.items():
+            _pending.setdefault(user_id, values)
+        raise
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.user_state_flush_interval_s)
+        try:
+            await flush_user_state()
+        except Exception:
+            logger.exception("Flushing user state failed")
+
+
+def start_user_state_flusher() -> None:
+    """Start the background flush task (called at startup)."""
+    global _flusher
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.create_task(_flush_loop())
+
+
+async def stop_user_state_flusher() -> None:
+    """Stop the flush task and write what is still buffered (called on shutdown)."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+        _flusher = None
+    await flush_user_state()
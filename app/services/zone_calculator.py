@@ -312,7 +312,7 @@ def calculate_hr_zones(
 ) -> ZoneResult:
     """Calculate heart rate zones for a given method."""
     # Resolve method key (handle generic names)
-    method_key = _resolve_hr_method(method, activity)
+    method_key = resolve_hr_method(method, activity)
     if method_key not in HR_METHODS:
         raise ValueError(f"Unknown HR zone method: {method}")
 
@@ -414,7 +414,7 @@ def get_available_power_methods() -> list[ZoneMethodInfo]:
     ]
 
 
-def _resolve_hr_method(method: str, activity: str) -> str:
+def resolve_hr_method(method: str, activity: str) -> str:
     """Resolve a generic method name to a specific key based on activity."""
     if method in HR_METHODS:
         return method
@@ -0,0 +1,100 @@
+"""
+Vectorized time-in-zone engine.
+
+Samples are weighted by the time they stand for (the gap to the next
+timestamp), so smart-recording files with irregular sampling count correctly,
+and are classified against a whole array of zone lower bounds at once with
+``np.searchsorted``. The same engine serves hrTSS and the user's configured
+zone methods from `zone_calculator.HR_METHODS` and `POWER_METHODS`.
+"""
+
+import numpy as np
+
+from app.models.activity import ZoneTime
+from app.models.user import User
+from app.services.zone_calculator import calculate_hr_zones, calculate_power_zones, resolve_hr_method
+
+# Gaps between samples longer than this are pauses and count for nothing
+MAX_SAMPLE_GAP_S = 30.0
+
+
+def sample_durations(time: np.ndarray, max_gap_s: float = MAX_SAMPLE_GAP_S) -> np.ndarray:
+    """
+    Seconds each sample stands for: the gap to the next sample.
+
+    The last sample gets the median gap. Gaps longer than ``max_gap_s`` (and
+    non-increasing timestamps) count as zero.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    if len(time) == 0:
+        return np.empty(0)
+    gaps = np.diff(time)
+    durations = np.append(gaps, np.median(gaps) if len(gaps) else 1.0)
+    durations[(durations < 0) | (durations > max_gap_s)] = 0.0
+    return durations
+
+
+def zone_seconds(values: np.ndarray, durations: np.ndarray, lower_bounds) -> np.ndarray:
+    """
+    Seconds spent in each zone.
+
+    Zone ``i`` spans ``lower_bounds[i]`` up to the next bound; values below the
+    first or above the last bound count toward the first or last zone. Missing
+    (NaN) and non-positive samples are ignored.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    bounds = np.asarray(lower_bounds, dtype=np.float64)
+    valid = values > 0
+    zones = np.searchsorted(bounds, values[valid], side="right") - 1
+    np.clip(zones, 0, len(bounds) - 1, out=zones)
+    return np.bincount(zones, weights=durations[valid], minlength=len(bounds))
+
+
+def _zone_time(method: str, threshold: float, bounds: list[float], seconds: np.ndarray) -> ZoneTime:
+    return ZoneTime(
+        method=method,
+        threshold=threshold,
+        bounds=bounds,
+        seconds=[round(float(s), 1) for s in seconds],
+    )
+
+
+def hr_zone_time(user: User, time: np.ndarray | None, hr: np.ndarray | None) -> ZoneTime | None:
+    """Time in the user's configured HR zones, or None without HR data or LTHR."""
+    if time is None or hr is None:
+        return None
+    config = user.zone_config
+    try:
+        zones = calculate_hr_zones(
+            method=config.hr_method,
+            activity=config.hr_activity,
+            threshold_hr=user.thresholds.threshold_hr,
+            max_hr=user.thresholds.max_hr,
+            resting_hr=user.thresholds.resting_hr,
+        )
+    except ValueError:
+        return None
+    bounds = [zone.lower for zone in zones.zones]
+    seconds = zone_seconds(hr, sample_durations(time), bounds)
+    method = resolve_hr_method(config.hr_method, config.hr_activity)
+    return _zone_time(method, zones.threshold_value, bounds, seconds)
+
+
+def power_zone_time(user: User, time: np.ndarray | None, power: np.ndarray | None) -> ZoneTime | None:
+    """Time in the user's configured power zones, or None without power data or threshold."""
+    if time is None or power is None:
+        return None
+    config = user.zone_config
+    try:
+        zones = calculate_power_zones(
+            method=config.power_method,
+            activity=config.power_activity,
+            threshold_power=user.thresholds.threshold_power,
+            running_threshold_power=user.thresholds.running_threshold_power,
+            critical_power=user.thresholds.critical_power,
+        )
+    except ValueError:
+        return None
+    bounds = [zone.lower for zone in zones.zones]
+    seconds = zone_seconds(power, sample_durations(time), bounds)
+    return _zone_time(config.power_method, zones.threshold_value, bounds, seconds)
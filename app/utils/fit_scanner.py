@@ -0,0 +1,296 @@
+"""
+Low-level FIT file scanner.
+
+Walks the record headers of a FIT file without going through fitdecode's
+per-field object model. Messages of interest are handled in one of two ways:
+
+- bulk messages (e.g. ``record``) only have their byte offsets collected while
+  scanning; their payloads are then decoded all at once per definition message
+  with a NumPy structured dtype.
+- summary messages (e.g. ``session``, ``lap``) are decoded one at a time into
+  dicts keyed by profile field name.
+
+Everything else is skipped by size. Field names, scales, offsets and enum
+values come from fitdecode's FIT profile.
+"""
+
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from fitdecode import profile
+
+MESG_SESSION = 18
+MESG_LAP = 19
+MESG_RECORD = 20
+
+FIELD_TIMESTAMP = 253
+FIT_EPOCH = datetime(1989, 12, 31, tzinfo=timezone.utc)
+
+# Base type number -> (NumPy dtype without byte order, invalid raw value)
+_BASE_TYPES: dict[int, tuple[str, int | None]] = {
+    0: ("u1", 0xFF),  # enum
+    1: ("i1", 0x7F),  # sint8
+    2: ("u1", 0xFF),  # uint8
+    3: ("i2", 0x7FFF),  # sint16
+    4: ("u2", 0xFFFF),  # uint16
+    5: ("i4", 0x7FFFFFFF),  # sint32
+    6: ("u4", 0xFFFFFFFF),  # uint32
+    8: ("f4", None),  # float32 (invalid is NaN)
+    9: ("f8", None),  # float64
+    10: ("u1", 0x00),  # uint8z
+    11: ("u2", 0x0000),  # uint16z
+    12: ("u4", 0x00000000),  # uint32z
+    13: ("u1", 0xFF),  # byte
+    14: ("i8", 0x7FFFFFFFFFFFFFFF),  # sint64
+    15: ("u8", 0xFFFFFFFFFFFFFFFF),  # uint64
+    16: ("u8", 0x0000000000000000),  # uint64z
+}
+_BASE_TYPE_STRING = 7
+
+
+class FitFormatError(ValueError):
+    """Raised when a file is not a well-formed FIT file."""
+
+
+class _Definition:
+    """A decoded definition message."""
+
+    __slots__ = ("global_num", "byte_order", "fields", "size", "timestamp")
+
+    def __init__(self, global_num: int, byte_order: str, fields: list, size: int):
+        self.global_num = global_num
+        self.byte_order = byte_order
+        # (field number, offset in payload, size, base type number)
+        self.fields = fields
+        self.size = size
+        self.timestamp = None
+        for num, offset, field_size, base in fields:
+            if num == FIELD_TIMESTAMP and field_size == 4 and base in (6, 12):
+                self.timestamp = (struct.Struct(byte_order + "I"), offset)
+
+
+class BulkMessages:
+    """Offsets of all messages of one global type, decoded lazily per definition."""
+
+    def __init__(self, global_num: int):
+        self.global_num = global_num
+        self.count = 0
+        self.timestamps = array("q")  # FIT seconds, -1 if unknown
+        # definition -> (sequence numbers, payload offsets)
+        self._blocks: dict[_Definition, tuple[array, array]] = {}
+
+    def _add(self, definition: _Definition, offset: int, timestamp: int) -> None:
+        block = self._blocks.get(definition)
+        if block is None:
+            block = self._blocks[definition] = (array("q"), array("q"))
+        block[0].append(self.count)
+        block[1].append(offset)
+        self.timestamps.append(timestamp)
+        self.count += 1
+
+    def decode(self, buf, names: set[str] | None = None) -> dict[str, np.ndarray]:
+        """
+        Decode every message into float64 columns keyed by profile field name.
+
+        Scale and offset are applied and invalid values become NaN. Array and
+        string fields are skipped. Fields missing from some definitions are NaN
+        for those messages. ``names`` restricts which fields are decoded.
+        """
+        mesg_type = profile.MESSAGE_TYPES.get(self.global_num)
+        profile_fields = mesg_type.fields if mesg_type else {}
+        view = memoryview(buf)
+        columns: dict[str, np.ndarray] = {}
+
+        for definition, (seqs, offsets) in self._blocks.items():
+            wanted = []
+            for num, offset, size, base in definition.fields:
+                field = profile_fields.get(num)
+                if field is None or (names is not None and field.name not in names):
+                    continue
+                dtype, invalid = _BASE_TYPES.get(base, (None, None))
+                if dtype is None or np.dtype(dtype).itemsize != size:
+                    continue
+                wanted.append((field, offset, definition.byte_order + dtype, invalid))
+            if not wanted:
+                continue
+
+            size = definition.size
+            payload = b"".join([view[o:o + size] for o in offsets])
+            rows = np.frombuffer(
+                payload,
+                dtype=np.dtype({
+                    "names": [f.name for f, _, _, _ in wanted],
+                    "formats": [fmt for _, _, fmt, _ in wanted],
+                    "offsets": [off for _, off, _, _ in wanted],
+                    "itemsize": size,
+                }),
+            )
+            seq = np.frombuffer(seqs, dtype=np.int64)
+
+            for field, _, _, invalid in wanted:
+                raw = rows[field.name]
+                values = raw.astype(np.float64)
+                if invalid is not None:
+                    values[raw == invalid] = np.nan
+                if field.scale:
+                    values /= field.scale
+                if field.offset:
+                    values -= field.offset
+
+                column = columns.get(field.name)
+                if column is None:
+                    column = columns[field.name] = np.full(self.count, np.nan)
+                column[seq] = values
+
+        return columns
+
+
+class FitScan:
+    """Result of `scan_fit`."""
+
+    def __init__(self):
+        self.bulk: dict[int, BulkMessages] = {}
+        self.messages: dict[int, list[dict]] = {}
+
+
+def _decode_message(buf, pos: int, definition: _Definition) -> dict:
+    """Decode a single message into a dict of profile field name -> value."""
+    mesg_type = profile.MESSAGE_TYPES.get(definition.global_num)
+    profile_fields = mesg_type.fields if mesg_type else {}
+    values: dict = {}
+
+    for num, offset, size, base in definition.fields:
+        field = profile_fields.get(num)
+        if field is None:
+            continue
+        start = pos + offset
+
+        if base == _BASE_TYPE_STRING:
+            text = bytes(buf[start:start + size]).split(b"\x00", 1)[0]
+            if text:
+                values[field.name] = text.decode("utf-8", errors="replace")
+            continue
+
+        dtype, invalid = _BASE_TYPES.get(base, (None, None))
+        if dtype is None or np.dtype(dtype).itemsize != size:
+            continue
+        raw = struct.unpack_from(definition.byte_order + np.dtype(dtype).char, buf, start)[0]
+        if raw == invalid or raw != raw:  # raw != raw catches float NaN
+            continue
+
+        field_type = field.type
+        if field_type.name in ("date_time", "local_date_time"):
+            values[field.name] = FIT_EPOCH + timedelta(seconds=raw)
+        elif field_type.enum:
+            values[field.name] = field_type.enum.get(raw, raw)
+        else:
+            value = raw
+            if field.scale:
+                value = value / field.scale
+            if field.offset:
+                value = value - field.offset
+            values[field.name] = value
+
+    return values
+
+
+def scan_fit(
+    buf,
+    bulk: frozenset[int] = frozenset(),
+    decode: frozenset[int] = frozenset(),
+) -> FitScan:
+    """
+    Scan a FIT file held in ``buf`` (bytes, memoryview or mmap).
+
+    Offsets of messages whose global number is in ``bulk`` are collected for
+    `BulkMessages.decode`; messages in ``decode`` are decoded immediately.
+    Chained FIT files are scanned one after another.
+    """
+    result = FitScan()
+    for num in bulk:
+        result.bulk[num] = BulkMessages(num)
+    for num in decode:
+        result.messages[num] = []
+
+    length = len(buf)
+    pos = 0
+    while pos + 12 <= length:
+        header_size = buf[pos]
+        if header_size < 12 or bytes(buf[pos + 8:pos + 12]) != b".FIT":
+            if pos == 0:
+                raise FitFormatError("Not a FIT file")
+            break
+        data_size = struct.unpack_from("<I", buf, pos + 4)[0]
+        pos += header_size
+        end = pos + data_size if data_size else length - 2
+        if end > length:
+            end = length
+
+        definitions: dict[int, _Definition] = {}
+        last_timestamp = 0
+
+        while pos < end:
+            header = buf[pos]
+            pos += 1
+
+            if header & 0x80:
+                # Compressed timestamp header: 5-bit offset from the last timestamp
+                definition = definitions.get((header >> 5) & 0x03)
+                time_offset = header & 0x1F
+                timestamp = (last_timestamp & ~0x1F) + time_offset
+                if time_offset < (last_timestamp & 0x1F):
+                    timestamp += 0x20
+                last_timestamp = timestamp
+            elif header & 0x40:
+                # Definition message
+                if pos + 5 > end:
+                    break
+                byte_order = ">" if buf[pos + 1] == 1 else "<"
+                global_num = struct.unpack_from(byte_order + "H", buf, pos + 2)[0]
+                num_fields = buf[pos + 4]
+                pos += 5
+
+                fields = []
+                size = 0
+                for _ in range(num_fields):
+                    field_size = buf[pos + 1]
+                    fields.append((buf[pos], size, field_size, buf[pos + 2] & 0x1F))
+                    size += field_size
+                    pos += 3
+                if header & 0x20:
+                    # Developer fields only contribute to the payload size
+                    num_dev_fields = buf[pos]
+                    pos += 1
+                    for _ in range(num_dev_fields):
+                        size += buf[pos + 1]
+                        pos += 3
+
+                definitions[header & 0x0F] = _Definition(global_num, byte_order, fields, size)
+                continue
+            else:
+                definition = definitions.get(header & 0x0F)
+                timestamp = -1
+                if definition is not None and definition.timestamp is not None:
+                    ts_struct, ts_offset = definition.timestamp
+                    value = ts_struct.unpack_from(buf, pos + ts_offset)[0]
+                    if value != 0xFFFFFFFF:
+                        timestamp = last_timestamp = value
+
+            if definition is None:
+                raise FitFormatError(f"Data message without definition at byte {pos - 1}")
+            if pos + definition.size > end:
+                break
+
+            global_num = definition.global_num
+            if global_num in result.bulk:
+                result.bulk[global_num]._add(definition, pos, timestamp)
+            elif global_num in result.messages:
+                result.messages[global_num].append(_decode_message(buf, pos, definition))
+            pos += definition.size
+
+        # Skip the 2-byte file CRC
+        pos = end + 2
+
+    return result
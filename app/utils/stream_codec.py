@@ -0,0 +1,138 @@
+"""
+Columnar encoding for activity time-series.
+
+Every channel of an activity is packed into a single byte string instead of
+one sub-document per sample:
+
+- ``time``: integer seconds offsets from the activity start, delta/zigzag encoded
+- heart rate, power, cadence: delta/zigzag encoded integers
+- latitude/longitude: delta/zigzag encoded semicircles (lossless for FIT data)
+- speed, distance, altitude, temperature: float32
+
+Integer payloads use the smallest unsigned dtype that fits the zigzag deltas,
+so a steady 1 Hz heart rate channel costs about one byte per sample. Missing
+samples are tracked by an optional packed validity bitmap.
+
+Decoded arrays are float64 with NaN for missing samples, except ``time``
+which is int64.
+"""
+
+import numpy as np
+
+TIME_CHANNEL = "time"
+INT_CHANNELS = ("heart_rate", "power", "cadence")
+FLOAT_CHANNELS = ("speed", "distance", "altitude", "temperature")
+POSITION_CHANNELS = ("latitude", "longitude")
+VALUE_CHANNELS = INT_CHANNELS + FLOAT_CHANNELS + POSITION_CHANNELS
+
+ENCODING_DELTA = "delta"
+ENCODING_FLOAT32 = "float32"
+
+SEMICIRCLES_PER_DEGREE = 2**31 / 180.0
+
+_UNSIGNED_DTYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+def _zigzag_deltas(values: np.ndarray) -> np.ndarray:
+    """Delta-encode an int64 array and zigzag-map the deltas to unsigned ints."""
+    deltas = np.diff(values, prepend=np.int64(0))
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    zigzag = zigzag.view(np.uint64)
+
+    top = int(zigzag.max()) if zigzag.size else 0
+    for dtype in _UNSIGNED_DTYPES:
+        if top <= np.iinfo(dtype).max:
+            return zigzag.astype(dtype)
+    return zigzag
+
+
+def _unzigzag_deltas(packed: np.ndarray) -> np.ndarray:
+    """Inverse of `_zigzag_deltas`."""
+    zigzag = packed.astype(np.uint64)
+    deltas = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def _pack_mask(valid: np.ndarray) -> bytes | None:
+    if valid.all():
+        return None
+    return np.packbits(valid).tobytes()
+
+
+def _unpack_mask(mask: bytes | None, count: int) -> np.ndarray | None:
+    if mask is None:
+        return None
+    return np.unpackbits(np.frombuffer(mask, dtype=np.uint8), count=count).astype(bool)
+
+
+def encode_channel(name: str, values: np.ndarray) -> dict | None:
+    """
+    Encode one channel.
+
+    Returns a dict with ``encoding``, ``dtype``, ``data`` and ``mask`` keys,
+    or None if the channel has no valid samples.
+    """
+    if name == TIME_CHANNEL:
+        offsets = np.asarray(values, dtype=np.int64)
+        packed = _zigzag_deltas(offsets)
+        return {
+            "encoding": ENCODING_DELTA,
+            "dtype": packed.dtype.str,
+            "data": packed.tobytes(),
+            "mask": None,
+        }
+
+    arr = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(arr)
+    if not valid.any():
+        return None
+
+    if name in FLOAT_CHANNELS:
+        return {
+            "encoding": ENCODING_FLOAT32,
+            "dtype": "<f4",
+            "data": arr.astype("<f4").tobytes(),
+            "mask": None,
+        }
+
+    present = arr[valid]
+    if name in POSITION_CHANNELS:
+        present = present * SEMICIRCLES_PER_DEGREE
+    packed = _zigzag_deltas(np.rint(present).astype(np.int64))
+    return {
+        "encoding": ENCODING_DELTA,
+        "dtype": packed.dtype.str,
+        "data": packed.tobytes(),
+        "mask": _pack_mask(valid),
+    }
+
+
+def decode_channel(
+    name: str,
+    encoding: str,
+    dtype: str,
+    data: bytes,
+    mask: bytes | None,
+    count: int,
+) -> np.ndarray:
+    """Decode one channel produced by `encode_channel` into a NumPy array."""
+    payload = np.frombuffer(data, dtype=np.dtype(dtype))
+
+    if encoding == ENCODING_FLOAT32:
+        return payload.astype(np.float64)
+
+    values = _unzigzag_deltas(payload)
+    if name == TIME_CHANNEL:
+        return values
+
+    present = values.astype(np.float64)
+    if name in POSITION_CHANNELS:
+        present /= SEMICIRCLES_PER_DEGREE
+
+    valid = _unpack_mask(mask, count)
+    if valid is None:
+        return present
+
+    out = np.full(count, np.nan)
+    out[valid] = present
+    return out
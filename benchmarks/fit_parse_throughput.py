@@ -0,0 +1,89 @@
+"""
+Compare record decoding throughput of the columnar FIT parser against the
+previous per-frame RecordPoint path.
+
+Usage:
+    python -m benchmarks.fit_parse_throughput path/to/file.fit [more.fit ...]
+"""
+
+import argparse
+import io
+import time
+
+import fitdecode
+
+from app.models.activity import RecordPoint
+from app.services.fit_parser import decode_fit_file
+
+
+def _legacy_decode(file_bytes: bytes) -> int:
+    """The pre-columnar path: get_value lookups and a RecordPoint per frame."""
+    records = []
+    with fitdecode.FitReader(io.BytesIO(file_bytes)) as fit:
+        for frame in fit:
+            if not isinstance(frame, fitdecode.FitDataMessage) or frame.name != "record":
+                continue
+
+            def safe_get(field: str):
+                try:
+                    return frame.get_value(field)
+                except KeyError:
+                    return None
+
+            timestamp = safe_get("timestamp")
+            if not timestamp:
+                continue
+            lat = safe_get("position_lat")
+            lon = safe_get("position_long")
+            records.append(
+                RecordPoint(
+                    timestamp=timestamp,
+                    heart_rate=safe_get("heart_rate"),
+                    power=safe_get("power"),
+                    cadence=safe_get("cadence"),
+                    speed=safe_get("enhanced_speed") or safe_get("speed"),
+                    distance=safe_get("distance"),
+                    altitude=safe_get("enhanced_altitude") or safe_get("altitude"),
+                    latitude=None if lat is None else lat * (180.0 / 2**31),
+                    longitude=None if lon is None else lon * (180.0 / 2**31),
+                    temperature=safe_get("temperature"),
+                )
+            )
+    return len(records)
+
+
+def _columnar_decode(file_bytes: bytes) -> int:
+    return decode_fit_file(file_bytes).sample_count
+
+
+def _best_of(fn, file_bytes: bytes, repeat: int) -> tuple[int, float]:
+    best = float("inf")
+    samples = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        samples = fn(file_bytes)
+        best = min(best, time.perf_counter() - started)
+    return samples, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':<40} {'samples':>8} {'legacy/s':>12} {'columnar/s':>12} {'speedup':>8}")
+    for path in args.files:
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+
+        samples, legacy_s = _best_of(_legacy_decode, file_bytes, args.repeat)
+        _, columnar_s = _best_of(_columnar_decode, file_bytes, args.repeat)
+        print(
+            f"{path[-40:]:<40} {samples:>8} {samples / legacy_s:>12,.0f} "
+            f"{samples / columnar_s:>12,.0f} {legacy_s / columnar_s:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
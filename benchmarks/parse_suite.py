@@ -0,0 +1,200 @@
+"""
+Throughput benchmark for the FIT ingest path on synthetic activity files.
+
+For each scenario in `benchmarks.synthetic_fit` this reports samples/second,
+peak traced memory and the time spent per stage:
+
+- decode: scanning the file and bulk-decoding record/lap/session messages;
+- clean: `clean_channels` (timed by wrapping the parser's reference to it);
+- build: `build_activity`, i.e. stream encoding into the Activity document.
+
+Stage times are the best of ``--repeat`` runs. Results can be written as JSON
+and compared against a previous run, e.g. one saved on the parent commit.
+
+Building an Activity requires Beanie to be initialised, so the suite connects
+to the configured MongoDB (nothing is written). Use ``--skip-build`` to
+measure decode and clean only.
+
+Usage:
+    python -m benchmarks.parse_suite [--scenario 1h_1hz ...] [--json out.json]
+    python -m benchmarks.parse_suite --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.services import fit_parser
+from benchmarks.synthetic_fit import SCENARIOS, generate_activity
+
+BENCHMARK_USER_ID = "benchmark"
+
+
+@contextmanager
+def _timed_cleaning(timings: list[float]):
+    """Record the duration of every `clean_channels` call made by the parser."""
+    clean_channels = fit_parser.clean_channels
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return clean_channels(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - started)
+
+    fit_parser.clean_channels = timed
+    try:
+        yield
+    finally:
+        fit_parser.clean_channels = clean_channels
+
+
+def _run_once(file_bytes: bytes, build: bool) -> tuple[int, dict[str, float]]:
+    """Decode (and build) one file, returning the sample count and stage times."""
+    clean_timings: list[float] = []
+    with _timed_cleaning(clean_timings):
+        started = time.perf_counter()
+        result = fit_parser.decode_fit_file(file_bytes)
+        decoded = time.perf_counter()
+    if build:
+        fit_parser.build_activity(result, BENCHMARK_USER_ID)
+    built = time.perf_counter()
+
+    clean_s = sum(clean_timings)
+    return result.sample_count, {
+        "decode_s": decoded - started - clean_s,
+        "clean_s": clean_s,
+        "build_s": built - decoded,
+    }
+
+
+def _peak_memory(file_bytes: bytes, build: bool) -> int:
+    """Peak bytes allocated while ingesting one file (the input itself excluded)."""
+    tracemalloc.start()
+    try:
+        _run_once(file_bytes, build)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_scenario(scenario: str, repeat: int, build: bool, seed: int = 0) -> dict:
+    """Benchmark one scenario and return its result row."""
+    file_bytes = generate_activity(scenario, seed)
+
+    best: dict[str, float] = {}
+    samples = 0
+    for _ in range(repeat):
+        samples, stages = _run_once(file_bytes, build)
+        for stage, seconds in stages.items():
+            best[stage] = min(best.get(stage, seconds), seconds)
+    total_s = sum(best.values())
+
+    return {
+        "scenario": scenario,
+        "file_bytes": len(file_bytes),
+        "samples": samples,
+        **{stage: round(seconds, 6) for stage, seconds in best.items()},
+        "total_s": round(total_s, 6),
+        "samples_per_s": round(samples / total_s) if total_s else None,
+        "peak_memory_bytes": _peak_memory(file_bytes, build),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _init_models() -> None:
+    from app.core.database import init_db
+
+    await init_db()
+
+
+def _print_results(results: list[dict]) -> None:
+    print(
+        f"{'scenario':<12} {'samples':>8} {'samples/s':>12} {'decode ms':>10} "
+        f"{'clean ms':>9} {'build ms':>9} {'peak MB':>8}"
+    )
+    for row in results:
+        print(
+            f"{row['scenario']:<12} {row['samples']:>8} {row['samples_per_s'] or 0:>12,} "
+            f"{row['decode_s'] * 1000:>10.1f} {row['clean_s'] * 1000:>9.1f} "
+            f"{row['build_s'] * 1000:>9.1f} {row['peak_memory_bytes'] / 2**20:>8.1f}"
+        )
+
+
+def _print_comparison(results: list[dict], baseline: dict) -> None:
+    """Print per-scenario ratios against a previous JSON report (>1 means faster / smaller now)."""
+    previous = {row["scenario"]: row for row in baseline.get("results", [])}
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"{'scenario':<12} {'throughput':>11} {'decode':>8} {'clean':>8} {'build':>8} {'memory':>8}")
+    for row in results:
+        old = previous.get(row["scenario"])
+        if old is None:
+            continue
+
+        def ratio(key: str) -> str:
+            return f"{old[key] / row[key]:.2f}x" if row[key] and old.get(key) else "-"
+
+        throughput = (
+            f"{row['samples_per_s'] / old['samples_per_s']:.2f}x"
+            if row["samples_per_s"] and old.get("samples_per_s") else "-"
+        )
+        print(
+            f"{row['scenario']:<12} {throughput:>11} {ratio('decode_s'):>8} {ratio('clean_s'):>8} "
+            f"{ratio('build_s'):>8} {ratio('peak_memory_bytes'):>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-build", action="store_true")
+    parser.add_argument("--json", help="write machine-readable results to this path")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    args = parser.parse_args()
+
+    build = not args.skip_build
+    if build:
+        asyncio.run(_init_models())
+
+    results = [
+        bench_scenario(scenario, args.repeat, build, args.seed)
+        for scenario in args.scenario or SCENARIOS
+    ]
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "build": build,
+        "results": results,
+    }
+
+    _print_results(results)
+    if args.compare:
+        with open(args.compare) as f:
+            _print_comparison(results, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Deterministic synthetic FIT activity files for the parser benchmarks.
+
+Signals are generated with a seeded NumPy generator and written with
+`FITEncoder`, so a scenario always produces the same bytes. Each file carries
+a few artifacts (power spikes, heart-rate dropouts, GPS jumps) so the cleaning
+stage has real work to do.
+
+Usage:
+    python -m benchmarks.synthetic_fit out_dir [scenario ...]
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+import numpy as np
+
+from app.services.fit_generator import FILE_TYPE_ACTIVITY, FITEncoder, _sport_to_fit_sport
+
+START_TIME = datetime(2024, 6, 1, 6, 0, 0, tzinfo=timezone.utc)
+START_POSITION = (45.07, 7.68)
+EARTH_RADIUS_M = 6371000.0
+
+# FIT sub_sport enum values used by the scenarios
+SUB_SPORTS = {"generic": 0, "trail": 3, "indoor_cycling": 6, "road": 7, "open_water": 18}
+
+
+class Leg(NamedTuple):
+    """One sport segment of a synthetic file (one session)."""
+    sport: str
+    sub_sport: str
+    seconds: int
+    gps: bool
+    lap_s: int
+
+
+SCENARIOS: dict[str, list[Leg]] = {
+    "1h_1hz": [Leg("cycling", "indoor_cycling", 3600, False, 600)],
+    "10h_gps": [Leg("cycling", "road", 10 * 3600, True, 3600)],
+    "24h_ultra": [Leg("running", "trail", 24 * 3600, True, 3600)],
+    "multisport": [
+        Leg("swimming", "open_water", 1800, True, 900),
+        Leg("cycling", "road", 5 * 3600, True, 1800),
+        Leg("running", "road", 3 * 3600, True, 1800),
+    ],
+}
+
+# Typical speed (m/s), cadence and power per sport; None if the sport has no such sensor
+_SPORT_PROFILES = {
+    "cycling": (9.0, 88.0, 190.0),
+    "running": (3.2, 84.0, None),
+    "swimming": (1.2, None, None),
+}
+
+
+def _smooth_noise(rng: np.random.Generator, n: int, window: int) -> np.ndarray:
+    """Unit-scale noise low-pass filtered over ``window`` samples."""
+    noise = rng.standard_normal(n + window)
+    smoothed = np.convolve(noise, np.ones(window) / window, mode="valid")[:n]
+    return smoothed / max(smoothed.std(), 1e-9)
+
+
+def _leg_channels(rng: np.random.Generator, leg: Leg, distance_start: float) -> dict[str, np.ndarray]:
+    """Generate 1 Hz channels for one leg; NaN marks a missing sample."""
+    n = leg.seconds
+    t = np.arange(n, dtype=np.float64)
+    base_speed, base_cadence, base_power = _SPORT_PROFILES[leg.sport]
+    effort = _smooth_noise(rng, n, 120)
+
+    speed = np.clip(base_speed * (1 + 0.08 * effort + 0.02 * rng.standard_normal(n)), 0.0, None)
+    channels = {
+        "speed": speed,
+        "distance": distance_start + np.cumsum(speed),
+        "heart_rate": np.clip(140 + 12 * effort + 2 * rng.standard_normal(n), 60, 200).round(),
+        "temperature": (18 + 6 * np.sin(2 * np.pi * t / 86400) + 0.3 * rng.standard_normal(n)).round(),
+        "cadence": np.full(n, np.nan),
+        "power": np.full(n, np.nan),
+        "altitude": 250 + 80 * np.sin(2 * np.pi * t / 5400) + 5 * _smooth_noise(rng, n, 60),
+    }
+    if base_cadence is not None:
+        channels["cadence"] = np.clip(base_cadence + 4 * effort + rng.standard_normal(n), 0, 250).round()
+    if base_power is not None:
+        power = base_power * (1 + 0.2 * effort) + 25 * rng.standard_normal(n)
+        power = np.clip(power, 0, 1500).round()
+        spikes = rng.choice(n, size=max(n // 2000, 1), replace=False)
+        power[spikes] = rng.integers(2000, 3000, size=len(spikes))
+        channels["power"] = power
+
+    # Heart-rate strap dropouts: short runs of zeros
+    for start in rng.choice(n - 10, size=max(n // 5000, 1), replace=False):
+        channels["heart_rate"][start:start + int(rng.integers(3, 10))] = 0
+
+    if leg.gps:
+        heading = np.cumsum(0.01 * rng.standard_normal(n))
+        north = np.cumsum(speed * np.cos(heading))
+        east = np.cumsum(speed * np.sin(heading))
+        lat0, lon0 = START_POSITION
+        lat = lat0 + np.degrees(north / EARTH_RADIUS_M)
+        lon = lon0 + np.degrees(east / (EARTH_RADIUS_M * np.cos(np.radians(lat0))))
+        # Multipath jumps: a few samples ~1 km off track
+        for start in rng.choice(n - 5, size=max(n // 10000, 1), replace=False):
+            lat[start:start + 3] += 0.01
+        channels["latitude"] = lat
+        channels["longitude"] = lon
+    return channels
+
+
+def _optional(value: float) -> float | None:
+    return None if value != value else value
+
+
+def _summary(channels: dict[str, np.ndarray], start: int, end: int) -> dict:
+    """Lap/session summary fields for samples ``start:end``."""
+    def stat(name: str, fn) -> float | None:
+        values = channels[name][start:end]
+        values = values[~np.isnan(values) & (values > 0)]
+        return float(fn(values)) if len(values) else None
+
+    return {
+        "total_timer_time": float(end - start),
+        "total_distance": float(channels["speed"][start:end].sum()),
+        "avg_heart_rate": stat("heart_rate", np.mean),
+        "max_heart_rate": stat("heart_rate", np.max),
+        "avg_power": stat("power", np.mean),
+        "max_power": stat("power", np.max),
+        "avg_cadence": stat("cadence", np.mean),
+        "avg_speed": stat("speed", np.mean),
+    }
+
+
+def generate_activity(scenario: str, seed: int = 0) -> bytes:
+    """Encode the named scenario as a FIT activity file."""
+    legs = SCENARIOS[scenario]
+    rng = np.random.default_rng(seed)
+
+    encoder = FITEncoder()
+    encoder._write_header()
+    encoder._write_file_id(_sport_to_fit_sport(legs[0].sport), START_TIME, FILE_TYPE_ACTIVITY)
+
+    leg_start = START_TIME
+    distance = 0.0
+    for leg in legs:
+        sport = _sport_to_fit_sport(leg.sport)
+        channels = _leg_channels(rng, leg, distance)
+        distance = float(channels["distance"][-1])
+
+        names = [name for name in ("heart_rate", "power", "cadence", "speed", "distance",
+                                   "altitude", "latitude", "longitude", "temperature")
+                 if name in channels]
+        columns = [channels[name].tolist() for name in names]
+        for lap_start in range(0, leg.seconds, leg.lap_s):
+            lap_end = min(lap_start + leg.lap_s, leg.seconds)
+            for i in range(lap_start, lap_end):
+                encoder._write_record(
+                    leg_start + timedelta(seconds=i),
+                    **{name: _optional(column[i]) for name, column in zip(names, columns)},
+                )
+            encoder._write_lap(
+                start_time=leg_start + timedelta(seconds=lap_start),
+                end_time=leg_start + timedelta(seconds=lap_end),
+                sport=sport,
+                **_summary(channels, lap_start, lap_end),
+            )
+
+        altitude_steps = np.diff(channels["altitude"])
+        leg_end = leg_start + timedelta(seconds=leg.seconds)
+        encoder._write_session(
+            start_time=leg_start,
+            end_time=leg_end,
+            sport=sport,
+            sub_sport=SUB_SPORTS[leg.sub_sport],
+            max_speed=float(channels["speed"].max()),
+            total_ascent=float(altitude_steps[altitude_steps > 0].sum()),
+            total_descent=float(-altitude_steps[altitude_steps < 0].sum()),
+            **_summary(channels, 0, leg.seconds),
+        )
+        leg_start = leg_end
+
+    return encoder.finalize()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for scenario in args.scenarios:
+        path = os.path.join(args.out_dir, f"{scenario}.fit")
+        with open(path, "wb") as f:
+            f.write(generate_activity(scenario, args.seed))
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
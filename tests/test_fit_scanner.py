@@ -0,0 +1,167 @@
+"""Round-trip tests of the low-level FIT scanner against the synthetic encoder and fitdecode."""
+
+import io
+import struct
+from datetime import timedelta
+
+import fitdecode
+import numpy as np
+import pytest
+
+from app.services.fit_generator import FITEncoder
+from app.utils.fit_scanner import (
+    FIT_EPOCH,
+    MESG_LAP,
+    MESG_RECORD,
+    MESG_SESSION,
+    FitFormatError,
+    scan_fit,
+)
+from benchmarks.synthetic_fit import START_TIME, generate_activity
+
+# Base type bytes as written in definition messages
+UINT8 = 0x02
+UINT16 = 0x84
+UINT32 = 0x86
+
+RECORD_FIELDS = ("heart_rate", "power", "cadence", "speed", "distance", "altitude", "temperature")
+
+
+def _fit_file(messages: bytes) -> bytes:
+    """Wrap encoded messages in a FIT header and trailing CRC."""
+    header = struct.pack("<BBHI4s", 12, 0x20, 2132, len(messages), b".FIT")
+    body = header + messages
+    return body + struct.pack("<H", FITEncoder()._calculate_crc(body))
+
+
+def _definition(
+    local: int,
+    global_num: int,
+    fields: list[tuple[int, int, int]],
+    big_endian: bool = False,
+    dev_fields: list[tuple[int, int, int]] = (),
+) -> bytes:
+    header = 0x40 | local | (0x20 if dev_fields else 0)
+    order = ">" if big_endian else "<"
+    out = struct.pack("<BxB", header, 1 if big_endian else 0)
+    out += struct.pack(order + "HB", global_num, len(fields))
+    out += b"".join(struct.pack("<BBB", *field) for field in fields)
+    if dev_fields:
+        out += struct.pack("<B", len(dev_fields))
+        out += b"".join(struct.pack("<BBB", *field) for field in dev_fields)
+    return out
+
+
+def _reference_records(data: bytes) -> list[dict]:
+    """Record messages as decoded by fitdecode."""
+    records = []
+    # Only parsing is compared here; the encoder's CRC is not what is under test
+    with fitdecode.FitReader(io.BytesIO(data), check_crc=fitdecode.CrcCheck.DISABLED) as fit:
+        for frame in fit:
+            if isinstance(frame, fitdecode.FitDataMessage) and frame.name == "record":
+                records.append({
+                    name: frame.get_value(name, fallback=None)
+                    for name in ("timestamp",) + RECORD_FIELDS
+                })
+    return records
+
+
+@pytest.fixture(scope="module")
+def synthetic_1h() -> bytes:
+    return generate_activity("1h_1hz")
+
+
+def test_synthetic_records_match_fitdecode(synthetic_1h):
+    scan = scan_fit(synthetic_1h, bulk=frozenset({MESG_RECORD}))
+    records = scan.bulk[MESG_RECORD]
+    reference = _reference_records(synthetic_1h)
+    assert records.count == len(reference) == 3600
+
+    timestamps = np.frombuffer(records.timestamps, dtype=np.int64)
+    expected = [(r["timestamp"] - FIT_EPOCH).total_seconds() for r in reference]
+    np.testing.assert_array_equal(timestamps, expected)
+
+    columns = records.decode(synthetic_1h, names=set(RECORD_FIELDS))
+    for name in RECORD_FIELDS:
+        expected = np.array([np.nan if r[name] is None else r[name] for r in reference], dtype=np.float64)
+        if np.isnan(expected).all():
+            assert name not in columns or np.isnan(columns[name]).all()
+            continue
+        np.testing.assert_allclose(columns[name], expected, rtol=1e-6, equal_nan=True, err_msg=name)
+
+
+def test_synthetic_summaries(synthetic_1h):
+    scan = scan_fit(synthetic_1h, decode=frozenset({MESG_SESSION, MESG_LAP}))
+    sessions = scan.messages[MESG_SESSION]
+    assert len(sessions) == 1
+    assert sessions[0]["start_time"] == START_TIME
+    assert sessions[0]["sport"] == "cycling"
+    assert len(scan.messages[MESG_LAP]) == 6
+
+
+def test_multisport_definitions_switch_with_position_fields():
+    data = generate_activity("multisport")
+    scan = scan_fit(data, bulk=frozenset({MESG_RECORD}), decode=frozenset({MESG_SESSION}))
+    records = scan.bulk[MESG_RECORD]
+    assert records.count == (1800 + 5 * 3600 + 3 * 3600)
+    assert [s["sport"] for s in scan.messages[MESG_SESSION]] == ["swimming", "cycling", "running"]
+
+    columns = records.decode(data, names={"heart_rate", "position_lat"})
+    assert not np.isnan(columns["heart_rate"]).all()
+    assert not np.isnan(columns["position_lat"]).all()
+
+
+def test_compressed_timestamps():
+    messages = _definition(0, MESG_RECORD, [(253, 4, UINT32), (3, 1, UINT8)])
+    messages += _definition(1, MESG_RECORD, [(3, 1, UINT8)])
+    messages += struct.pack("<BIB", 0x00, 1000, 100)  # 1000 & 0x1F == 8
+    for offset, hr in ((10, 101), (31, 102), (2, 103)):  # the last one rolls over
+        messages += struct.pack("<BB", 0x80 | (1 << 5) | offset, hr)
+    data = _fit_file(messages)
+
+    records = scan_fit(data, bulk=frozenset({MESG_RECORD})).bulk[MESG_RECORD]
+    assert list(records.timestamps) == [1000, 1002, 1023, 1026]
+    np.testing.assert_array_equal(records.decode(data)["heart_rate"], [100, 101, 102, 103])
+
+
+def test_developer_fields_are_skipped():
+    fields = [(253, 4, UINT32), (3, 1, UINT8), (7, 2, UINT16)]
+    messages = _definition(0, MESG_RECORD, fields, dev_fields=[(0, 4, 0), (1, 1, 0)])
+    for i in range(3):
+        messages += struct.pack("<BIBH", 0x00, 2000 + i, 120 + i, 250 + i) + b"\xAA\xBB\xCC\xDD\xEE"
+    # A plain message after them must still line up
+    messages += _definition(1, MESG_RECORD, fields)
+    messages += struct.pack("<BIBH", 0x01, 2003, 130, 260)
+    data = _fit_file(messages)
+
+    records = scan_fit(data, bulk=frozenset({MESG_RECORD})).bulk[MESG_RECORD]
+    assert list(records.timestamps) == [2000, 2001, 2002, 2003]
+    columns = records.decode(data, names={"heart_rate", "power"})
+    np.testing.assert_array_equal(columns["heart_rate"], [120, 121, 122, 130])
+    np.testing.assert_array_equal(columns["power"], [250, 251, 252, 260])
+
+
+def test_big_endian_definitions():
+    messages = _definition(0, MESG_RECORD, [(253, 4, UINT32), (7, 2, UINT16), (5, 4, UINT32)], big_endian=True)
+    messages += struct.pack(">BIHI", 0x00, 3000, 300, 123456)
+    messages += struct.pack(">BIHI", 0x00, 3001, 0xFFFF, 123789)  # invalid power
+    # Session: start_time, total_timer_time (scale 1000)
+    messages += _definition(1, MESG_SESSION, [(2, 4, UINT32), (8, 4, UINT32)], big_endian=True)
+    messages += struct.pack(">BII", 0x01, 3000, 3_600_000)
+    data = _fit_file(messages)
+
+    scan = scan_fit(data, bulk=frozenset({MESG_RECORD}), decode=frozenset({MESG_SESSION}))
+    records = scan.bulk[MESG_RECORD]
+    assert list(records.timestamps) == [3000, 3001]
+    columns = records.decode(data, names={"power", "distance"})
+    np.testing.assert_array_equal(columns["power"], [300, np.nan])
+    np.testing.assert_allclose(columns["distance"], [1234.56, 1237.89])
+
+    session = scan.messages[MESG_SESSION][0]
+    assert session["start_time"] == FIT_EPOCH + timedelta(seconds=3000)
+    assert session["total_timer_time"] == pytest.approx(3600.0)
+
+
+def test_not_a_fit_file():
+    with pytest.raises(FitFormatError):
+        scan_fit(b"\x0e" + b"\x00" * 20)
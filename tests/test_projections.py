@@ -0,0 +1,211 @@
+"""Analytics and listing projections must never fetch an activity's time-series."""
+
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+import pytest_asyncio
+from beanie import init_beanie
+from beanie.odm.utils.projection import get_projection
+from mongomock_motor import AsyncMongoMockClient
+
+from app.api.routes.activities import list_activities
+from app.models.activity import Activity, ActivityLoadView, ActivitySummaryView
+from app.models.daily_load import DailyLoad, LoadCheckpoint, LoadLock
+from app.models.reprocess_job import ReprocessJob
+from app.models.snapshot_cache import CachedSnapshot
+from app.models.user import ThresholdValues, User
+from app.services import context_builder, metrics, power_curve, reprocessing
+from app.services.duplicate_detector import _StoredView, find_duplicates_batch
+from app.services.fingerprint import _FingerprintView, activity_fingerprint, find_near_duplicates_batch
+from app.services.metrics import METRICS_VERSION, score_activity
+
+HEAVY_FIELDS = {"records", "streams", "laps"}
+
+VIEWS = [ActivityLoadView, ActivitySummaryView, _StoredView, _FingerprintView]
+
+
+@pytest.mark.parametrize("view", VIEWS, ids=lambda view: view.__name__)
+def test_view_fields_exclude_time_series(view):
+    assert HEAVY_FIELDS.isdisjoint(view.model_fields)
+
+
+@pytest.mark.parametrize("view", VIEWS, ids=lambda view: view.__name__)
+def test_projection_excludes_time_series(view):
+    projection = get_projection(view)
+    assert projection, "views must project explicit fields, never the whole document"
+    assert not any(key.split(".")[0] in HEAVY_FIELDS for key in projection)
+
+
+class _EmptyCursor:
+    async def to_list(self, length=None):
+        return []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+class _RecordingCollection:
+    """
+    The activities collection, recording the projection of every read.
+
+    Aggregations are recorded but not run: the mock does not implement
+    ``$dateTrunc``, and their output is checked from the pipeline.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.projections: list = []
+        self.pipelines: list[list[dict]] = []
+
+    def find(self, *args, **kwargs):
+        self.projections.append(kwargs.get("projection", args[1] if len(args) > 1 else None))
+        return self._collection.find(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        self.projections.append(kwargs.get("projection", args[1] if len(args) > 1 else None))
+        return self._collection.find_one(*args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self.pipelines.append(pipeline)
+        return _EmptyCursor()
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+def _assert_no_time_series(reads: _RecordingCollection) -> None:
+    assert reads.projections or reads.pipelines, "the path did not read activities"
+    for projection in reads.projections:
+        assert projection, "activities were read without a projection"
+        if all(value in (0, False) for value in projection.values()):
+            assert HEAVY_FIELDS <= set(projection), projection
+        else:
+            assert not any(key.split(".")[0] in HEAVY_FIELDS for key in projection), projection
+    for pipeline in reads.pipelines:
+        # Only grouped totals leave the server, and they never sum time-series
+        assert "$group" in pipeline[-1], pipeline
+        text = repr(pipeline)
+        assert not any(f"${field}" in text for field in HEAVY_FIELDS), pipeline
+
+
+def _ago(days: int) -> datetime:
+    """Start time of a one-hour activity finished an hour before now, ``days`` ago."""
+    return datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=days, hours=2)
+
+
+def _activity(user_id: str, start: datetime, hours: float = 1.0) -> Activity:
+    seconds = int(hours * 3600)
+    time_offsets = np.arange(seconds, dtype=np.int64)
+    rng = np.random.default_rng(seconds)
+    activity = Activity(
+        user_id=user_id,
+        sport="cycling",
+        start_time=start,
+        end_time=start + timedelta(seconds=seconds),
+        total_timer_time=float(seconds),
+        total_distance=seconds * 8.0,
+        file_hash=f"hash-{start.isoformat()}",
+    )
+    activity.set_channels({
+        "time": time_offsets,
+        "heart_rate": 140 + rng.normal(0, 5, seconds).round(),
+        "power": 200 + rng.normal(0, 30, seconds).round(),
+    })
+    return activity
+
+
+@pytest_asyncio.fixture
+async def user():
+    client = AsyncMongoMockClient()
+    await init_beanie(
+        database=client["polarize-test"],
+        document_models=[User, Activity, ReprocessJob, DailyLoad, LoadCheckpoint, LoadLock, CachedSnapshot],
+    )
+    user = User(
+        email="rower@example.com",
+        name="Rower",
+        hashed_password="x",
+        thresholds=ThresholdValues(threshold_hr=165, threshold_power=250),
+    )
+    await user.insert()
+
+    activities = [_activity(str(user.id), _ago(days=days)) for days in (0, 1, 3, 10)]
+    for activity in activities:
+        score_activity(activity, user)
+    await Activity.insert_many(activities)
+    return user
+
+
+@pytest.fixture
+def reads(monkeypatch, user):
+    recording = _RecordingCollection(Activity.get_motor_collection())
+    monkeypatch.setattr(Activity, "get_motor_collection", classmethod(lambda cls: recording))
+    return recording
+
+
+@pytest.mark.asyncio
+async def test_metrics_range(user, reads):
+    today = date.today()
+    result = await metrics.compute_metrics_range(str(user.id), today - timedelta(days=90), today, user)
+    assert result.current_ctl > 0
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_performance_snapshot(user, reads):
+    snapshot = await metrics.get_performance_snapshot(str(user.id), user)
+    assert snapshot.total_duration_7d > 0
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_activity_listing(user, reads):
+    listed = await list_activities(start=None, end=None, sport=None, limit=50, offset=0, user=user)
+    assert len(listed) == 4
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_coach_context_activities(user, reads):
+    now = datetime.now(timezone.utc)
+    recent = await context_builder._get_recent_activities(str(user.id), now - timedelta(days=7), now)
+    assert len(recent) == 3
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_weekly_and_zone_reports(user, reads):
+    today = date.today()
+    await metrics.get_weekly_summaries(str(user.id), 8)
+    await metrics.get_zone_distribution(str(user.id), today - timedelta(days=28), today, user)
+    assert len(reads.pipelines) >= 2
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_power_curve(user, reads):
+    curve = await power_curve.get_power_curve(str(user.id), "42d")
+    assert curve.watts
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_lookups(user, reads):
+    activity = _activity(str(user.id), _ago(days=0))  # a re-upload of the latest activity
+    activity.fingerprint = activity_fingerprint(activity)
+    (duplicates,) = await find_duplicates_batch([activity], str(user.id))
+    assert duplicates
+    await find_near_duplicates_batch([activity], str(user.id))
+    _assert_no_time_series(reads)
+
+
+@pytest.mark.asyncio
+async def test_metrics_upgrade_probe(user, reads):
+    # Rescoring itself reads streams; deciding whether to rescore must not
+    await Activity.get_motor_collection().update_many({}, {"$set": {"metrics_version": METRICS_VERSION}})
+    assert await reprocessing.schedule_metrics_upgrade() is None
+    _assert_no_time_series(reads)